@@ -0,0 +1,69 @@
+"""
+快取值編碼 / 解碼的成本與大小：每種可用的格式 × 壓縮方式，對合成的 post detail / user detail / ranked 窗各跑一次。
+
+用法：
+    python benchmarks/bench_cache_codec.py --iterations 2000 --comments 2
+
+輸出每種組合的平均位元組數、encode / decode 每筆微秒。沒安裝的 msgpack / zstandard / lz4 不會出現在表裡。
+實際 Redis 上的用量用 `python -m jobs.maintenance cache-memory` 看。
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import codec  # noqa: E402
+
+def _user(i):
+    return {"user_id": str(uuid.uuid4()), "name": f"User {i}", "username": f"user{i}",
+            "metadata": {"profile": {"bio": "photography, coffee and long walks " * 2},
+                         "profile_image": {"url": f"https://cdn.example.com/u/{uuid.uuid4()}.jpg"}}}
+
+def samples(comments: int):
+    post = {
+        "post_id": str(uuid.uuid4()), "content": "sunset at the pier #travel #photo @friend " * 3,
+        "images": [{"image_id": str(uuid.uuid4()), "url": f"https://cdn.example.com/p/{uuid.uuid4()}.jpg",
+                    "width": 1080, "height": 1350, "order": i} for i in range(3)],
+        "comments": [{"comment_id": str(uuid.uuid4()), "content": "love this!", "created_at": "2025-09-01T12:00:00",
+                      "user": _user(i)}
+                     for i in range(comments)],
+        "created_at": "2025-09-01T11:00:00", "is_liked": False, "like_count": 42, "comment_count": comments,
+        "user_id": str(uuid.uuid4()), "username": "author",
+    }
+    user = {"user": {**_user(0), "email": "a@example.com", "is_public": True},
+            "is_following": True, "follower_count": 120, "following_count": 80, "post_count": 33}
+    ranked = {"top": "1725000000000000:" + str(uuid.uuid4()), "ids": [str(uuid.uuid4()) for _ in range(200)], "next": None}
+    return {"post_detail": post, "user_detail": user, "ranked_window": ranked}
+
+def bench(c: codec.Codec, obj, n: int):
+    raw = c.encode(obj)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        c.encode(obj)
+    t1 = time.perf_counter()
+    for _ in range(n):
+        codec.decode(raw)
+    t2 = time.perf_counter()
+    return len(raw), (t1 - t0) / n * 1e6, (t2 - t1) / n * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=2000)
+    ap.add_argument("--comments", type=int, default=2)
+    ap.add_argument("--min-bytes", type=int, default=1024)
+    args = ap.parse_args()
+
+    formats = [name for name, _, _ in codec._FORMATS.values()]
+    compressions = ["none"] + [name for name, _, _ in codec._COMPRESSORS.values()]
+    print(f"{'payload':<15} {'format':<8} {'compress':<8} {'bytes':>7} {'enc µs':>8} {'dec µs':>8}")
+    for label, obj in samples(args.comments).items():
+        for fmt in formats:
+            for comp in compressions:
+                size, enc, dec = bench(codec.Codec(fmt, comp, args.min_bytes), obj, args.iterations)
+                print(f"{label:<15} {fmt:<8} {comp:<8} {size:>7} {enc:>8.2f} {dec:>8.2f}")
+
+if __name__ == "__main__":
+    main()
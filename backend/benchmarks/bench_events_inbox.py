@@ -0,0 +1,129 @@
+"""
+收件匣查詢在大量事件下的延遲：單一大表 vs 每月分區表。
+
+在獨立的資料庫（不要用正式庫）建兩張同資料的合成表，各自跑 events repository 用到的查詢：
+  first_page    WHERE user_id = ? ORDER BY created_at DESC, event_id DESC LIMIT 11
+  deep_page     同上，加上 keyset 條件（含分區裁剪用的 created_at 上界），cursor 取在該 user 的中段
+  unread_count  COUNT(*) WHERE user_id = ? AND NOT is_read
+  get_by_id     WHERE event_id = ?（分區表另加 UUIDv7 推得的 created_at 下界）
+
+用法：
+    DATABASE_URL=postgresql+asyncpg://.../bench python benchmarks/bench_events_inbox.py --rows 100000000 --seed
+    DATABASE_URL=... python benchmarks/bench_events_inbox.py --samples 500
+
+--seed 以 generate_series 在 DB 端產生資料（每批 --batch 筆），100M 筆需要數十 GB 空間與相當時間；
+之後不帶 --seed 重跑只做量測。輸出每個查詢的 p50 / p95 / p99（ms）。
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+FLAT, PART = "bench_events_flat", "bench_events_part"
+START = date(2024, 1, 1)
+
+def _add_months(m: date, n: int) -> date:
+    y, mo = divmod(m.month - 1 + n, 12)
+    return date(m.year + y, mo + 1, 1)
+
+# 事件依序分布在 months 個月；event_id 用 UUIDv7 格式（前 48 bits 為建立時間毫秒）
+ROWS_SQL = """
+SELECT
+  (lpad(to_hex((extract(epoch FROM ts) * 1000)::bigint), 12, '0')
+   || '7' || substr(md5(g::text), 1, 3) || '8' || substr(md5(g::text), 4, 15))::uuid AS event_id,
+  md5((g % :users)::text)::uuid AS user_id,
+  'bench' AS message, 'friend_request' AS type,
+  random() < 0.9 AS is_read, '{}'::jsonb AS metadata, ts AS created_at, ts AS updated_at
+FROM (
+  SELECT g, timestamp '2024-01-01' + (g::float8 / :rows) * (:months * interval '30 days') AS ts
+  FROM generate_series(:lo, :hi) g
+) s
+"""
+
+async def seed(conn_factory, rows: int, users: int, months: int, batch: int) -> None:
+    cols = ("event_id uuid NOT NULL, user_id uuid NOT NULL, message text, type text, is_read boolean NOT NULL, "
+            "metadata jsonb, created_at timestamp NOT NULL, updated_at timestamp")
+    async with conn_factory() as conn:
+        for t in (FLAT, PART):
+            await conn.execute(text(f"DROP TABLE IF EXISTS {t} CASCADE"))
+        await conn.execute(text(f"CREATE TABLE {FLAT} ({cols}, PRIMARY KEY (event_id))"))
+        await conn.execute(text(f"CREATE TABLE {PART} ({cols}, PRIMARY KEY (event_id, created_at)) PARTITION BY RANGE (created_at)"))
+        m = START
+        for _ in range(months + 2):
+            await conn.execute(text(
+                f"CREATE TABLE {PART}_p{m:%Y%m} PARTITION OF {PART} FOR VALUES FROM ('{m}') TO ('{_add_months(m, 1)}')"
+            ))
+            m = _add_months(m, 1)
+        await conn.commit()
+    for lo in range(1, rows + 1, batch):
+        hi = min(lo + batch - 1, rows)
+        async with conn_factory() as conn:
+            for t in (FLAT, PART):
+                await conn.execute(text(f"INSERT INTO {t} {ROWS_SQL}"),
+                                   {"users": users, "rows": rows, "months": months, "lo": lo, "hi": hi})
+            await conn.commit()
+        print(f"seeded {hi}/{rows}", flush=True)
+    async with conn_factory() as conn:
+        for t in (FLAT, PART):
+            await conn.execute(text(f"CREATE INDEX ON {t} (user_id, created_at, event_id)"))
+            await conn.execute(text(f"CREATE INDEX ON {t} (user_id) WHERE NOT is_read"))
+            await conn.execute(text(f"ANALYZE {t}"))
+        await conn.commit()
+
+def _queries(t: str, partitioned: bool):
+    floor = " AND created_at >= :floor" if partitioned else ""
+    return {
+        "first_page": f"SELECT * FROM {t} WHERE user_id = :uid ORDER BY created_at DESC, event_id DESC LIMIT 11",
+        "deep_page": (f"SELECT * FROM {t} WHERE user_id = :uid AND created_at <= :c_at "
+                      f"AND (created_at, event_id) < (:c_at, :c_id) ORDER BY created_at DESC, event_id DESC LIMIT 11"),
+        "unread_count": f"SELECT count(*) FROM {t} WHERE user_id = :uid AND NOT is_read",
+        "get_by_id": f"SELECT * FROM {t} WHERE event_id = :eid{floor}",
+    }
+
+async def measure(conn_factory, samples: int, users: int) -> None:
+    async with conn_factory() as conn:
+        picks = []
+        for _ in range(samples):
+            uid = (await conn.execute(text("SELECT CAST(md5(CAST(:n AS text)) AS uuid)"), {"n": random.randrange(users)})).scalar()
+            rows = (await conn.execute(text(
+                f"SELECT event_id, created_at FROM {FLAT} WHERE user_id = :uid ORDER BY created_at DESC, event_id DESC"
+            ), {"uid": uid})).all()
+            if rows:
+                mid = rows[len(rows) // 2]
+                picks.append({"uid": uid, "c_at": mid.created_at, "c_id": mid.event_id,
+                              "eid": mid.event_id, "floor": mid.created_at})
+        for t, partitioned in ((FLAT, False), (PART, True)):
+            for name, sql in _queries(t, partitioned).items():
+                stmt = text(sql)
+                timings = []
+                for p in picks:
+                    t0 = time.perf_counter()
+                    (await conn.execute(stmt, p)).all()
+                    timings.append((time.perf_counter() - t0) * 1000)
+                q = statistics.quantiles(timings, n=100)
+                print(f"{t:20s} {name:14s} p50={q[49]:7.2f}ms p95={q[94]:7.2f}ms p99={q[98]:7.2f}ms")
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000_000)
+    ap.add_argument("--users", type=int, default=1_000_000)
+    ap.add_argument("--months", type=int, default=24)
+    ap.add_argument("--batch", type=int, default=2_000_000)
+    ap.add_argument("--samples", type=int, default=500)
+    ap.add_argument("--seed", action="store_true")
+    args = ap.parse_args()
+
+    engine = create_async_engine(os.environ["DATABASE_URL"])
+    if args.seed:
+        await seed(engine.connect, args.rows, args.users, args.months, args.batch)
+    await measure(engine.connect, args.samples, args.users)
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
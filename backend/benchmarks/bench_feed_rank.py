@@ -0,0 +1,64 @@
+"""
+排序階段每個 request 的 CPU 成本：NumPy 向量化 vs 逐筆 Python 迴圈（同一個 linear 公式）。
+
+只量特徵陣列建好之後的部分（打分 + 排序），不含 DB / Redis；候選數對應 FEED_RANK_WINDOW。
+用法：
+    python benchmarks/bench_feed_rank.py --windows 50 200 1000 5000 --repeat 2000
+輸出每種候選數的 p50 / p99（µs）與兩種實作的比值。
+"""
+import os
+import sys
+import math
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils import ranking
+
+def synthetic(n: int, rng: np.random.Generator):
+    return {
+        "affinity": rng.poisson(2, n).astype(float),
+        "likes": rng.zipf(2.0, n).astype(float),
+        "comments": rng.poisson(1, n).astype(float),
+        "age_hours": np.sort(rng.uniform(0, 72, n)),
+        "images": rng.integers(1, 6, n).astype(float),
+    }
+
+def python_rank(f):
+    w, hl = ranking.WEIGHTS, ranking.RECENCY_HALF_LIFE_H
+    rows = zip(f["affinity"].tolist(), f["likes"].tolist(), f["comments"].tolist(), f["age_hours"].tolist(), f["images"].tolist())
+    scores = [
+        w["affinity"] * math.log1p(a) + w["engagement"] * math.log1p(l + 2.0 * c)
+        + w["recency"] * 2 ** (-h / hl) + w["images"] * min(im, 4.0)
+        for a, l, c, h, im in rows
+    ]
+    return sorted(range(len(scores)), key=lambda i: -scores[i])
+
+def measure(fn, f, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(f)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    q = statistics.quantiles(timings, n=100)
+    return q[49], q[98]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--windows", type=int, nargs="+", default=[50, 200, 1000, 5000])
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(42)
+    scorer = ranking.get_scorer("linear")
+    for n in args.windows:
+        f = synthetic(n, rng)
+        np50, np99 = measure(lambda x: ranking.rank(x, scorer), f, args.repeat)
+        py50, py99 = measure(python_rank, f, max(args.repeat // 10, 20))
+        print(f"n={n:6d} numpy p50={np50:9.1f}µs p99={np99:9.1f}µs | python p50={py50:9.1f}µs p99={py99:9.1f}µs | x{py50 / np50:5.1f}")
+
+if __name__ == "__main__":
+    main()
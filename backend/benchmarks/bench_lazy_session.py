@@ -0,0 +1,68 @@
+"""
+對執行中的 API 打 95% cache HIT 的 GET /api/posts/{post_id} 流量，
+比較前後 /api/metrics 的 session 數與 primary pool checkout 次數 / 等待時間。
+
+用法：
+    python benchmarks/bench_lazy_session.py --base http://127.0.0.1:8000 \
+        --token <user JWT> --admin-token <admin JWT> --post-ids id1,id2,... --requests 2000
+
+每個 post id 第一次是 MISS，之後在 TTL 內都是 HIT；requests = 20 × len(post_ids) 時 HIT 率約 95%。
+注意 rate limit（預設 10 秒 25 次）需要先調高或排除此路徑。
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+async def _metrics(client: httpx.AsyncClient, admin_token: str) -> dict:
+    r = await client.get("/api/metrics", headers={"Authorization": f"Bearer {admin_token}"})
+    r.raise_for_status()
+    return r.json()["data"]
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base", default="http://127.0.0.1:8000")
+    ap.add_argument("--token", required=True)
+    ap.add_argument("--admin-token", required=True)
+    ap.add_argument("--post-ids", required=True)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=20)
+    args = ap.parse_args()
+
+    post_ids = [p for p in args.post_ids.split(",") if p]
+    headers = {"Authorization": f"Bearer {args.token}"}
+    cache_states: Counter = Counter()
+    sessions_opened = 0
+
+    async with httpx.AsyncClient(base_url=args.base, timeout=30) as client:
+        before = await _metrics(client, args.admin_token)
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def one(i: int):
+            nonlocal sessions_opened
+            async with sem:
+                r = await client.get(f"/api/posts/{post_ids[i % len(post_ids)]}", headers=headers)
+                cache_states[r.headers.get("X-Cache", "?")] += 1
+                sessions_opened += int(r.headers.get("X-DB-Sessions", "0"))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - t0
+        after = await _metrics(client, args.admin_token)
+
+    def delta(name: str) -> float:
+        return after["counters"].get(name, 0) - before["counters"].get(name, 0)
+
+    hits = cache_states.get("HIT", 0)
+    checkouts = delta("db.pool.primary.checkouts")
+    print(f"requests        : {args.requests} in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    print(f"cache HIT ratio : {hits / args.requests:.1%} {dict(cache_states)}")
+    print(f"sessions opened : {sessions_opened} (per request {sessions_opened / args.requests:.3f})")
+    print(f"pool checkouts  : {checkouts:.0f} (per request {checkouts / args.requests:.3f})")
+    print(f"checkout wait   : {delta('db.pool.primary.checkout_wait_ms'):.1f} ms total")
+    print(f"pool in use now : {after['gauges'].get('db.pool.primary.in_use')}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""
+量測各 endpoint 每個 request 的 Redis 往返次數（X-Redis-Roundtrips）與送出的指令數（INFO commandstats 差值）。
+
+往返次數只有加上計數的版本才有 header；指令數兩個版本都量得到，切到舊的 commit 跑一次就是「之前」的數字。
+同一個 Redis 上不要有其他流量，否則指令數會混進別人的。
+
+用法：
+    REDIS_URL=redis://127.0.0.1:6379/0 python benchmarks/bench_redis_roundtrips.py --base http://127.0.0.1:8000 \
+        --token <user JWT> --admin-token <admin JWT> --post-id <id> --user-id <id> --requests 50
+
+寫入類（PATCH /users/、like / unlike）會真的修改資料，請對測試用帳號與貼文跑；
+注意 rate limit（預設 10 秒 25 次）需要先調高或排除。
+"""
+import os
+import argparse
+import asyncio
+from collections import defaultdict
+
+import httpx
+from redis.asyncio import Redis
+
+async def _commands(r: Redis) -> int:
+    # Lua 內的指令也會被算進去；rate limit middleware 每個 request 固定 5 個（EVALSHA + 腳本內 4 個），兩個版本一樣
+    stats = await r.info("commandstats")
+    return sum(v["calls"] for name, v in stats.items() if name != "cmdstat_info")
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base", default="http://127.0.0.1:8000")
+    ap.add_argument("--token", required=True)
+    ap.add_argument("--admin-token", required=True)
+    ap.add_argument("--post-id", required=True)
+    ap.add_argument("--user-id", required=True)
+    ap.add_argument("--requests", type=int, default=50)
+    args = ap.parse_args()
+
+    user = {"Authorization": f"Bearer {args.token}"}
+    admin = {"Authorization": f"Bearer {args.admin_token}"}
+    cases = [
+        ("GET /posts", lambda c: c.get("/api/posts?limit=10", headers=user)),
+        ("GET /posts/{post_id}", lambda c: c.get(f"/api/posts/{args.post_id}", headers=user)),
+        ("GET /posts:batch", lambda c: c.get(f"/api/posts:batch?ids={args.post_id}", headers=user)),
+        ("GET /users/{user_id}", lambda c: c.get(f"/api/users/{args.user_id}", headers=user)),
+        ("GET /follows", lambda c: c.get("/api/follows?type=follower&status=agree&limit=20", headers=user)),
+        ("POST /posts/like + unlike", None),
+        ("PATCH /users/", lambda c: c.patch("/api/users/", data={"name": "bench"}, headers=user)),
+        ("GET /dashboard/metrics", lambda c: c.get("/api/dashboard/metrics", headers=admin)),
+    ]
+
+    async def like_unlike(c: httpx.AsyncClient):
+        await c.post(f"/api/posts/like/{args.post_id}", headers=user)
+        return await c.post(f"/api/posts/unlike/{args.post_id}", headers=user)
+
+    r = Redis.from_url(os.environ["REDIS_URL"])
+    print(f"{'endpoint':<28} {'roundtrips/req':>15} {'commands/req':>13}")
+    async with httpx.AsyncClient(base_url=args.base, timeout=30) as client:
+        for name, call in cases:
+            call = call or like_unlike
+            trips = defaultdict(int)
+            before = await _commands(r)
+            for _ in range(args.requests):
+                resp = await call(client)
+                trips["total"] += int(resp.headers.get("X-Redis-Roundtrips", "0"))
+                trips["seen"] += "X-Redis-Roundtrips" in resp.headers
+            cmds = (await _commands(r) - before) / args.requests
+            per_req = f"{trips['total'] / args.requests:.2f}" if trips["seen"] else "n/a"
+            print(f"{name:<28} {per_req:>15} {cmds:>13.2f}")
+    await r.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
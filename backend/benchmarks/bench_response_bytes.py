@@ -0,0 +1,62 @@
+"""
+cache HIT 時每個 request 的 CPU 成本：GET /posts/{post_id} 原本的路徑 vs 直接回傳序列化好的 body。
+
+  dict 路徑：Redis 取回的 bytes -> codec 解碼 -> PostDetailResponse 驗證（response_model）-> jsonable_encoder
+             -> JSONResponse 的 json.dumps
+  bytes 路徑：Redis 取回的 bytes 原樣放進 Response
+
+不連 Redis / DB，只在行程內重複執行兩條路徑，輸出每次的微秒數與節省比例。
+
+用法：
+    python benchmarks/bench_response_bytes.py --iterations 5000 --comments 2
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, Response  # noqa: E402
+
+from bench_cache_codec import samples  # noqa: E402
+from schemas.post import PostDetailResponse  # noqa: E402
+from utils import codec  # noqa: E402
+
+def dict_path(cached: bytes) -> Response:
+    data = codec.decode(cached)
+    model = PostDetailResponse.model_validate({"data": data, "message": "ok"})
+    return JSONResponse(jsonable_encoder(model))
+
+def bytes_path(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+def timed(fn, arg, n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn(arg)
+    return (time.perf_counter() - t0) / n * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=5000)
+    ap.add_argument("--comments", type=int, default=2)
+    args = ap.parse_args()
+
+    post = samples(args.comments)["post_detail"]
+    cached = codec.default_codec().encode(post)
+    body = PostDetailResponse(data=post).model_dump_json().encode()
+    # 兩條路徑輸出的 JSON 必須一樣
+    assert codec.decode(body) == codec.decode(dict_path(cached).body)
+
+    old = timed(dict_path, cached, args.iterations)
+    new = timed(bytes_path, body, args.iterations)
+    print(f"body size  : {len(body)} bytes ({args.comments} comments)")
+    print(f"dict path  : {old:8.2f} µs / hit")
+    print(f"bytes path : {new:8.2f} µs / hit")
+    print(f"saved      : {old - new:8.2f} µs / hit ({1 - new / old:.0%})")
+
+if __name__ == "__main__":
+    main()
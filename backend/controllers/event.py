@@ -1,22 +1,42 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 
 from db import get_db
-from utils.auth import get_current_user
-from schemas.event import EventsListResponse, EventReadResponse, UnreadCountResponse
+from utils.auth import get_current_user, get_stream_user, create_stream_token, STREAM_TOKEN_EXPIRE_SEC
+from utils import etag
+from schemas.event import EventsListResponse, EventReadResponse, UnreadCountResponse, ReadAllResponse, StreamTokenResponse
 from services.event import EventsService, get_events_service
 
 router = APIRouter(tags=["events"])
 
 @router.get("/events", response_model=EventsListResponse)
 async def get_events(
-    page: int = 1,
+    page: Optional[int] = None,
     limit: int = 10,
+    cursor_event_id: Optional[str] = None,
+    request: Request = None,
+    response: Response = None,
     db: AsyncSession = Depends(get_db),
     current=Depends(get_current_user),
     svc: EventsService = Depends(get_events_service),
 ):
-    return await svc.list_events(db, current, page, limit)
+    tag = await etag.for_events(current["user_id"], page, limit, cursor_event_id)
+    # 自己的收件匣一定存在，"*" 可以直接 304
+    if (resp := etag.not_modified(request, tag, "events", exists=True)) is not None:
+        return resp
+    response.headers.update(etag.headers(tag, "events"))
+    return await svc.list_events(db, current, page, limit, cursor_event_id)
+
+@router.post("/events/read-all", response_model=ReadAllResponse)
+async def read_all_events(
+    cursor_event_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current=Depends(get_current_user),
+    svc: EventsService = Depends(get_events_service),
+):
+    return await svc.read_all_events(db, current, cursor_event_id)
 
 @router.post("/events/read/{event_id}", response_model=EventReadResponse)
 async def read_event(
@@ -34,3 +54,20 @@ async def get_unread_count(
     svc: EventsService = Depends(get_events_service),
 ):
     return await svc.unread_count(db, current)
+
+@router.post("/events/stream-token", response_model=StreamTokenResponse)
+async def get_stream_token(current=Depends(get_current_user)):
+    # 給 EventSource 放在網址上的短效 token，只能用來開 /events/stream
+    return {"data": {"token": create_stream_token(current), "expires_in": STREAM_TOKEN_EXPIRE_SEC}, "message": "ok"}
+
+@router.get("/events/stream")
+async def stream_events(
+    last_event_id: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current=Depends(get_stream_user),
+    svc: EventsService = Depends(get_events_service),
+):
+    # text/event-stream；X-Accel-Buffering 讓 nginx 不要緩衝
+    body = await svc.open_stream(db, current, last_event_id)
+    return StreamingResponse(body, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
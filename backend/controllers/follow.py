@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 from db import get_db
 from utils.auth import get_current_user
+from utils import etag
 from schemas.follow import FollowListResponse, FollowRequestResponse, FollowActionBody, FollowActionResponse
 from services.follow import FollowsService, get_follows_service
 
@@ -13,15 +14,22 @@ router = APIRouter(tags=["follows"])
 async def get_follows(
     type: str,
     status: str,
-    page: int = 1,
+    page: Optional[int] = None,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    request: Request = None,
     response: Response = None,
     db: AsyncSession = Depends(get_db),
     current=Depends(get_current_user),
     svc: FollowsService = Depends(get_follows_service),
 ):
-    data, cache_state = await svc.list_follows(db, current, type, status, page, limit)
+    tag = await etag.for_follows(current["user_id"], type, status, page, limit, cursor)
+    # 自己的清單一定存在，"*" 可以直接 304
+    if (resp := etag.not_modified(request, tag, "follows", exists=True)) is not None:
+        return resp
+    data, cache_state = await svc.list_follows(db, current, type, status, page, limit, cursor)
     response.headers["X-Cache"] = cache_state
+    response.headers.update(etag.headers(tag, "follows"))
     return {"data": data}
 
 @router.post("/follows/request/{user_id}", response_model=FollowRequestResponse)
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File, Form, Response
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 
 from db import get_db
 from utils.auth import get_current_user
+from utils import etag
+from utils.ids import canonical_id
 from schemas.post import (
-    PostListResponse, PostDetailResponse,
+    PostListResponse, PostDetailResponse, PostBatchResponse, ExploreResponse,
     PostCreateResponse, PostUpdateResponse, PostDeleteResponse,
     CommentListResponse, CommentCreateResponse, CommentUpdateResponse, CommentDeleteResponse,
 )
@@ -19,24 +21,63 @@ async def list_posts(
     search: Optional[str] = None,
     limit: int = 10,
     cursor_post_id: Optional[str] = None,
+    mode: str = "recent",
+    cursor: Optional[str] = None,
+    unseen: bool = False,
     db: AsyncSession = Depends(get_db),
     current=Depends(get_current_user),
     svc: PostsService = Depends(get_posts_service),
 ):
-    return await svc.list_posts(db, current, user_id, search, limit, cursor_post_id)
+    return await svc.list_posts(db, current, user_id, search, limit, cursor_post_id, mode, cursor, unseen)
 
-@router.get("/posts/{post_id}", response_model=PostDetailResponse)
-async def get_post_detail(
-    post_id: str,
+# 要放在 /posts/{post_id} 之前，否則 "explore" 會被當成 post_id
+@router.get("/posts/explore", response_model=ExploreResponse)
+async def explore_posts(
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    unseen: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current=Depends(get_current_user),
+    svc: PostsService = Depends(get_posts_service),
+):
+    return await svc.explore_posts(db, current, limit, cursor, unseen)
+
+@router.get("/posts:batch", response_model=PostBatchResponse)
+async def get_posts_batch(
+    ids: str,
     response: Response,
     db: AsyncSession = Depends(get_db),
     current=Depends(get_current_user),
     svc: PostsService = Depends(get_posts_service),
 ):
-    data, cache_state = await svc.get_post_detail(db, current, post_id)
+    data, cache_state = await svc.get_posts_batch(db, current, ids)
     response.headers["X-Cache"] = cache_state
     return {"data": data, "message": "ok"}
 
+@router.get("/posts/{post_id}", response_model=PostDetailResponse)
+async def get_post_detail(
+    post_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current=Depends(get_current_user),
+    svc: PostsService = Depends(get_posts_service),
+):
+    # 先驗證格式：版本號與 body 的 key 都用 post_id，不是 UUID 的不查 Redis
+    try:
+        post_id = canonical_id(post_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Post does not exist.")
+    # If-None-Match 帶著作者 id：符合就 304，只查過 Redis 的版本號
+    if author_id := etag.post_author(request.headers.get("if-none-match")):
+        tag = await etag.for_post(current["user_id"], post_id, author_id)
+        if (resp := etag.not_modified(request, tag, "post")) is not None:
+            return resp
+    # body 已經是序列化好的 PostDetailResponse，直接回傳，不再經過 response_model
+    body, cache_state, tag = await svc.get_post_detail_body(db, current, post_id)
+    if (resp := etag.not_modified(request, tag, "post", exists=True)) is not None:
+        return resp
+    return Response(content=body, media_type="application/json", headers={"X-Cache": cache_state, **etag.headers(tag, "post")})
+
 @router.post("/posts/", response_model=PostCreateResponse, status_code=status.HTTP_200_OK)
 async def create_post(
     content: str = Form(...),
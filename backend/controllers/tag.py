@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+from db import get_db
+from utils.auth import get_current_user
+from schemas.tag import TagPostsResponse
+from services.tag import TagsService, get_tags_service
+
+router = APIRouter(tags=["tags"])
+
+@router.get("/tags/{tag}/posts", response_model=TagPostsResponse)
+async def list_tag_posts(
+    tag: str,
+    response: Response,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current=Depends(get_current_user),
+    svc: TagsService = Depends(get_tags_service),
+):
+    data, cache_state = await svc.list_tag_posts(db, current, tag, limit, cursor)
+    response.headers["X-Cache"] = cache_state
+    return {"data": data}
@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from db import get_db
 from schemas.user import (
     UserRegisterInput, UserRegisterResponse,
     UserLoginInput, UserLoginResponse,
-    UserListResponse, UserDetailResponse,
-    AdminUserStatusUpdate
+    UserListResponse, UserDetailResponse, UserBatchResponse,
+    AdminUserStatusUpdate, SuggestionsResponse
 )
 from utils.auth import get_current_user
+from utils import etag
+from utils.ids import canonical_id
 from services.user import UsersService, get_users_service
+from services.suggestion import SuggestionsService, get_suggestions_service
 
 router = APIRouter(tags=["users"]) #定義路由物件，並匯入fastapi的main檔
 
@@ -34,16 +37,45 @@ async def list_users(search: Optional[str] = None,
                      svc: UsersService = Depends(get_users_service)):
     return await svc.list_users(db, current, search, limit, page)
 
-@router.get("/users/{user_id}", response_model=UserDetailResponse)
-async def get_user_detail(user_id: str,
+# 要放在 /users/{user_id} 之前，否則 suggestions 會被當成 user_id
+@router.get("/users/suggestions", response_model=SuggestionsResponse)
+async def list_suggestions(limit: int = 20,
+                           db: AsyncSession = Depends(get_db),
+                           current=Depends(get_current_user),
+                           svc: SuggestionsService = Depends(get_suggestions_service)):
+    return await svc.list_suggestions(db, current, limit)
+
+@router.get("/users:batch", response_model=UserBatchResponse)
+async def get_users_batch(ids: str,
                           response: Response,
                           db: AsyncSession = Depends(get_db),
                           current=Depends(get_current_user),
                           svc: UsersService = Depends(get_users_service)):
-    data, cache_state = await svc.get_detail(db, current, user_id)
-    response.headers["X-Cache"] = cache_state  # HIT/MISS
+    data, cache_state = await svc.get_users_batch(db, current, ids)
+    response.headers["X-Cache"] = cache_state  # HIT/MISS/PARTIAL
     return {"data": data}
 
+@router.get("/users/{user_id}", response_model=UserDetailResponse)
+async def get_user_detail(user_id: str,
+                          request: Request,
+                          db: AsyncSession = Depends(get_db),
+                          current=Depends(get_current_user),
+                          svc: UsersService = Depends(get_users_service)):
+    try:
+        user_id = canonical_id(user_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="User not found")
+    tag = await etag.for_user(current["user_id"], user_id)
+    if (resp := etag.not_modified(request, tag, "user")) is not None:
+        return resp
+    # body 已經是序列化好的 UserDetailResponse，直接回傳，不再經過 response_model
+    body, cache_state = await svc.get_detail_body(db, current, user_id, tag)
+    # "*"：讀到了才知道存在
+    if (resp := etag.not_modified(request, tag, "user", exists=True)) is not None:
+        return resp
+    return Response(content=body, media_type="application/json",
+                    headers={"X-Cache": cache_state, **etag.headers(tag, "user")})  # HIT/MISS
+
 @router.patch("/users/", response_model=dict)
 async def update_me(name: Optional[str] = Form(None),
                     username: Optional[str] = Form(None),
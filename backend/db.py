@@ -1,8 +1,21 @@
 import os
+import time
+import asyncio
+import logging
+import itertools
 from pathlib import Path
+from typing import Callable, Dict, List, Optional
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+from fastapi import Request
+from sqlalchemy import text, Select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from utils import metrics
+
+log = logging.getLogger(__name__)
 
 # 明確載入與 db.py 同一個資料夾的env
 BASE_DIR = Path(__file__).resolve().parent
@@ -12,13 +25,152 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL not set")
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=os.getenv("SQL_ECHO", "false").lower() == "true",
-    future=True,
+# 逗號分隔的唯讀副本，例如 postgresql+asyncpg://.../db,postgresql+asyncpg://.../db
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT_SEC = float(os.getenv("DB_POOL_TIMEOUT_SEC", "30"))
+POOL_RECYCLE_SEC = int(os.getenv("DB_POOL_RECYCLE_SEC", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# asyncpg 的 prepared statement cache；走 pgbouncer transaction mode 時要設 0
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+REPLICA_MAX_LAG_SEC = float(os.getenv("DB_REPLICA_MAX_LAG_SEC", "5"))
+REPLICA_LAG_CHECK_SEC = float(os.getenv("DB_REPLICA_LAG_CHECK_SEC", "5"))
+
+def _timed_pool(name: str):
+    # 量測從 pool 拿連線等了多久（_do_get 在 pool 滿時會阻塞等待）
+    class TimedPool(AsyncAdaptedQueuePool):
+        def _do_get(self):
+            t0 = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                metrics.incr(f"db.pool.{name}.checkouts")
+                metrics.incr(f"db.pool.{name}.checkout_wait_ms", (time.perf_counter() - t0) * 1000)
+    return TimedPool
+
+def _make_engine(url: str, name: str) -> AsyncEngine:
+    connect_args = {}
+    u = make_url(url)
+    if u.get_driver_name() == "asyncpg":
+        connect_args["statement_cache_size"] = STATEMENT_CACHE_SIZE
+        u = u.update_query_dict({"prepared_statement_cache_size": str(STATEMENT_CACHE_SIZE)})
+    eng = create_async_engine(
+        u,
+        echo=os.getenv("SQL_ECHO", "false").lower() == "true",
+        future=True,
+        poolclass=_timed_pool(name),
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT_SEC,
+        pool_recycle=POOL_RECYCLE_SEC,
+        pool_pre_ping=POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+    metrics.register_gauge(f"db.pool.{name}.in_use", lambda: eng.pool.checkedout())
+    metrics.register_gauge(f"db.pool.{name}.idle", lambda: eng.pool.checkedin())
+    metrics.register_gauge(f"db.pool.{name}.overflow", lambda: eng.pool.overflow())
+    return eng
+
+engine = _make_engine(DATABASE_URL, "primary")
+replica_engines: List[AsyncEngine] = [_make_engine(u, f"replica{i}") for i, u in enumerate(DATABASE_REPLICA_URLS)]
+
+# replica index -> 最近一次量到的延遲秒數；None 表示尚未量測或量測失敗（不會被選用）
+_replica_lag: Dict[int, Optional[float]] = {i: None for i in range(len(replica_engines))}
+_rr = itertools.count()
+
+def _pick_replica() -> Optional[AsyncEngine]:
+    healthy = [i for i, lag in _replica_lag.items() if lag is not None and lag <= REPLICA_MAX_LAG_SEC]
+    if not healthy:
+        return None
+    return replica_engines[healthy[next(_rr) % len(healthy)]]
+
+class RoutingSession(Session):
+    """
+    讀寫分離：
+    - session.info["read_only"] 為 True 時，單純的 SELECT 送到延遲在門檻內的 replica
+    - 任何寫入（INSERT/UPDATE/DELETE、flush、SELECT ... FOR UPDATE）都走 primary，
+      且之後整個 session 固定在 primary，確保讀得到自己剛寫的資料
+    - 沒有可用 replica 時退回 primary
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("read_only") and not self.info.get("pinned_primary"):
+            if (not self._flushing and isinstance(clause, Select) and clause._for_update_arg is None):
+                replica = _pick_replica()
+                if replica is not None:
+                    metrics.incr("db.route.replica")
+                    return replica.sync_engine
+            else:
+                self.info["pinned_primary"] = True
+        metrics.incr("db.route.primary")
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+AsyncSessionLocal = sessionmaker(
+    engine, class_=AsyncSession, sync_session_class=RoutingSession, expire_on_commit=False
 )
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
-        yield session
+def read_only_session() -> AsyncSession:
+    # 給背景工作（例如 dashboard 的日統計回補）使用，查詢優先走 replica
+    return AsyncSessionLocal(info={"read_only": True})
+
+class LazySession:
+    """
+    第一次存取屬性（execute / scalars / add / info ...）才真的建立 AsyncSession，
+    所以完全由 Redis 回應的 request（cache HIT）不會建立 session，也不會碰連線池。
+    """
+    def __init__(self, factory: Callable[[], AsyncSession]):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+            metrics.incr("db.sessions")
+        return self._session
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+async def get_db(request: Request):
+    # GET/HEAD 只讀，允許 replica；其他 method 一律 primary
+    read_only = request.method in ("GET", "HEAD")
+    db = LazySession(lambda: AsyncSessionLocal(info={"read_only": read_only}))
+    try:
+        yield db
+    finally:
+        await db.close()
+
+# pg_last_xact_replay_timestamp 在主庫閒置時會一直變大，所以 LSN 已追上時視為 0
+_LAG_SQL = text("""
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+""")
+
+async def _check_replica(i: int) -> None:
+    try:
+        async with replica_engines[i].connect() as conn:
+            lag = (await conn.execute(_LAG_SQL)).scalar()
+        _replica_lag[i] = float(lag or 0)
+    except Exception:
+        log.warning("Replica %d lag check failed; routing reads to primary", i, exc_info=True)
+        _replica_lag[i] = None
+    metrics.set_gauge(f"db.replica{i}.lag_sec", -1 if _replica_lag[i] is None else _replica_lag[i])
+
+async def replica_lag_monitor():
+    # 定期量測每個 replica 的延遲，超過門檻的 replica 暫停分流
+    while True:
+        await asyncio.gather(*(_check_replica(i) for i in range(len(replica_engines))))
+        await asyncio.sleep(REPLICA_LAG_CHECK_SEC)
@@ -1,52 +1,62 @@
 import asyncio
-from datetime import datetime, timedelta, date
+import argparse
+from datetime import datetime, timedelta, date, time
 from zoneinfo import ZoneInfo
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
-from db import AsyncSessionLocal
-from services.analytics import compute_and_upsert_daily_stats
+from db import read_only_session
+from services.analytics import compute_and_upsert_range, backfill_daily_stats, update_rollups
+from jobs.scheduler import DailyJob
+from utils import live_metrics
 
 log = logging.getLogger(__name__)
 TZ_TAIPEI = ZoneInfo("Asia/Taipei")
 
-def _next_3am_taipei(now: datetime) -> datetime:
-    # 回傳下一個台北時間 03:00
-    now_t = now.astimezone(TZ_TAIPEI)
-    target = now_t.replace(hour=3, minute=0, second=0, microsecond=0)
-    if now_t >= target:
-        target = target + timedelta(days=1)
-    return target
-
-async def _run_for_yesterday():
-    now_t = datetime.now(tz=TZ_TAIPEI).date()
-    yesterday = now_t - timedelta(days=1)
-    async with AsyncSessionLocal() as db:  # type: AsyncSession
-        await compute_and_upsert_daily_stats(db, yesterday)
-
-async def daily_aggregate_worker():
-    # 啟動先補跑一次
-    try:
-        await _run_for_yesterday()
-    except asyncio.CancelledError:
-        raise
-    except Exception:
-        log.exception("Backfill (yesterday) failed at startup")
-
-    # 之後每天03:00(Taipei Time)跑
-    while True:
-        now = datetime.now(tz=TZ_TAIPEI)
-        nxt = _next_3am_taipei(now)
-        sleep_sec = max(1.0, (nxt - now).total_seconds())
-        try:
-            log.info("Daily job sleeps %.1fs until %s", sleep_sec, nxt.isoformat())
-            await asyncio.sleep(sleep_sec)
-            await _run_for_yesterday()
-            log.info("Daily job finished successfully")
-        except asyncio.CancelledError:
-            # 讓外部能取消這個背景任務
-            log.info("Daily job cancelled; exiting")
-            raise
-        except Exception:
-            # 失敗就記錄，但不要中止，下一輪再試
-            log.exception("Daily job failed; will try again next run")
+async def run_daily_stats(start_d: date, end_d: date) -> None:
+    # 平常只有昨天一天；停機後由 scheduler 合併成區間一次補上
+    days = [start_d + timedelta(days=i) for i in range((end_d - start_d).days + 1)]
+    # Redis 上的即時計數：保留每小時分布，活躍人數以 HLL 為準（比 last_login_at 準）
+    overrides = {}
+    for d, live in (await live_metrics.read_days(days)).items():
+        if live["has_data"]:
+            overrides[d] = {"hourly": live["hourly"], "active_user_count": live["active_user_count"]}
+    async with read_only_session() as db:  # type: AsyncSession
+        await compute_and_upsert_range(db, start_d, end_d, overrides=overrides)
+    # 寫進 Mongo 之後才清掉小時 key
+    await live_metrics.drop_days(overrides.keys())
+
+# 每天 03:00 (Taipei Time) 跑，由 jobs.scheduler 的 leader 執行
+daily_stats_job = DailyJob("daily_stats", run_daily_stats, at=time(3, 0))
+
+async def run_backfill(start_d: date, end_d: date, chunk_days: int, resume: bool) -> date:
+    async with read_only_session() as db:  # type: AsyncSession
+        return await backfill_daily_stats(db, start_d, end_d, chunk_days=chunk_days, resume=resume)
+
+def main():
+    # python -m jobs.daily_aggregate backfill --start 2025-01-01 --end 2025-09-30
+    ap = argparse.ArgumentParser(prog="python -m jobs.daily_aggregate")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    bf = sub.add_parser("backfill", help="recompute daily stats for [start, end] (Asia/Taipei dates)")
+    bf.add_argument("--start", required=True, type=date.fromisoformat)
+    bf.add_argument("--end", type=date.fromisoformat,
+                    default=datetime.now(tz=TZ_TAIPEI).date() - timedelta(days=1))
+    bf.add_argument("--chunk-days", type=int, default=31)
+    bf.add_argument("--no-resume", action="store_true", help="ignore the saved checkpoint and start over")
+    ru = sub.add_parser("rollups", help="rebuild week/month rollups from existing daily stats")
+    ru.add_argument("--start", required=True, type=date.fromisoformat)
+    ru.add_argument("--end", required=True, type=date.fromisoformat)
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.end < args.start:
+        ap.error("--end must be >= --start")
+    if args.cmd == "rollups":
+        asyncio.run(update_rollups(args.start, args.end))
+        log.info("Rollups rebuilt for %s..%s", args.start.isoformat(), args.end.isoformat())
+        return
+    last = asyncio.run(run_backfill(args.start, args.end, args.chunk_days, not args.no_resume))
+    log.info("Backfill done through %s", last.isoformat())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import os
+import re
+import gzip
+import asyncio
+import argparse
+import logging
+from datetime import date, datetime
+from pathlib import Path
+from typing import List, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from db import engine
+from models import Event
+from jobs.scheduler import IntervalJob
+from utils import versions
+
+log = logging.getLogger(__name__)
+
+TABLE = Event.__table__.name
+C = Event.__table__.c
+RETENTION_MONTHS = int(os.getenv("EVENT_RETENTION_MONTHS", "6"))
+PREMAKE_MONTHS = int(os.getenv("EVENT_PARTITION_PREMAKE_MONTHS", "3"))
+ARCHIVE_DIR = Path(os.getenv("EVENT_ARCHIVE_DIR", "archive/events"))
+ARCHIVE_CHUNK = 10_000
+
+_PART_RE = re.compile(rf"^{re.escape(TABLE)}_p(\d{{4}})(\d{{2}})$")
+
+def month_floor(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+def add_months(m: date, n: int) -> date:
+    y, mo = divmod(m.month - 1 + n, 12)
+    return date(m.year + y, mo + 1, 1)
+
+def partition_name(m: date) -> str:
+    # 分區名稱固定用正式表名，搬遷完 rename parent 之後不用再改
+    return f"{TABLE}_p{m:%Y%m}"
+
+def _utc_today() -> date:
+    # created_at 存 UTC
+    return datetime.utcnow().date()
+
+async def is_partitioned(conn: AsyncConnection, table: str = TABLE) -> bool:
+    res = await conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :t)"
+    ), {"t": table})
+    return bool(res.scalar())
+
+async def ensure_partitions(conn: AsyncConnection, first: date, last: date, parent: str = TABLE) -> None:
+    # 每月一個分區 [月初, 下月初)；沒有 DEFAULT 分區，所以要提早建好未來幾個月
+    m = month_floor(first)
+    while m <= last:
+        await conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{partition_name(m)}" PARTITION OF "{parent}" '
+            f"FOR VALUES FROM ('{m.isoformat()}') TO ('{add_months(m, 1).isoformat()}')"
+        ))
+        m = add_months(m, 1)
+
+async def list_partitions(conn: AsyncConnection) -> List[Tuple[str, date]]:
+    res = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :t"
+    ), {"t": TABLE})
+    out = []
+    for (name,) in res.all():
+        m = _PART_RE.match(name)
+        if m:
+            out.append((name, date(int(m.group(1)), int(m.group(2)), 1)))
+    return sorted(out, key=lambda x: x[1])
+
+def _index_sql(table: str, suffix: str = "") -> List[str]:
+    # 與 repositories.event 的 INBOX_INDEX / UNREAD_INDEX 相同的欄位；建在 parent 上，新分區會自動繼承
+    return [
+        f'CREATE INDEX IF NOT EXISTS "ix_events_user_created_event{suffix}" '
+        f'ON "{table}" ("{C.user_id.name}", "{C.created_at.name}", "{C.event_id.name}")',
+        f'CREATE INDEX IF NOT EXISTS "ix_events_user_unread{suffix}" '
+        f'ON "{table}" ("{C.user_id.name}") WHERE NOT "{C.is_read.name}"',
+    ]
+
+async def migrate() -> None:
+    """
+    把現有的 events 搬到依 created_at 每月分區的新表，線上可執行：
+    1. 建 {TABLE}_partitioned（同欄位 / 預設值 / CHECK / FK，PK 改成 (event_id, created_at)）
+    2. 一個月一個 transaction 複製，ON CONFLICT DO NOTHING，中斷後重跑會接著做
+    3. 切換時鎖住舊表寫入，補上複製期間新增或更新的列，再 rename 對調；舊表保留為 {TABLE}_legacy
+    """
+    new, legacy = f"{TABLE}_partitioned", f"{TABLE}_legacy"
+    created, updated, eid = C.created_at.name, C.updated_at.name, C.event_id.name
+    async with engine.begin() as conn:
+        if await is_partitioned(conn):
+            log.info("%s is already partitioned", TABLE)
+            return
+        lo, hi, mark = (await conn.execute(text(
+            f'SELECT min("{created}"), max("{created}"), max(COALESCE("{updated}", "{created}")) FROM "{TABLE}"'
+        ))).one()
+        await conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{new}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ("{created}")'
+        ))
+        has_pk = (await conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = CAST(:t AS regclass) AND contype = 'p')"
+        ), {"t": new})).scalar()
+        if not has_pk:
+            # 分區表的 PK 必須包含分區鍵
+            await conn.execute(text(f'ALTER TABLE "{new}" ADD PRIMARY KEY ("{eid}", "{created}")'))
+            fks = (await conn.execute(text(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = CAST(:t AS regclass) AND contype = 'f'"
+            ), {"t": TABLE})).all()
+            for name, definition in fks:
+                await conn.execute(text(f'ALTER TABLE "{new}" ADD CONSTRAINT "{name}_p" {definition}'))
+        await ensure_partitions(conn, (lo or datetime.utcnow()).date(),
+                                add_months(month_floor(_utc_today()), PREMAKE_MONTHS), parent=new)
+        for sql in _index_sql(new, suffix="_new"):
+            await conn.execute(text(sql))
+
+    m = month_floor((lo or datetime.utcnow()).date())
+    last = month_floor((hi or datetime.utcnow()).date())
+    while m <= last:
+        async with engine.begin() as conn:
+            res = await conn.execute(text(
+                f'INSERT INTO "{new}" SELECT * FROM "{TABLE}" WHERE "{created}" >= :a AND "{created}" < :b '
+                f"ON CONFLICT DO NOTHING"
+            ), {"a": m, "b": add_months(m, 1)})
+        log.info("Copied %s: %d rows", m.strftime("%Y-%m"), res.rowcount)
+        m = add_months(m, 1)
+
+    async with engine.begin() as conn:
+        # EXCLUSIVE：擋住寫入但仍可讀；只補 mark 之後變動的列，鎖的時間很短
+        await conn.execute(text(f'LOCK TABLE "{TABLE}" IN EXCLUSIVE MODE'))
+        if mark is not None:
+            # 複製期間被更新的列（已讀、合併時 created_at 會改變）先刪再重新複製
+            await conn.execute(text(
+                f'DELETE FROM "{new}" n USING "{TABLE}" o WHERE n."{eid}" = o."{eid}" '
+                f'AND COALESCE(o."{updated}", o."{created}") >= :mark'
+            ), {"mark": mark})
+            await conn.execute(text(
+                f'INSERT INTO "{new}" SELECT * FROM "{TABLE}" '
+                f'WHERE COALESCE("{updated}", "{created}") >= :mark ON CONFLICT DO NOTHING'
+            ), {"mark": mark})
+        await conn.execute(text(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"'))
+        await conn.execute(text(f'ALTER TABLE "{new}" RENAME TO "{TABLE}"'))
+        for name in ("ix_events_user_created_event", "ix_events_user_unread"):
+            await conn.execute(text(f'ALTER INDEX IF EXISTS "{name}" RENAME TO "{name}_legacy"'))
+            await conn.execute(text(f'ALTER INDEX IF EXISTS "{name}_new" RENAME TO "{name}"'))
+    log.info("Cut over to partitioned %s; old table kept as %s", TABLE, legacy)
+
+def _append_archive(path: Path, lines: List[str]) -> None:
+    # gzip 檔可以一段一段接上去，讀的時候視為同一個串流
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+async def archive_partition(name: str) -> int:
+    """
+    已讀事件寫成 NDJSON.gz 後刪除；每批先寫檔再 commit，寫檔失敗就 rollback，不會刪掉沒備份的資料
+    （commit 失敗時重跑可能在檔案裡重複，屬於 at-least-once）。未讀的留著，分區清空後才 DROP。
+    """
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    path = ARCHIVE_DIR / f"{name}.ndjson.gz"
+    total = 0
+    while True:
+        async with engine.begin() as conn:
+            rows = (await conn.execute(text(
+                f'DELETE FROM "{name}" AS e WHERE ctid IN '
+                f'(SELECT ctid FROM "{name}" WHERE "{C.is_read.name}" LIMIT :n) RETURNING row_to_json(e)::text'
+            ), {"n": ARCHIVE_CHUNK})).scalars().all()
+            if rows:
+                await asyncio.to_thread(_append_archive, path, rows)
+        total += len(rows)
+        if len(rows) < ARCHIVE_CHUNK:
+            break
+    async with engine.begin() as conn:
+        left = (await conn.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{name}")'))).scalar()
+        if not left:
+            await conn.execute(text(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"'))
+            await conn.execute(text(f'DROP TABLE "{name}"'))
+            log.info("Dropped partition %s", name)
+    return total
+
+async def maintain_event_partitions() -> None:
+    # 建好未來幾個月的分區，超過保留期的分區封存已讀事件
+    today = _utc_today()
+    async with engine.begin() as conn:
+        if not await is_partitioned(conn):
+            return
+        await ensure_partitions(conn, today, add_months(month_floor(today), PREMAKE_MONTHS))
+        parts = await list_partitions(conn)
+    cutoff = add_months(month_floor(today), -RETENTION_MONTHS)
+    for name, month in parts:
+        if add_months(month, 1) <= cutoff:
+            n = await archive_partition(name)
+            log.info("Archived %d read events from %s", n, name)
+            if n:
+                # 收件匣的舊頁少了資料，所有人的 /events ETag 都要換
+                await versions.bump(("events", "all"))
+
+event_partitions_job = IntervalJob("event_partitions", maintain_event_partitions, every_sec=6 * 3600)
+
+def main():
+    # python -m jobs.event_partitions migrate
+    ap = argparse.ArgumentParser(prog="python -m jobs.event_partitions")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("migrate", help="copy events into a monthly-partitioned table and swap it in")
+    sub.add_parser("maintain", help="create upcoming partitions and archive expired read events")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(migrate() if args.cmd == "migrate" else maintain_event_partitions())
+
+if __name__ == "__main__":
+    main()
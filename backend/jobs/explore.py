@@ -0,0 +1,26 @@
+import os
+import asyncio
+import argparse
+import logging
+
+from utils import explore
+from jobs.scheduler import IntervalJob
+
+log = logging.getLogger(__name__)
+
+EXPLORE_COMPACT_SEC = float(os.getenv("EXPLORE_COMPACT_SEC", "900"))
+
+async def compact_explore() -> None:
+    n = await explore.compact()
+    log.info("Explore compacted: %d posts", n)
+
+explore_compact_job = IntervalJob("explore_compact", compact_explore, every_sec=EXPLORE_COMPACT_SEC)
+
+def main():
+    # python -m jobs.explore
+    argparse.ArgumentParser(prog="python -m jobs.explore", description="rebase and trim explore scores").parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(compact_explore())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import asyncio
+import argparse
+import logging
+from sqlalchemy import text
+
+from db import engine
+from jobs.event_partitions import is_partitioned
+from repositories.event import INBOX_INDEX, UNREAD_INDEX
+from repositories.outbox import metadata as outbox_metadata, ORDERING_INDEX
+from repositories.tag import metadata as tag_metadata
+from utils.cache import get_redis, memory_by_family
+
+log = logging.getLogger(__name__)
+
+# 專案沒有 migration 工具，額外的索引由這裡建立；可重複執行
+INDEXES = [INBOX_INDEX, UNREAD_INDEX, ORDERING_INDEX]
+
+# 已存在的表不會被 create_all 改動，之後才加的欄位在這裡補上
+COLUMNS = [
+    "ALTER TABLE outbox ADD COLUMN IF NOT EXISTS ordering_key VARCHAR(128)",
+]
+
+async def ensure_schema() -> None:
+    # 不在 models 裡的表（outbox、post_tags），已存在就跳過
+    async with engine.begin() as conn:
+        for md in (outbox_metadata, tag_metadata):
+            await conn.run_sync(lambda sync_conn, md=md: md.create_all(sync_conn, checkfirst=True))
+            log.info("Tables ready: %s", ", ".join(md.tables))
+        for ddl in COLUMNS:
+            await conn.execute(text(ddl))
+    await ensure_indexes()
+
+async def ensure_indexes() -> None:
+    # CREATE INDEX CONCURRENTLY 不能在 transaction 裡跑，所以用 AUTOCOMMIT 連線
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for idx in INDEXES:
+            # 分區表的 parent 不支援 CONCURRENTLY（jobs.event_partitions migrate 已在 parent 建好）
+            partitioned = await is_partitioned(conn, idx.table.name)
+            idx.dialect_options["postgresql"]["concurrently"] = not partitioned
+            await conn.run_sync(lambda sync_conn, idx=idx: idx.create(sync_conn, checkfirst=True))
+            log.info("Index ready: %s", idx.name)
+
+async def cache_memory() -> None:
+    # 依 key family 列出 Redis 記憶體用量，比較不同 CACHE_CODEC / CACHE_COMPRESSION 設定前後
+    try:
+        usage = await memory_by_family()
+    finally:
+        await get_redis().close()
+    total = sum(v["bytes"] for v in usage.values()) or 1
+    for fam, v in sorted(usage.items(), key=lambda x: -x[1]["bytes"]):
+        log.info("%-12s keys=%-8d bytes=%-12d avg=%-8d share=%.1f%%",
+                 fam, v["keys"], v["bytes"], v["bytes"] // max(1, v["keys"]), 100 * v["bytes"] / total)
+
+def main():
+    # python -m jobs.maintenance ensure-schema | ensure-indexes | cache-memory
+    ap = argparse.ArgumentParser(prog="python -m jobs.maintenance")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("ensure-schema", help="create missing auxiliary tables, then missing indexes")
+    sub.add_parser("ensure-indexes", help="create missing indexes without locking writes")
+    sub.add_parser("cache-memory", help="Redis memory usage per cache key family")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    cmds = {"ensure-schema": ensure_schema, "ensure-indexes": ensure_indexes, "cache-memory": cache_memory}
+    asyncio.run(cmds[args.cmd]())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import AsyncSessionLocal
+from repositories.outbox import OutboxRepo, wait_pending
+from utils.uow import UnitOfWork
+from utils import metrics
+
+log = logging.getLogger(__name__)
+
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "100"))
+OUTBOX_POLL_SEC = float(os.getenv("OUTBOX_POLL_SEC", "5"))
+OUTBOX_RETRY_BASE_SEC = float(os.getenv("OUTBOX_RETRY_BASE_SEC", "5"))
+
+# handler(db, 同一個 topic 的 payload 們, uow)：在 worker 的 transaction 裡執行，可登記 after_commit
+Handler = Callable[[AsyncSession, List[Dict[str, Any]], UnitOfWork], Awaitable[None]]
+
+class OutboxWorker:
+    """
+    每個 worker 都跑一個 drain loop（SKIP LOCKED 讓大家分著做）：
+    - 一次取一批，依 topic 交給 handler，處理完與刪除 outbox 同一個 commit
+    - 整批失敗時改成一筆一筆重做，把壞掉的那筆隔離出來延後重試（指數退避），不拖累其他筆；
+      同一個 ordering_key 後面的資料要等它成功或用完次數（搬到 outbox_dead）才會被取出
+    - 平常靠 OutboxRepo.add 的 commit 後通知立刻醒來，輪詢只是保底
+    """
+    def __init__(self):
+        self.repo = OutboxRepo()
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, topic: str, handler: Handler) -> None:
+        # 同一個 topic 可以有多個 handler，依註冊順序在同一個 transaction 裡執行
+        self.handlers[topic].append(handler)
+
+    async def _process(self, db: AsyncSession, ids: Optional[List[int]] = None) -> int:
+        async with UnitOfWork(db) as uow:
+            rows = await self.repo.claim(db, OUTBOX_BATCH, ids=ids)
+            by_topic: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            for row in rows:
+                by_topic[row.topic].append(row.payload)
+            for topic, payloads in by_topic.items():
+                if not self.handlers.get(topic):
+                    raise KeyError(f"no outbox handler for topic {topic!r}")
+                for handler in self.handlers[topic]:
+                    await handler(db, payloads, uow)
+            if rows:
+                await self.repo.remove(db, [row.id for row in rows])
+        metrics.incr("outbox.processed", len(rows))
+        return len(rows)
+
+    async def drain_once(self) -> int:
+        async with AsyncSessionLocal() as db:
+            try:
+                return await self._process(db)
+            except Exception:
+                log.warning("outbox batch failed; retrying rows one by one", exc_info=True)
+            async with UnitOfWork(db):
+                ids = [row.id for row in await self.repo.claim(db, OUTBOX_BATCH)]
+            done = 0
+            for id_ in ids:
+                try:
+                    done += await self._process(db, ids=[id_])
+                except Exception:
+                    log.exception("outbox row %s failed", id_)
+                    metrics.incr("outbox.failed")
+                    async with UnitOfWork(db):
+                        dead = await self.repo.retry_later(db, [id_], OUTBOX_RETRY_BASE_SEC)
+                    if dead:
+                        for row in dead:
+                            log.error("outbox row %s (%s) gave up after %d attempts; moved to outbox_dead",
+                                      row.id, row.topic, row.attempts)
+                        metrics.incr("outbox.dead", len(dead))
+            return done
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                n = await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("outbox drain failed")
+                n = 0
+            if n < OUTBOX_BATCH:
+                await wait_pending(OUTBOX_POLL_SEC)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,189 @@
+import os
+import random
+import asyncio
+import logging
+from datetime import datetime, date, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.cache import get_redis
+from utils.lease import RedisLease
+from utils.mongo import get_job_state_collection
+
+log = logging.getLogger(__name__)
+TZ_TAIPEI = ZoneInfo("Asia/Taipei")
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+LEASE_SEC = float(os.getenv("SCHEDULER_LEASE_SEC", "30"))
+TICK_SEC = float(os.getenv("SCHEDULER_TICK_SEC", "15"))
+JITTER_SEC = float(os.getenv("SCHEDULER_JITTER_SEC", "30"))
+RETRY_MAX = int(os.getenv("SCHEDULER_RETRY_MAX", "3"))
+RETRY_BASE_SEC = float(os.getenv("SCHEDULER_RETRY_BASE_SEC", "10"))
+MAX_CATCH_UP_DAYS = int(os.getenv("SCHEDULER_MAX_CATCH_UP_DAYS", "60"))
+
+class LeaseLost(Exception):
+    pass
+
+class DailyJob:
+    """
+    每天台北時間 at 之後處理「昨天」。ledger 記錄最後成功的日期，
+    停機期間漏掉的日子會在下一次執行時合併成一個區間 fn(start, end) 補上。
+    """
+    def __init__(self, name: str, fn: Callable[[date, date], Awaitable[Any]], at: time = time(3, 0),
+                 max_catch_up_days: int = MAX_CATCH_UP_DAYS, jitter_sec: float = JITTER_SEC):
+        self.name = name
+        self.fn = fn
+        self.at = at
+        self.max_catch_up_days = max_catch_up_days
+        self.jitter_sec = jitter_sec
+
+    def due(self, now: datetime, last_success: Optional[str]) -> Optional[Tuple[date, date]]:
+        now_t = now.astimezone(TZ_TAIPEI)
+        # 還沒到今天的執行時間，最多只處理到前天
+        target = now_t.date() - timedelta(days=1 if now_t.time() >= self.at else 2)
+        start = date.fromisoformat(last_success) + timedelta(days=1) if last_success else target
+        start = max(start, target - timedelta(days=self.max_catch_up_days - 1))
+        return (start, target) if start <= target else None
+
+    async def run(self, period: Tuple[date, date]) -> None:
+        await self.fn(*period)
+
+    def ledger_value(self, period: Tuple[date, date]) -> str:
+        return period[1].isoformat()
+
+class IntervalJob:
+    # 每 every_sec 秒執行一次；ledger 記錄最後成功的時間
+    def __init__(self, name: str, fn: Callable[[], Awaitable[Any]], every_sec: float, jitter_sec: float = 0):
+        self.name = name
+        self.fn = fn
+        self.every_sec = every_sec
+        self.jitter_sec = jitter_sec
+
+    def due(self, now: datetime, last_success: Optional[str]) -> Optional[datetime]:
+        if last_success and (now - datetime.fromisoformat(last_success)).total_seconds() < self.every_sec:
+            return None
+        return now
+
+    async def run(self, period: datetime) -> None:
+        await self.fn()
+
+    def ledger_value(self, period: datetime) -> str:
+        return period.isoformat()
+
+class Scheduler:
+    """
+    所有 uvicorn worker / 機器都會啟動 Scheduler，但只有拿到 Redis lease 的 leader 會執行工作。
+    每個 job 的最後成功紀錄存在 Mongo（job_state），所以 leader 換手或重啟後不會重跑、也不會漏跑。
+    """
+    def __init__(self):
+        self.jobs: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lease: Optional[RedisLease] = None
+        self._backoff_until: Dict[str, datetime] = {}
+
+    def register(self, job) -> None:
+        self.jobs[job.name] = job
+
+    def start(self) -> None:
+        if SCHEDULER_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lease is not None:
+            await self._lease.release()
+
+    async def _loop(self) -> None:
+        self._lease = RedisLease(get_redis(), "scheduler", LEASE_SEC)
+        while True:
+            try:
+                if await self._lease.acquire_or_renew():
+                    for job in list(self.jobs.values()):
+                        if not self._lease.held:
+                            break
+                        await self._run_if_due(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Scheduler tick failed")
+            await asyncio.sleep(TICK_SEC)
+
+    async def _run_if_due(self, job) -> None:
+        now = datetime.now(tz=timezone.utc)
+        if now < self._backoff_until.get(job.name, now):
+            return
+        ledger = get_job_state_collection()
+        ledger_id = f"scheduler:{job.name}"
+        # 每次拿到 lease 都重新讀 ledger：換手前別的 worker 可能已經跑完這一段
+        doc = await ledger.find_one({"_id": ledger_id}) or {}
+        period = job.due(now, doc.get("last_success"))
+        if period is None:
+            return
+        try:
+            await self._run_with_retries(job, period, ledger, ledger_id, now)
+        except LeaseLost:
+            # 不記成失敗也不 backoff；之後哪個 worker 拿到 lease 就會依 ledger 重新判斷
+            log.warning("Lost scheduler lease while handling %s", job.name)
+
+    async def _run_with_retries(self, job, period, ledger, ledger_id: str, now: datetime) -> None:
+        if job.jitter_sec:
+            await self._sleep_holding_lease(random.uniform(0, job.jitter_sec))
+        for attempt in range(1, RETRY_MAX + 1):
+            try:
+                await self._run_holding_lease(job, period)
+            except (asyncio.CancelledError, LeaseLost):
+                raise
+            except Exception as e:
+                log.exception("Job %s failed (attempt %d/%d)", job.name, attempt, RETRY_MAX)
+                await ledger.update_one({"_id": ledger_id}, {"$set": {
+                    "last_error": repr(e), "last_error_at": datetime.now(tz=timezone.utc).isoformat()
+                }}, upsert=True)
+                if attempt < RETRY_MAX:
+                    await self._sleep_holding_lease(RETRY_BASE_SEC * 2 ** (attempt - 1))
+                continue
+            await ledger.update_one({"_id": ledger_id}, {"$set": {
+                "last_success": job.ledger_value(period),
+                "last_run_at": datetime.now(tz=timezone.utc).isoformat(),
+                "last_error": None,
+            }}, upsert=True)
+            self._backoff_until.pop(job.name, None)
+            log.info("Job %s finished for %s", job.name, job.ledger_value(period))
+            return
+        # 重試用完，等一段時間再從下一個 tick 重新嘗試
+        self._backoff_until[job.name] = now + timedelta(seconds=RETRY_BASE_SEC * 2 ** RETRY_MAX)
+
+    async def _sleep_holding_lease(self, seconds: float) -> None:
+        # jitter / 重試的等待可能比 lease 還長，分段 sleep，每段前後都續約；續不到丟 LeaseLost
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + seconds
+        while True:
+            if not await self._lease.renew():
+                raise LeaseLost()
+            left = deadline - loop.time()
+            if left <= 0:
+                return
+            await asyncio.sleep(min(left, LEASE_SEC / 3))
+
+    async def _run_holding_lease(self, job, period) -> None:
+        # 工作執行期間持續續約；lease 一旦續不到就取消工作，不能讓接手的 worker 同時跑同一段
+        if not await self._lease.renew():
+            raise LeaseLost()
+        task = asyncio.create_task(job.run(period))
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=LEASE_SEC / 3)
+                if not task.done() and not await self._lease.renew():
+                    raise LeaseLost()
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        task.result()
+
+scheduler = Scheduler()
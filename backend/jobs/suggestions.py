@@ -0,0 +1,75 @@
+import os
+import asyncio
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List
+from sqlalchemy import select
+
+from db import read_only_session
+from models import User
+from services.suggestion import get_suggestions_service
+from jobs.scheduler import IntervalJob
+
+log = logging.getLogger(__name__)
+
+SUGGEST_BATCH = int(os.getenv("SUGGEST_BATCH", "500"))
+SUGGEST_CONCURRENCY = int(os.getenv("SUGGEST_CONCURRENCY", "4"))
+SUGGEST_ACTIVE_DAYS = int(os.getenv("SUGGEST_ACTIVE_DAYS", "30"))
+SUGGEST_REFRESH_SEC = float(os.getenv("SUGGEST_REFRESH_SEC", str(6 * 3600)))
+
+async def _active_user_batches() -> AsyncIterator[List[str]]:
+    # 最近登入過的一般使用者，依 user_id keyset 分批；很久沒登入的人等他回來時再當場算
+    since = datetime.utcnow() - timedelta(days=SUGGEST_ACTIVE_DAYS)
+    last = None
+    while True:
+        stmt = (
+            select(User.user_id)
+            .where(User.role == "user", User.status == "enabled", User.last_login_at >= since)
+            .order_by(User.user_id)
+            .limit(SUGGEST_BATCH)
+        )
+        if last is not None:
+            stmt = stmt.where(User.user_id > last)
+        async with read_only_session() as db:
+            ids = (await db.execute(stmt)).scalars().all()
+        if not ids:
+            return
+        last = ids[-1]
+        yield [str(i) for i in ids]
+
+async def run_suggestions() -> None:
+    """
+    全量重算：每批一個 SQL，最多 SUGGEST_CONCURRENCY 批同時進行（各自一個唯讀 session，查詢走 replica）。
+    兩次重算之間由 outbox 的增量更新維持。
+    """
+    svc = get_suggestions_service()
+    sem = asyncio.Semaphore(SUGGEST_CONCURRENCY)
+    done = 0
+
+    async def one(batch: List[str]) -> None:
+        nonlocal done
+        async with sem:
+            async with read_only_session() as db:
+                await svc.refresh(db, batch)
+            done += len(batch)
+
+    pending: List[asyncio.Task] = []
+    async for batch in _active_user_batches():
+        pending.append(asyncio.create_task(one(batch)))
+        if len(pending) >= SUGGEST_CONCURRENCY * 2:
+            await asyncio.gather(*pending)
+            pending = []
+    await asyncio.gather(*pending)
+    log.info("Suggestions refreshed for %d users", done)
+
+suggestions_job = IntervalJob("suggestions", run_suggestions, every_sec=SUGGEST_REFRESH_SEC)
+
+def main():
+    # python -m jobs.suggestions
+    argparse.ArgumentParser(prog="python -m jobs.suggestions", description="recompute follow suggestions").parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_suggestions())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import asyncio
+import argparse
+import logging
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db import engine
+from models import Post
+from repositories.tag import post_tags
+from utils.tags import extract
+
+log = logging.getLogger(__name__)
+
+BATCH = 2000
+
+async def backfill() -> None:
+    """
+    為 tag 功能上線前的貼文建立 post_tags，依 (created_at, post_id) keyset 分批、可重複執行。
+    只建索引不發 mention 通知；Redis 時間軸等第一次讀取時從 DB 建。
+    """
+    last, total = None, 0
+    while True:
+        stmt = select(Post.post_id, Post.content, Post.created_at).order_by(Post.created_at, Post.post_id).limit(BATCH)
+        if last is not None:
+            stmt = stmt.where(tuple_(Post.created_at, Post.post_id) > last)
+        async with engine.begin() as conn:
+            rows = (await conn.execute(stmt)).all()
+            values = [{"tag": t, "post_id": str(pid), "created_at": created}
+                      for pid, content, created in rows for t in extract(content)[0]]
+            if values:
+                await conn.execute(pg_insert(post_tags).values(values).on_conflict_do_nothing())
+        if not rows:
+            break
+        last = (rows[-1].created_at, rows[-1].post_id)
+        total += len(values)
+        log.info("Indexed %d tags so far", total)
+
+def main():
+    # python -m jobs.tags
+    argparse.ArgumentParser(prog="python -m jobs.tags", description="index hashtags of existing posts").parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(backfill())
+
+if __name__ == "__main__":
+    main()
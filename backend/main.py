@@ -9,10 +9,22 @@ from controllers.user import router as user_router
 from controllers.follow import router as follow_router
 from controllers.event import router as event_router
 from controllers.post import router as post_router
+from controllers.tag import router as tag_router
 from routers.dashboard import router as dashboard_router
+from routers.metrics import router as metrics_router
 from utils.cache import get_redis
+from utils import metrics
 from utils.rate_limit import SlidingWindowRateLimitMiddleware
-from jobs.daily_aggregate import daily_aggregate_worker
+from jobs.scheduler import scheduler
+from utils.event_bus import hub
+from jobs.outbox import outbox_worker
+from services.follow import get_follows_service
+from services.suggestion import get_suggestions_service
+from jobs.daily_aggregate import daily_stats_job
+from jobs.event_partitions import event_partitions_job
+from jobs.suggestions import suggestions_job
+from jobs.explore import explore_compact_job
+from db import replica_engines, replica_lag_monitor
 
 app = FastAPI(debug=True)
 
@@ -28,24 +40,50 @@ app.include_router(user_router, prefix="/api")
 app.include_router(follow_router, prefix="/api")
 app.include_router(event_router, prefix="/api")
 app.include_router(post_router, prefix="/api")
+app.include_router(tag_router, prefix="/api")
 app.include_router(dashboard_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
 
 @app.on_event("startup")
 async def _startup():
     r = get_redis()
     await r.ping()
-    asyncio.create_task(daily_aggregate_worker())
+    # 每個 worker 都啟動，但只有拿到 Redis lease 的 leader 會真的執行
+    scheduler.register(daily_stats_job)
+    scheduler.register(event_partitions_job)
+    scheduler.register(suggestions_job)
+    scheduler.register(explore_compact_job)
+    scheduler.start()
+    # outbox 每個 worker 都 drain，SKIP LOCKED 分攤
+    outbox_worker.register("follow", get_follows_service().apply_outbox)
+    outbox_worker.register("follow", get_suggestions_service().apply_outbox)
+    outbox_worker.start()
+    if replica_engines:
+        asyncio.create_task(replica_lag_monitor())
 
 @app.on_event("shutdown")
 async def _shutdown():
+    await scheduler.stop()
+    await outbox_worker.stop()
+    await hub.stop()
     r = get_redis()
     await r.close()
 
 @app.middleware("http")
 async def timer(request: Request, call_next):
     t0 = time.perf_counter()
+    stats = metrics.begin_request()
     resp = await call_next(request)
     resp.headers["X-Process-Time-ms"] = f"{(time.perf_counter()-t0)*1000:.2f}"
+    resp.headers["X-DB-Commits"] = str(int(stats.get("db.commits", 0)))
+    resp.headers["X-DB-Sessions"] = str(int(stats.get("db.sessions", 0)))
+    resp.headers["X-DB-Loader-Queries"] = str(int(stats.get("db.loader.queries", 0)))
+    resp.headers["X-DB-Loader-Saved"] = str(int(stats.get("db.loader.saved", 0)))
+    resp.headers["X-Redis-Roundtrips"] = str(int(stats.get("redis.roundtrips", 0)))
+    # 以路由樣板彙總（/api/posts/{post_id}），避免每個 id 各一筆
+    route = request.scope.get("route")
+    endpoint = f"{request.method} {getattr(route, 'path', '<unmatched>')}"
+    metrics.end_request(endpoint, stats)
     return resp
 
 redis = get_redis()
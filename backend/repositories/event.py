@@ -1,15 +1,155 @@
-from typing import List, Tuple, Optional
+import os
+import logging
+from typing import Any, Callable, Dict, List, Tuple, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from datetime import datetime
+from sqlalchemy import select, func, insert, update, tuple_, Index
+from datetime import datetime, timedelta
 from models import Event
+from utils.cache import k, get_redis
+from utils.uow import after_commit, pin_primary
+from utils import versions
+from utils.event_bus import publish, event_payload
+from utils.ids import uuid7, uuid7_time
+from repositories.loaders import get_loaders
+
+log = logging.getLogger(__name__)
+
+# keyset 分頁與未讀數都靠這個索引：WHERE user_id = ? ORDER BY created_at DESC, event_id DESC
+INBOX_INDEX = Index("ix_events_user_created_event", Event.user_id, Event.created_at, Event.event_id,
+                    postgresql_concurrently=True)
+# 未讀數 COUNT 只掃未讀的列
+UNREAD_INDEX = Index("ix_events_user_unread", Event.user_id, postgresql_where=(Event.is_read == False),  # noqa: E712
+                     postgresql_concurrently=True)
+
+UNREAD_TTL_SEC = 24 * 3600
+
+# 這些 type 在時間窗內、同一個收件者、尚未讀的事件會合併成一筆（"X and 41 others ..."）
+COALESCE_TYPES = {t.strip() for t in os.getenv("EVENT_COALESCE_TYPES", "friend_request").split(",") if t.strip()}
+COALESCE_WINDOW_SEC = int(os.getenv("EVENT_COALESCE_WINDOW_SEC", "3600"))
+COALESCE_SAMPLE = 3
+
+def unread_key(user_id: str) -> str:
+    return k("events", str(user_id), "unread")
+
+# 未讀數有寫入進行中（commit 前設、commit 後再延長）：這段期間重建的 COUNT 不知道有沒有算到那筆，不寫回
+UNREAD_DIRTY_SEC = 10
+
+def unread_dirty_key(user_id: str) -> str:
+    return k("events", str(user_id), "unread", "dirty")
+
+# commit 後調整未讀數：reset 時直接刪掉（下次讀取重建），否則只有 key 已存在才加減，且不會小於 0
+_UNREAD_ADJUST_LUA = r"""
+redis.call('SET', KEYS[2], 1, 'EX', ARGV[3])
+if ARGV[2] == '1' then
+    return redis.call('DEL', KEYS[1])
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local v = redis.call('INCRBY', KEYS[1], ARGV[1])
+if v < 0 then
+    redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+    v = 0
+end
+return v
+"""
+
+# 重建寫回：有寫入進行中就放棄，否則 SET NX
+_UNREAD_FILL_LUA = r"""
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2], 'NX') then
+    return 1
+end
+return 0
+"""
+
+async def _unread_dirty(user_id: str) -> None:
+    # 在 transaction 內、commit 之前呼叫；Redis 出錯不擋寫入，最多讓之後一次重建寫回舊值
+    try:
+        await get_redis().set(unread_dirty_key(user_id), 1, ex=UNREAD_DIRTY_SEC)
+    except Exception:
+        log.warning("Failed to mark unread counter of %s dirty", user_id, exc_info=True)
+
+async def _unread_adjust(user_id: str, delta: int = 0, reset: bool = False) -> None:
+    await get_redis().eval(_UNREAD_ADJUST_LUA, 2, unread_key(user_id), unread_dirty_key(user_id),
+                           delta, int(reset), UNREAD_DIRTY_SEC)
+
+def _created_floor(event_id: str):
+    # events 依 created_at 分區；UUIDv7 的 id 帶建立時間，created_at 只會往後（合併時移到現在），
+    # 加上這個下界就能跳過較舊的分區。舊的 uuid4 id 回 None，照舊掃全部
+    t = uuid7_time(event_id)
+    return t - timedelta(minutes=1) if t else None
+
+def _by_id(stmt, event_id: str):
+    stmt = stmt.where(Event.event_id == event_id)
+    floor = _created_floor(event_id)
+    return stmt.where(Event.created_at >= floor) if floor else stmt
+
+async def _load_events(db: AsyncSession, ids: List[str]) -> Dict[str, Event]:
+    # 一批 id 一個 IN；每個 id 都是 UUIDv7 時取最早的下界，仍然能跳過較舊的分區
+    stmt = select(Event).where(Event.event_id.in_(ids))
+    floors = [_created_floor(i) for i in ids]
+    if all(floors):
+        stmt = stmt.where(Event.created_at >= min(floors))
+    res = await db.execute(stmt)
+    return {str(e.event_id): e for e in res.scalars().all()}
 
 class EventsRepo:
     async def create_event(self, db: AsyncSession, *, user_id: str, message: str, type: str, metadata: dict | None = None) -> Event:
-        ev = Event(user_id=user_id, message=message, type=type, is_read=False, event_metadata=(metadata or {}))
-        db.add(ev); await db.commit(); await db.refresh(ev); return ev
+        stmt = insert(Event).returning(Event)
+        await _unread_dirty(user_id)
+        res = await db.scalars(stmt, [dict(event_id=uuid7(), user_id=user_id, message=message, type=type, is_read=False, event_metadata=(metadata or {}))])
+        # 未讀數在 commit 之後才 +1；key 不存在時不動，等下次讀取從 DB 重建
+        after_commit(db, _unread_adjust, user_id, 1)
+        after_commit(db, versions.bump, ("events", user_id))
+        event = res.one()
+        # 同樣等 commit 後才推播，避免 client 收到之後又被 rollback 的事件
+        after_commit(db, publish, user_id, event_payload(event))
+        return event
+
+    async def create_or_coalesce(
+        self, db: AsyncSession, *, user_id: str, type: str, actors: List[Dict[str, Any]], metadata: dict,
+        render: Callable[[List[Dict[str, Any]], int], str],
+    ) -> Event:
+        """
+        actors 依時間舊到新，每個至少有 user_id。
+        窗內已有同 type 的未讀事件就併進去：actor_count 累加、actors 只留最新幾位、訊息重新產生，
+        並把 created_at 移到現在讓它回到收件匣最上面；未讀數不變。
+        """
+        # 同一個收件者同時只有一個 transaction 在合併，避免兩個 worker 各開一組
+        await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"events:{user_id}:{type}"))))
+        group = (await db.execute(
+            select(Event)
+            .where(Event.user_id == user_id, Event.type == type, Event.is_read == False,  # noqa: E712
+                   Event.created_at >= datetime.utcnow() - timedelta(seconds=COALESCE_WINDOW_SEC))
+            .order_by(Event.created_at.desc())
+            .limit(1)
+            .with_for_update()
+        )).scalar_one_or_none()
+
+        old = (group.event_metadata or {}) if group else {}
+        count = old.get("actor_count", 1 if group else 0) + len(actors)
+        sample, seen = [], set()
+        for a in [*reversed(actors), *old.get("actors", [])]:
+            if a["user_id"] not in seen and len(sample) < COALESCE_SAMPLE:
+                seen.add(a["user_id"]); sample.append(a)
+        metadata = {**metadata, "actors": sample, "actor_count": count}
+        if group is None:
+            return await self.create_event(db, user_id=user_id, message=render(sample, count), type=type, metadata=metadata)
+
+        now = datetime.utcnow()
+        group.message = render(sample, count); group.event_metadata = metadata
+        group.created_at = now; group.updated_at = now
+        await db.flush()
+        after_commit(db, versions.bump, ("events", user_id))
+        # client 以 event_id 取代畫面上舊的那一筆
+        after_commit(db, publish, user_id, event_payload(group))
+        return group
 
     async def list_events(self, db: AsyncSession, *, user_id: str, page: int, limit: int) -> Tuple[List[Event], int]:
+        # 舊的 OFFSET 分頁，保留給還在用 page 參數的 client
         base = select(Event).where(Event.user_id == user_id)
         total_stmt = select(func.count()).select_from(base.subquery())
         total = (await db.execute(total_stmt)).scalar_one()
@@ -19,13 +159,72 @@ class EventsRepo:
         total_pages = (total + limit - 1) // limit
         return events, total_pages
 
+    async def _cursor_position(self, db: AsyncSession, user_id: str, cursor_event_id: str):
+        res = await db.execute(
+            _by_id(select(Event.created_at, Event.event_id), cursor_event_id).where(Event.user_id == user_id)
+        )
+        return res.first()
+
+    async def list_events_after(
+        self, db: AsyncSession, *, user_id: str, limit: int, cursor_event_id: Optional[str]
+    ) -> Tuple[List[Event], Optional[str]]:
+        # keyset 分頁：(created_at, event_id) 小於 cursor 的下一頁，深頁跟第一頁一樣便宜，也不用 COUNT
+        stmt = select(Event).where(Event.user_id == user_id)
+        if cursor_event_id:
+            row = await self._cursor_position(db, user_id, cursor_event_id)
+            if row:
+                # row 比較不會觸發分區裁剪，另外加上單欄的 created_at 上界
+                stmt = stmt.where(Event.created_at <= row.created_at,
+                                  tuple_(Event.created_at, Event.event_id) < tuple_(*row))
+        stmt = stmt.order_by(Event.created_at.desc(), Event.event_id.desc()).limit(limit + 1)
+        events = (await db.execute(stmt)).scalars().all()
+        next_cursor = str(events[limit - 1].event_id) if len(events) > limit else None
+        return events[:limit], next_cursor
+
+    async def list_events_since(
+        self, db: AsyncSession, *, user_id: str, last_event_id: str, limit: int
+    ) -> Optional[List[Event]]:
+        # SSE 重連補送：比 last_event_id 新的事件（舊到新）；找不到 cursor 時回 None 讓呼叫端要求重新載入
+        row = await self._cursor_position(db, user_id, last_event_id)
+        if not row:
+            return None
+        stmt = (
+            select(Event)
+            .where(Event.user_id == user_id, Event.created_at >= row.created_at,
+                   tuple_(Event.created_at, Event.event_id) > tuple_(*row))
+            .order_by(Event.created_at.asc(), Event.event_id.asc())
+            .limit(limit)
+        )
+        return (await db.execute(stmt)).scalars().all()
+
     async def get_by_id(self, db: AsyncSession, event_id: str) -> Optional[Event]:
-        res = await db.execute(select(Event).where(Event.event_id == event_id))
-        return res.scalar_one_or_none()
+        return await get_loaders(db).extra("events", lambda ids: _load_events(db, ids)).load(str(event_id))
 
     async def mark_read(self, db: AsyncSession, event: Event) -> Event:
+        await _unread_dirty(str(event.user_id))
         event.is_read = True; event.updated_at = datetime.utcnow()
-        await db.commit(); await db.refresh(event); return event
+        await db.flush()
+        after_commit(db, _unread_adjust, str(event.user_id), -1)
+        after_commit(db, versions.bump, ("events", str(event.user_id)))
+        return event
+
+    async def mark_all_read(self, db: AsyncSession, *, user_id: str, cursor_event_id: Optional[str]) -> int:
+        # 一次 UPDATE 把 cursor（含）之前的未讀全部標成已讀；沒給 cursor 就是全部
+        stmt = update(Event).where(Event.user_id == user_id, Event.is_read == False)  # noqa: E712
+        if cursor_event_id:
+            row = await self._cursor_position(db, user_id, cursor_event_id)
+            if not row:
+                return 0
+            stmt = stmt.where(Event.created_at <= row.created_at,
+                              tuple_(Event.created_at, Event.event_id) <= tuple_(*row))
+        stmt = stmt.values(is_read=True, updated_at=datetime.utcnow()).execution_options(synchronize_session=False)
+        await _unread_dirty(user_id)
+        n = (await db.execute(stmt)).rowcount or 0
+        if n:
+            after_commit(db, versions.bump, ("events", user_id))
+            # 全部已讀時直接清掉計數，下次讀取重建為 0；部分已讀則扣掉筆數
+            after_commit(db, _unread_adjust, user_id, -n, reset=not cursor_event_id)
+        return n
 
     async def count_unread(self, db: AsyncSession, *, user_id: str) -> int:
         res = await db.execute(
@@ -33,3 +232,17 @@ class EventsRepo:
         )
         return res.scalar_one()
 
+    async def cached_unread(self, db: AsyncSession, *, user_id: str) -> int:
+        """
+        先讀 Redis；miss 才在 primary 上 COUNT 一次並寫回。
+        COUNT 到寫回之間如果有新事件 / 已讀（dirty 標記還在），寫回會被放棄：
+        那筆的 +1/-1 可能已經因為 key 不存在而跳過，也可能還沒套用，寫進去的數字不一定對。
+        """
+        key = unread_key(user_id)
+        c = await get_redis().get(key)
+        if c is not None:
+            return int(c)
+        pin_primary(db)
+        c = await self.count_unread(db, user_id=user_id)
+        await get_redis().eval(_UNREAD_FILL_LUA, 2, key, unread_dirty_key(user_id), c, UNREAD_TTL_SEC)
+        return c
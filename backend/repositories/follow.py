@@ -1,56 +1,193 @@
 import uuid
-from typing import Optional, Tuple, List
+import secrets
+from datetime import datetime, timezone
+from typing import Optional, Tuple, List, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, func, and_, insert
 from models import Follow, User
+from utils.cache import get_redis, k, gen_key, get_gen, bump_gen
+from utils.uow import pin_primary
+from repositories.loaders import get_loaders, pair
+
+# 每個 user 四個 ZSET：follower / following × pending / agree，member 為 "對方user_id|follows_id"，score 為 follow 時間（ms）
+FOLLOW_LIST_TTL_SEC = {"pending": 3600, "agree": 24 * 3600}
+# 空清單也要能分辨「已建好」與「不存在」，所以每個 ZSET 都放一個分數 -inf 的哨兵
+_SENTINEL = "~"
+
+def list_key(user_id: str, list_type: str, status: str) -> str:
+    return k("follows", str(user_id), list_type, status)
+
+def follow_score(created_at: datetime) -> int:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return int(created_at.timestamp() * 1000)
+
+# 先建在暫存 key，正式 key 不存在、且讀 DB 之後沒有套用過變更（generation 沒變）才 RENAME 過去；
+# 否則快照可能少了那筆變更（key 不存在時的 ZADD / ZREM 是 no-op），整個丟掉
+_BUILD_LUA = r"""
+local gen = redis.call('GET', KEYS[3]) or ''
+if redis.call('EXISTS', KEYS[2]) == 1 or gen ~= ARGV[2] then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return 1
+"""
+
+# 只更新已經建好的清單；不存在時等下次讀取從 DB 重建
+_ZADD_IF_EXISTS_LUA = r"""
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+return redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+"""
+
+async def _build(key: str, rows: List[Tuple[str, str, datetime]], gen: str) -> bool:
+    # gen 要在查 DB 之前讀；回傳是否換上了這次建的清單
+    r = get_redis()
+    tmp = f"{key}:build:{secrets.token_hex(4)}"
+    pipe = r.pipeline(transaction=False)
+    pipe.zadd(tmp, {_SENTINEL: float("-inf")})
+    for i in range(0, len(rows), 1000):
+        pipe.zadd(tmp, {f"{o}|{fid}": follow_score(created) for o, fid, created in rows[i:i + 1000]})
+    await pipe.execute()
+    return bool(await r.eval(_BUILD_LUA, 3, tmp, key, gen_key(key), FOLLOW_LIST_TTL_SEC[key.rsplit(":", 1)[-1]], gen))
+
+def _rows_page(rows: List[Tuple[str, str, datetime]], limit: int, page: Optional[int], cursor: Optional[str]):
+    # 與 _zset_page 相同的排序與回傳格式，直接對 DB 查到的資料分頁（清單沒能寫回 Redis 時用）
+    items = sorted(((f"{o}|{fid}", follow_score(created)) for o, fid, created in rows),
+                   key=lambda x: (x[1], x[0]), reverse=True)
+    if cursor:
+        score, member = cursor.split(":", 1)
+        pos = next((i for i, (m, _) in enumerate(items) if m == member), None)
+        rest = items[pos + 1:] if pos is not None else [x for x in items if x[1] < int(score)]
+        return rest[:limit + 1], len(items)
+    start = ((page or 1) - 1) * limit
+    return items[start:start + limit + 1], len(items)
+
+async def _zset_page(key: str, limit: int, page: Optional[int], cursor: Optional[str]):
+    # 回傳 ([(member, score)] 最多 limit+1 筆, 總筆數)；key 不存在時總筆數為 None
+    r = get_redis()
+    card = await r.zcard(key)
+    if not card:
+        return [], None
+    if cursor:
+        score, member = cursor.split(":", 1)
+        rank = await r.zrevrank(key, member)
+        if rank is None:
+            # cursor 那筆已經被移除，從它的分數往後接
+            items = await r.zrevrangebyscore(key, f"({score}", "-inf", start=0, num=limit + 1, withscores=True)
+        else:
+            items = await r.zrevrange(key, rank + 1, rank + limit + 1, withscores=True)
+    else:
+        start = ((page or 1) - 1) * limit
+        items = await r.zrevrange(key, start, start + limit, withscores=True)
+    items = [(m.decode() if isinstance(m, bytes) else m, sc) for m, sc in items]
+    return [(m, sc) for m, sc in items if m != _SENTINEL], card - 1
+
+def _list_keys(*user_ids: str) -> List[str]:
+    return [list_key(u, t, s) for u in user_ids for t in ("follower", "following") for s in ("pending", "agree")]
+
+async def apply_follow_changes(changes: List[Dict]) -> None:
+    """
+    一批 follow 變更（outbox payload）依序套用到雙方的清單，整批一個 pipeline：
+    每筆只動雙方各自的清單（最多 4 個 key），status 為 pending / agree 時加入（agree 同時從 pending 移除），
+    deleted 時兩種狀態都移除；舊格式沒有 status 的直接刪掉雙方清單，讓下次讀取重建
+    """
+    if not changes:
+        return
+    pipe = get_redis().pipeline(transaction=False)
+    for c in changes:
+        follower_id, following_id, status = c["follower_id"], c["following_id"], c.get("status")
+        if not status:
+            keys = _list_keys(follower_id, following_id)
+            pipe.delete(*keys)
+            for key in keys:
+                bump_gen(pipe, key)
+            continue
+        sides = ((following_id, "follower", follower_id), (follower_id, "following", following_id))
+        for owner, list_type, other in sides:
+            member = f"{other}|{c['follows_id']}"
+            for st in ("pending", "agree"):
+                if st != status:
+                    pipe.zrem(list_key(owner, list_type, st), member)
+                # 正在重建的清單看到 generation 變了就不會換上
+                bump_gen(pipe, list_key(owner, list_type, st))
+            if status in ("pending", "agree"):
+                pipe.eval(_ZADD_IF_EXISTS_LUA, 1, list_key(owner, list_type, status), c["created_at_ms"], member)
+    await pipe.execute()
 
 class FollowsRepo:
     async def get_by_pair(self, db: AsyncSession, follower_id: str, following_id: str) -> Optional[Follow]:
-        stmt = select(Follow).where(Follow.follower_id == follower_id, Follow.following_id == following_id)
-        res = await db.execute(stmt); return res.scalar_one_or_none()
+        return await get_loaders(db).follows.load(pair(follower_id, following_id))
 
     async def get_by_id(self, db: AsyncSession, follows_id: str) -> Optional[Follow]:
-        res = await db.execute(select(Follow).where(Follow.follows_id == follows_id))
-        return res.scalar_one_or_none()
+        return await get_loaders(db).follows_by_id.load(str(follows_id))
 
     async def create_request(self, db: AsyncSession, follower_id: str, following_id: str, status: str = "pending") -> Follow:
-        follow = Follow(follower_id=follower_id, following_id=following_id, status=status)
-        db.add(follow)
-        try:
-            await db.commit()
-        except IntegrityError:
-            await db.rollback()
-            raise
-        await db.refresh(follow)
+        stmt = insert(Follow).returning(Follow)
+        res = await db.scalars(stmt, [dict(follower_id=follower_id, following_id=following_id, status=status)])
+        follow = res.one()
+        get_loaders(db).follows.prime(pair(follower_id, following_id), follow)
         return follow
 
     async def delete_follow(self, db: AsyncSession, follow: Follow) -> Follow:
-        await db.delete(follow); await db.commit(); return follow
+        await db.delete(follow); await db.flush()
+        loaders = get_loaders(db)
+        loaders.follows.prime(pair(follow.follower_id, follow.following_id), None)
+        loaders.follows_by_id.prime(str(follow.follows_id), None)
+        return follow
 
     async def update_status(self, db: AsyncSession, follow: Follow, new_status: str) -> Follow:
         follow.status = new_status
-        await db.commit(); await db.refresh(follow); return follow
+        await db.flush(); return follow
+
+    async def count_agreed(self, db: AsyncSession, user_ids: List[str]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        # 一批 user 的 (follower 數, following 數)，各一個 GROUP BY
+        if not user_ids: return {}, {}
+        out = []
+        for mine in (Follow.following_id, Follow.follower_id):
+            res = await db.execute(
+                select(mine, func.count()).where(mine.in_(user_ids), Follow.status == "agree").group_by(mine))
+            out.append({str(uid): c for uid, c in res.all()})
+        return out[0], out[1]
 
-    async def list_follows(
-        self, db: AsyncSession, current_user_id: str, list_type: str, status: str, page: int, limit: int
-    ) -> Tuple[List[Tuple[User, str]], int]:
+    async def list_follow_ids(
+        self, db: AsyncSession, user_id: str, list_type: str, status: str
+    ) -> List[Tuple[str, str, datetime]]:
+        # (對方 user_id, follows_id, created_at)，只取建 ZSET 需要的欄位，不 join User
         if list_type == "following":
-            base = select(User, Follow.follows_id).join(Follow, Follow.following_id == User.user_id).where(
-                Follow.follower_id == current_user_id, Follow.status == status
-            )
+            other, mine = Follow.following_id, Follow.follower_id
         else:
-            base = select(User, Follow.follows_id).join(Follow, Follow.follower_id == User.user_id).where(
-                Follow.following_id == current_user_id, Follow.status == status
-            )
-
-        total_stmt = select(func.count()).select_from(base.subquery())
-        total = (await db.execute(total_stmt)).scalar_one()
-        offset = (page - 1) * limit
-
-        page_stmt = base.order_by(Follow.created_at.desc(), Follow.follows_id.desc()).offset(offset).limit(limit)
-        res = await db.execute(page_stmt)
-        rows = res.all()
-        total_pages = (total + limit - 1) // limit
-        items: List[Tuple[User, str]] = [(u, str(fid)) for (u, fid) in rows]
-        return items, total_pages
+            other, mine = Follow.follower_id, Follow.following_id
+        res = await db.execute(
+            select(other, Follow.follows_id, Follow.created_at).where(mine == user_id, Follow.status == status)
+        )
+        return [(str(o), str(fid), created) for (o, fid, created) in res.all()]
+
+    async def page_follows(
+        self, db: AsyncSession, user_id: str, list_type: str, status: str,
+        limit: int, page: Optional[int] = None, cursor: Optional[str] = None,
+    ) -> Tuple[List[Tuple[str, str]], int, Optional[str], bool]:
+        """
+        從 ZSET 分頁，回傳 ([(對方 user_id, follows_id)], 總筆數, next_cursor, 是否來自 cache)。
+        ZSET 依 follow 時間排序，用 rank 取頁，第幾頁的成本都一樣；cursor 是上一頁最後一筆的 "score:member"。
+        """
+        key = list_key(user_id, list_type, status)
+        hit = True
+        items, total = await _zset_page(key, limit, page, cursor)
+        if total is None:
+            hit = False
+            pin_primary(db)
+            gen = await get_gen(key)
+            rows = await self.list_follow_ids(db, user_id, list_type, status)
+            if await _build(key, rows, gen) or await get_redis().exists(key):
+                items, total = await _zset_page(key, limit, page, cursor)
+            else:
+                # 讀 DB 期間有變更，這次不寫回，直接用剛查到的資料
+                items, total = _rows_page(rows, limit, page, cursor)
+        has_more = len(items) > limit
+        items = items[:limit]
+        next_cursor = f"{int(items[-1][1])}:{items[-1][0]}" if has_more else None
+        return [tuple(m.split("|", 1)) for m, _ in items], total or 0, next_cursor, hit
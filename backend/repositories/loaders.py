@@ -0,0 +1,60 @@
+import asyncio
+from typing import Dict, Hashable, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, tuple_
+from models import User, Post, Follow
+from utils.loader import Loader
+
+class Loaders:
+    """
+    掛在 session.info 上，跟著 request 的 session 一起建立與丟棄（get_db 每個 request 一個 session）。
+    - users / posts：key 為 id 字串
+    - follows：key 為 (follower_id, following_id)，沒有關係時為 None
+    - follows_by_id：key 為 follows_id，查到的同時放進 follows
+    - extra(name, batch_fn)：其他 repo 自己的 batch 查詢（例如 events 要帶分區下界），第一次用到才建立
+    存的是 session identity map 裡的同一個物件，flush 後的修改自然看得到；刪除時要 clear。
+    """
+    def __init__(self, db: AsyncSession):
+        lock = asyncio.Lock()
+
+        async def users(ids: List[Hashable]) -> Dict[Hashable, User]:
+            res = await db.execute(select(User).where(User.user_id.in_(ids)))
+            return {str(u.user_id): u for u in res.scalars().all()}
+
+        async def posts(ids: List[Hashable]) -> Dict[Hashable, Post]:
+            res = await db.execute(select(Post).where(Post.post_id.in_(ids)))
+            return {str(p.post_id): p for p in res.scalars().all()}
+
+        async def follows(pairs: List[Hashable]) -> Dict[Hashable, Follow]:
+            res = await db.execute(select(Follow).where(tuple_(Follow.follower_id, Follow.following_id).in_(pairs)))
+            return {(str(f.follower_id), str(f.following_id)): f for f in res.scalars().all()}
+
+        async def follows_by_id(ids: List[Hashable]) -> Dict[Hashable, Follow]:
+            res = await db.execute(select(Follow).where(Follow.follows_id.in_(ids)))
+            found = {str(f.follows_id): f for f in res.scalars().all()}
+            for f in found.values():
+                self.follows.prime(pair(f.follower_id, f.following_id), f)
+            return found
+
+        self._lock = lock
+        self._extra: Dict[str, Loader] = {}
+        self.users = Loader("users", users, lock)
+        self.posts = Loader("posts", posts, lock)
+        self.follows = Loader("follows", follows, lock)
+        self.follows_by_id = Loader("follows_by_id", follows_by_id, lock)
+
+    def extra(self, name: str, batch_fn) -> Loader:
+        # 同一個 session 共用同一把鎖；batch_fn 只有第一次建立時會用到
+        loader = self._extra.get(name)
+        if loader is None:
+            loader = self._extra[name] = Loader(name, batch_fn, self._lock)
+        return loader
+
+def get_loaders(db: AsyncSession) -> Loaders:
+    loaders = db.info.get("loaders")
+    if loaders is None:
+        loaders = db.info["loaders"] = Loaders(db)
+    return loaders
+
+def pair(follower_id, following_id) -> Tuple[str, str]:
+    return str(follower_id), str(following_id)
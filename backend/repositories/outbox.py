@@ -0,0 +1,101 @@
+import os
+import asyncio
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Table, Column, MetaData, BigInteger, String, Integer, DateTime, Identity, Index
+from sqlalchemy import select, insert, delete, update, func, exists
+from sqlalchemy.dialects.postgresql import JSONB
+
+from utils.uow import after_commit
+
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+
+# 不放在 models：由 python -m jobs.maintenance ensure-schema 建立
+metadata = MetaData()
+outbox = Table(
+    "outbox", metadata,
+    Column("id", BigInteger, Identity(), primary_key=True),
+    Column("topic", String(64), nullable=False),
+    Column("payload", JSONB, nullable=False),
+    # 同一個 ordering_key 的資料依 id（= commit 順序）一筆一筆處理；NULL 表示不限順序
+    Column("ordering_key", String(128), nullable=True),
+    Column("attempts", Integer, nullable=False, server_default="0"),
+    Column("available_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+Index("ix_outbox_available_id", outbox.c.available_at, outbox.c.id)
+# claim 檢查同一個 key 有沒有更早的資料；表是在加這個欄位之前建的，由 ensure-indexes 補上
+ORDERING_INDEX = Index("ix_outbox_ordering_key_id", outbox.c.ordering_key, outbox.c.id)
+
+# 重試次數用完的資料搬到這裡，留給人工檢查或重新放回 outbox
+outbox_dead = Table(
+    "outbox_dead", metadata,
+    Column("id", BigInteger, primary_key=True),
+    Column("topic", String(64), nullable=False),
+    Column("payload", JSONB, nullable=False),
+    Column("ordering_key", String(128), nullable=True),
+    Column("attempts", Integer, nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("failed_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+# 本 worker 有新的 outbox 資料時喚醒 drain loop，不必等下一次輪詢
+_pending = asyncio.Event()
+
+async def notify() -> None:
+    _pending.set()
+
+async def wait_pending(timeout: float) -> None:
+    try:
+        await asyncio.wait_for(_pending.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+    _pending.clear()
+
+class OutboxRepo:
+    async def add(self, db: AsyncSession, topic: str, payload: Dict[str, Any], ordering_key: Optional[str] = None) -> None:
+        # 與業務資料同一個 transaction 寫入；commit 之後才叫醒 drain loop
+        await db.execute(insert(outbox).values(topic=topic, payload=payload, ordering_key=ordering_key))
+        after_commit(db, notify)
+
+    async def claim(self, db: AsyncSession, limit: int, ids: Optional[List[int]] = None) -> List[Any]:
+        # SKIP LOCKED：多個 worker 同時 drain 也不會拿到同一筆。
+        # 同一個 ordering_key 還有更早的資料（別的 worker 正在處理、或等待重試）就先跳過，
+        # 否則較新的變更可能先套用，之後才被較舊的蓋回去
+        earlier = outbox.alias("earlier")
+        stmt = (
+            select(outbox.c.id, outbox.c.topic, outbox.c.payload)
+            .where(outbox.c.available_at <= func.now())
+            .where(~exists().where(earlier.c.ordering_key == outbox.c.ordering_key, earlier.c.id < outbox.c.id))
+            .order_by(outbox.c.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        if ids is not None:
+            stmt = stmt.where(outbox.c.id.in_(ids))
+        return (await db.execute(stmt)).all()
+
+    async def remove(self, db: AsyncSession, ids: List[int]) -> None:
+        await db.execute(delete(outbox).where(outbox.c.id.in_(ids)))
+
+    async def retry_later(self, db: AsyncSession, ids: List[int], base_sec: float) -> List[Any]:
+        """
+        失敗的資料延後 base_sec * 2^attempts 秒再試；次數用完的搬到 outbox_dead（同一個 key 後面的資料才能繼續），
+        回傳搬走的 (id, topic, attempts)
+        """
+        rows = (await db.execute(
+            update(outbox)
+            .where(outbox.c.id.in_(ids))
+            .values(attempts=outbox.c.attempts + 1,
+                    available_at=func.now() + timedelta(seconds=base_sec) * func.power(2, outbox.c.attempts))
+            .returning(outbox.c.id, outbox.c.topic, outbox.c.attempts)
+        )).all()
+        dead = [r for r in rows if r.attempts >= OUTBOX_MAX_ATTEMPTS]
+        if dead:
+            dead_ids = [r.id for r in dead]
+            cols = ["id", "topic", "payload", "ordering_key", "attempts", "created_at"]
+            await db.execute(insert(outbox_dead).from_select(
+                cols, select(*(outbox.c[c] for c in cols)).where(outbox.c.id.in_(dead_ids))))
+            await db.execute(delete(outbox).where(outbox.c.id.in_(dead_ids)))
+        return dead
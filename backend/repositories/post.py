@@ -1,30 +1,46 @@
 from typing import Optional, Tuple, List, Dict, Set
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, exists
-from datetime import datetime
+from sqlalchemy import select, func, and_, or_, exists, insert, tuple_
+from datetime import datetime, timedelta
 from models import Post, PostImage, Like, Comment, User, Follow
+from utils.cache import get_redis, k
+from repositories.loaders import get_loaders, pair
+
+AFFINITY_DAYS = 30
+AFFINITY_TTL_SEC = 3600
+
+def affinity_key(viewer_id: str) -> str:
+    # HASH：author_id -> viewer 近 AFFINITY_DAYS 天對該作者貼文的按讚 + 留言數
+    return k("feed", str(viewer_id), "affinity")
 
 class PostsRepo:
     # ----- create / update / delete post -----
-    async def create_post(self, db: AsyncSession, *, user_id: str, content: str, metadata: Optional[dict] = None) -> Post:
-        p = Post(user_id=user_id, content=content, post_metadata=(metadata or {}))
-        db.add(p); await db.commit(); await db.refresh(p)
+    async def create_post(self, db: AsyncSession, *, user_id: str, content: str, metadata: Optional[dict] = None,
+                          post_id: Optional[str] = None) -> Post:
+        values = dict(user_id=user_id, content=content, post_metadata=(metadata or {}))
+        if post_id:
+            values["post_id"] = post_id
+        stmt = insert(Post).returning(Post)
+        res = await db.scalars(stmt, [values])
+        p = res.one()
+        get_loaders(db).posts.prime(str(p.post_id), p)
         return p
 
     async def touch_post_updated(self, db: AsyncSession, p: Post) -> None:
         p.updated_at = datetime.utcnow()
-        await db.commit(); await db.refresh(p)
+        await db.flush()
 
     async def delete_post(self, db: AsyncSession, p: Post) -> None:
-        await db.delete(p); await db.commit()
+        await db.delete(p); await db.flush()
+        get_loaders(db).posts.prime(str(p.post_id), None)
 
     # ----- images -----
     async def add_post_image(self, db: AsyncSession, *, post_id: str, url: str, order: int,
                              width: Optional[int], height: Optional[int], meta: Optional[dict] = None) -> PostImage:
-        img = PostImage(post_id=post_id, width=width, height=height, order=order, image_metadata=(meta or {}))
-        m = img.image_metadata or {}; m["url"] = url; img.image_metadata = m
-        db.add(img); await db.commit(); await db.refresh(img)
-        return img
+        m = dict(meta or {}); m["url"] = url
+        stmt = insert(PostImage).returning(PostImage)
+        res = await db.scalars(stmt, [dict(post_id=post_id, width=width, height=height, order=order, image_metadata=m)])
+        return res.one()
 
     async def list_post_images_by_posts(self, db: AsyncSession, post_ids: List[str]) -> Dict[str, List[PostImage]]:
         if not post_ids: return {}
@@ -36,9 +52,11 @@ class PostsRepo:
         return out
 
     # ----- query post -----
+    async def get_posts_by_ids(self, db: AsyncSession, post_ids: List[str]) -> Dict[str, Post]:
+        return await get_loaders(db).posts.load_many(str(p) for p in post_ids)
+
     async def get_post_by_id(self, db: AsyncSession, post_id: str) -> Optional[Post]:
-        res = await db.execute(select(Post).where(Post.post_id == post_id))
-        return res.scalar_one_or_none()
+        return await get_loaders(db).posts.load(str(post_id))
 
     async def list_posts(
         self, db: AsyncSession, *, viewer_id: str, user_id: Optional[str], search: Optional[str],
@@ -92,16 +110,60 @@ class PostsRepo:
         next_cursor = str(posts[-1].post_id) if posts else None
         return posts, next_cursor, total_pages
 
-    async def get_top2_comments_with_user(self, db: AsyncSession, post_id: str):
+    async def timeline_window(self, db: AsyncSession, *, viewer_id: str, limit: int,
+                              top: Optional[Tuple[datetime, str]] = None) -> List[Post]:
+        # 首頁時間軸（自己 + 已同意追蹤的人）由新到舊取 limit 筆；top 為含自己在內的上界 (created_at, post_id)
+        following_ids_sq = (
+            select(Follow.following_id)
+            .join(User, User.user_id == Follow.following_id)
+            .where(Follow.follower_id == viewer_id, Follow.status == "agree", User.status == "enabled")
+        )
+        stmt = select(Post).where(or_(Post.user_id == viewer_id, Post.user_id.in_(following_ids_sq)))
+        if top is not None:
+            stmt = stmt.where(tuple_(Post.created_at, Post.post_id) <= top)
+        stmt = stmt.order_by(Post.created_at.desc(), Post.post_id.desc()).limit(limit)
+        return (await db.execute(stmt)).scalars().all()
+
+    async def get_explore_posts(self, db: AsyncSession, post_ids: List[str]) -> List[Post]:
+        # 依傳入順序回傳；作者改成私人或被停用的貼文直接略過，不必回頭清 Redis
+        if not post_ids: return []
+        stmt = (
+            select(Post)
+            .join(User, User.user_id == Post.user_id)
+            .where(Post.post_id.in_(post_ids), User.is_public.is_(True), User.status == "enabled")
+        )
+        found = {str(p.post_id): p for p in (await db.execute(stmt)).scalars().all()}
+        return [found[pid] for pid in post_ids if pid in found]
+
+    async def get_visible_posts(self, db: AsyncSession, viewer_id: str, post_ids: List[str]) -> List[Post]:
+        # 與 can_view_user_posts 相同的規則，一次套在一批貼文上；依傳入順序回傳
+        if not post_ids: return []
+        followed = exists().where(and_(Follow.follower_id == viewer_id, Follow.following_id == Post.user_id, Follow.status == "agree"))
+        stmt = (
+            select(Post)
+            .join(User, User.user_id == Post.user_id)
+            .where(Post.post_id.in_(post_ids))
+            .where(or_(Post.user_id == viewer_id, and_(User.status == "enabled", or_(User.is_public.is_(True), followed))))
+        )
+        found = {str(p.post_id): p for p in (await db.execute(stmt)).scalars().all()}
+        return [found[pid] for pid in post_ids if pid in found]
+
+    async def get_top2_comments_by_posts(self, db: AsyncSession, post_ids: List[str]) -> Dict[str, List[Tuple[Comment, User]]]:
+        # 每篇取最新兩則，一個 row_number() 視窗查詢
+        if not post_ids: return {}
+        rn = func.row_number().over(partition_by=Comment.post_id, order_by=(Comment.created_at.desc(), Comment.comment_id.desc())).label("rn")
+        ranked = select(Comment.comment_id, rn).where(Comment.post_id.in_(post_ids)).subquery()
         stmt = (
             select(Comment, User)
+            .join(ranked, ranked.c.comment_id == Comment.comment_id)
             .join(User, User.user_id == Comment.user_id)
-            .where(Comment.post_id == post_id)
-            .order_by(Comment.created_at.desc(), Comment.comment_id.desc())
-            .limit(2)
+            .where(ranked.c.rn <= 2)
+            .order_by(Comment.post_id, Comment.created_at.desc(), Comment.comment_id.desc())
         )
-        res = await db.execute(stmt)
-        return res.all()
+        out: Dict[str, List[Tuple[Comment, User]]] = {}
+        for c, u in (await db.execute(stmt)).all():
+            out.setdefault(str(c.post_id), []).append((c, u))
+        return out
 
     async def list_comments(
         self,
@@ -136,33 +198,73 @@ class PostsRepo:
 
         return rows, total_pages
     # ----- permissions -----
-    async def can_view_user_posts(self, db: AsyncSession, viewer_id: str, target_user_id: str) -> bool:
-        if viewer_id == target_user_id:
+    async def _can_see(self, db: AsyncSession, viewer_id: str, target_user_id: str) -> bool:
+        # 作者與追蹤關係都走 request 內的 loader，同一個 request 重複檢查不會再查 DB
+        if str(viewer_id) == str(target_user_id):
             return True
-        u = await db.execute(select(User).where(User.user_id == target_user_id))
-        user = u.scalar_one_or_none()
+        loaders = get_loaders(db)
+        user = await loaders.users.load(str(target_user_id))
         if not user or user.status != "enabled":
             return False
         if user.is_public:
             return True
-        q = select(exists().where(and_(Follow.follower_id == viewer_id, Follow.following_id == target_user_id, Follow.status == "agree")))
-        res = await db.execute(q)
-        return bool(res.scalar())
+        follow = await loaders.follows.load(pair(viewer_id, target_user_id))
+        return bool(follow and follow.status == "agree")
+
+    async def can_view_user_posts(self, db: AsyncSession, viewer_id: str, target_user_id: str) -> bool:
+        return await self._can_see(db, viewer_id, target_user_id)
+
+    async def viewers_among(self, db: AsyncSession, author: User, user_ids: List[str]) -> Set[str]:
+        # user_ids 裡能看到 author 貼文的人（公開帳號全部都能看，私人帳號只有已同意的追蹤者）
+        if not user_ids or author.status != "enabled": return set()
+        if author.is_public: return set(user_ids)
+        res = await db.execute(select(Follow.follower_id).where(
+            Follow.following_id == author.user_id, Follow.follower_id.in_(user_ids), Follow.status == "agree"))
+        return {str(r) for r in res.scalars().all()}
 
     async def can_interact_with_user(self, db: AsyncSession, actor_id: str, target_user_id: str) -> bool:
-        if actor_id == target_user_id:
-            return True
-        u = await db.execute(select(User).where(User.user_id == target_user_id))
-        user = u.scalar_one_or_none()
-        if not user or user.status != "enabled":
-            return False
-        if user.is_public:
-            return True
-        q = select(exists().where(and_(Follow.follower_id == actor_id, Follow.following_id == target_user_id, Follow.status == "agree")))
-        res = await db.execute(q)
-        return bool(res.scalar())
+        return await self._can_see(db, actor_id, target_user_id)
+
+    # ----- ranking features -----
+    async def count_images(self, db: AsyncSession, post_ids: List[str]) -> Dict[str, int]:
+        if not post_ids: return {}
+        res = await db.execute(select(PostImage.post_id, func.count()).where(PostImage.post_id.in_(post_ids)).group_by(PostImage.post_id))
+        return {str(pid): c for pid, c in res.all()}
+
+    async def author_affinity(self, db: AsyncSession, viewer_id: str, author_ids: List[str]) -> Dict[str, int]:
+        """viewer 對每位作者的互動次數；先讀 Redis HASH，缺的作者一次查完再寫回（整個 HASH 一小時後過期重算）"""
+        if not author_ids: return {}
+        r = get_redis()
+        key = affinity_key(viewer_id)
+        cached = await r.hmget(key, author_ids)
+        out = {a: int(v) for a, v in zip(author_ids, cached) if v is not None}
+        missing = [a for a in author_ids if a not in out]
+        if not missing:
+            return out
+        since = datetime.utcnow() - timedelta(days=AFFINITY_DAYS)
+        fresh = dict.fromkeys(missing, 0)
+        likes = await db.execute(
+            select(Post.user_id, func.count()).join(Like, Like.post_id == Post.post_id)
+            .where(Like.user_id == viewer_id, Post.user_id.in_(missing), Like.created_at >= since).group_by(Post.user_id)
+        )
+        comments = await db.execute(
+            select(Post.user_id, func.count()).join(Comment, Comment.post_id == Post.post_id)
+            .where(Comment.user_id == viewer_id, Post.user_id.in_(missing), Comment.created_at >= since).group_by(Post.user_id)
+        )
+        for author, c in [*likes.all(), *comments.all()]:
+            fresh[str(author)] += c
+        pipe = r.pipeline(transaction=False)
+        pipe.hset(key, mapping=fresh)
+        pipe.expire(key, AFFINITY_TTL_SEC, nx=True)
+        await pipe.execute()
+        return {**out, **fresh}
 
     # ----- like / comment counts -----
+    async def count_posts_by_users(self, db: AsyncSession, user_ids: List[str]) -> Dict[str, int]:
+        if not user_ids: return {}
+        res = await db.execute(select(Post.user_id, func.count()).where(Post.user_id.in_(user_ids)).group_by(Post.user_id))
+        return {str(uid): c for uid, c in res.all()}
+
     async def get_post_counts_and_flags(
         self, db: AsyncSession, post_ids: List[str], viewer_id: Optional[str] = None
     ) -> Tuple[Dict[str, int], Dict[str, int], Set[str]]:
@@ -193,25 +295,25 @@ class PostsRepo:
     async def add_like(self, db: AsyncSession, *, user_id: str, post_id: str) -> None:
         if not await self.has_liked(db, user_id=user_id, post_id=post_id):
             l = Like(user_id=user_id, post_id=post_id)
-            db.add(l); await db.commit()
+            db.add(l); await db.flush()
 
     async def remove_like(self, db: AsyncSession, *, user_id: str, post_id: str) -> None:
         r = await db.execute(select(Like).where(Like.user_id == user_id, Like.post_id == post_id))
         like = r.scalar_one_or_none()
         if like:
-            await db.delete(like); await db.commit()
+            await db.delete(like); await db.flush()
 
     async def create_comment(self, db: AsyncSession, *, user_id: str, post_id: str, content: str) -> Comment:
-        c = Comment(user_id=user_id, post_id=post_id, content=content)
-        db.add(c); await db.commit(); await db.refresh(c)
-        return c
+        stmt = insert(Comment).returning(Comment)
+        res = await db.scalars(stmt, [dict(user_id=user_id, post_id=post_id, content=content)])
+        return res.one()
 
     async def get_comment_by_id(self, db: AsyncSession, comment_id: str) -> Optional[Comment]:
         r = await db.execute(select(Comment).where(Comment.comment_id == comment_id))
         return r.scalar_one_or_none()
 
     async def update_comment(self, db: AsyncSession, c: Comment) -> None:
-        await db.commit(); await db.refresh(c)
+        await db.flush()
 
     async def delete_comment(self, db: AsyncSession, c: Comment) -> None:
-        await db.delete(c); await db.commit()
+        await db.delete(c); await db.flush()
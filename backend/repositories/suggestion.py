@@ -0,0 +1,118 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, and_, exists
+from sqlalchemy.orm import aliased
+from models import Follow, User
+from utils.cache import get_redis, k
+
+SUGGEST_TTL_SEC = 2 * 24 * 3600
+# 空結果也要能分辨「算過了」與「還沒算」
+_SENTINEL = "~"
+
+def suggest_key(user_id: str) -> str:
+    # ZSET：member 為候選 user_id，score 為共同追蹤數
+    return k("suggest", str(user_id))
+
+def disabled_key() -> str:
+    # 被停用的 user；讀取時排除，停用後不必去改每個人的建議名單
+    return k("users", "disabled")
+
+# 只調整已經算好的名單；分數歸零就移除
+_ZINCR_IF_EXISTS_LUA = r"""
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+for i = 2, #ARGV do
+    local v = tonumber(redis.call('ZINCRBY', KEYS[1], ARGV[1], ARGV[i]))
+    if v <= 0 then
+        redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+return 1
+"""
+
+def _two_hop(f1, f2):
+    # f1: user -> 中間人，f2: 中間人 -> 候選；都必須是 agree。排除自己、已有關係（含 pending）與停用帳號
+    f3 = aliased(Follow)
+    return and_(
+        f1.status == "agree", f2.status == "agree",
+        f2.following_id != f1.follower_id,
+        ~exists().where(f3.follower_id == f1.follower_id, f3.following_id == f2.following_id),
+    )
+
+class SuggestionsRepo:
+    async def compute(self, db: AsyncSession, user_ids: List[str], limit: int) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        一批 user 一次 SQL：2-hop 候選依共同追蹤數排序，每人取前 limit 個。
+        回傳 {user_id: [(候選 user_id, 共同追蹤數)]}，沒有候選的 user 也會有空 list。
+        """
+        f1, f2 = aliased(Follow), aliased(Follow)
+        pairs = (
+            select(f1.follower_id.label("uid"), f2.following_id.label("cand"), func.count().label("mutual"))
+            .join(f2, f2.follower_id == f1.following_id)
+            .join(User, and_(User.user_id == f2.following_id, User.status == "enabled", User.role == "user"))
+            .where(f1.follower_id.in_(user_ids), _two_hop(f1, f2))
+            .group_by(f1.follower_id, f2.following_id)
+            .subquery()
+        )
+        rn = func.row_number().over(partition_by=pairs.c.uid, order_by=(pairs.c.mutual.desc(), pairs.c.cand))
+        ranked = select(pairs.c.uid, pairs.c.cand, pairs.c.mutual, rn.label("rn")).subquery()
+        res = await db.execute(select(ranked.c.uid, ranked.c.cand, ranked.c.mutual).where(ranked.c.rn <= limit))
+        out: Dict[str, List[Tuple[str, int]]] = {str(u): [] for u in user_ids}
+        for uid, cand, mutual in res.all():
+            out[str(uid)].append((str(cand), int(mutual)))
+        return out
+
+    async def new_candidates(self, db: AsyncSession, user_id: str, via_user_id: str) -> List[str]:
+        # user 追蹤 via 之後多出來的候選：via 追蹤的人（扣掉 user 已有關係的）
+        f1, f2 = aliased(Follow), aliased(Follow)
+        res = await db.execute(
+            select(f2.following_id)
+            .select_from(f1)
+            .join(f2, f2.follower_id == f1.following_id)
+            .join(User, and_(User.user_id == f2.following_id, User.status == "enabled", User.role == "user"))
+            .where(f1.follower_id == user_id, f1.following_id == via_user_id, _two_hop(f1, f2))
+        )
+        return [str(c) for c in res.scalars().all()]
+
+    async def followees_of(self, db: AsyncSession, user_id: str) -> List[str]:
+        res = await db.execute(select(Follow.following_id).where(Follow.follower_id == user_id, Follow.status == "agree"))
+        return [str(c) for c in res.scalars().all()]
+
+    async def store(self, results: Dict[str, List[Tuple[str, int]]]) -> None:
+        # 整份替換；MULTI 讓讀取端不會看到刪到一半的名單
+        pipe = get_redis().pipeline(transaction=True)
+        for uid, cands in results.items():
+            key = suggest_key(uid)
+            pipe.delete(key)
+            pipe.zadd(key, {_SENTINEL: float("-inf"), **{c: m for c, m in cands}})
+            pipe.expire(key, SUGGEST_TTL_SEC)
+        await pipe.execute()
+
+    async def adjust(self, user_id: str, candidates: Iterable[str], delta: int) -> None:
+        candidates = list(candidates)
+        if candidates:
+            await get_redis().eval(_ZINCR_IF_EXISTS_LUA, 1, suggest_key(user_id), delta, *candidates)
+
+    async def remove(self, user_id: str, candidate: str) -> None:
+        await get_redis().zrem(suggest_key(user_id), candidate)
+
+    async def read(self, user_id: str, limit: int) -> Optional[List[Tuple[str, int]]]:
+        # 尚未計算時回 None；多取一些，扣掉停用帳號後仍夠 limit 筆
+        r = get_redis()
+        key = suggest_key(user_id)
+        rows = await r.zrevrange(key, 0, limit * 2, withscores=True)
+        if not rows:
+            return None
+        rows = [(m.decode(), int(s)) for m, s in rows if m.decode() != _SENTINEL]
+        if rows:
+            flags = await r.smismember(disabled_key(), [m for m, _ in rows])
+            rows = [row for row, disabled in zip(rows, flags) if not disabled]
+        return rows[:limit]
+
+    async def set_disabled(self, user_id: str, disabled: bool) -> None:
+        r = get_redis()
+        if disabled:
+            await r.sadd(disabled_key(), str(user_id))
+        else:
+            await r.srem(disabled_key(), str(user_id))
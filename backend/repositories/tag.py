@@ -0,0 +1,160 @@
+import os
+import secrets
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Table, Column, MetaData, String, DateTime, Index, PrimaryKeyConstraint
+from sqlalchemy import select, delete, tuple_
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
+
+from utils.cache import get_redis, k, gen_key, get_gen, bump_gen
+from utils.uow import after_commit, pin_primary
+from utils.ids import micros, from_micros
+
+# 每個 tag 的最新貼文放在 ZSET（分數為 created_at 微秒），只留前 TAG_RECENT_MAX 筆；更舊的頁直接查 post_tags
+TAG_RECENT_MAX = int(os.getenv("TAG_RECENT_MAX", "1000"))
+TAG_RECENT_TTL_SEC = int(os.getenv("TAG_RECENT_TTL_SEC", str(24 * 3600)))
+_SENTINEL = "~"
+
+# 不放在 models：由 python -m jobs.maintenance ensure-schema 建立
+metadata = MetaData()
+post_tags = Table(
+    "post_tags", metadata,
+    Column("tag", String(64), nullable=False),
+    Column("post_id", UUID(as_uuid=False), nullable=False),
+    # 與 posts.created_at 相同，複製一份讓 tag 時間軸只靠這張表的索引
+    Column("created_at", DateTime, nullable=False),
+    PrimaryKeyConstraint("tag", "post_id"),
+)
+Index("ix_post_tags_tag_created", post_tags.c.tag, post_tags.c.created_at, post_tags.c.post_id)
+Index("ix_post_tags_post", post_tags.c.post_id)
+
+def tag_key(tag: str) -> str:
+    return k("tags", tag, "posts")
+
+# 先建在暫存 key，正式 key 不存在、且讀 DB 之後沒有套用過變更（generation 沒變）才 RENAME；
+# 否則快照可能少了建構期間新增的貼文，哨兵又會讓讀取以為 ZSET 是完整的
+_BUILD_LUA = r"""
+local gen = redis.call('GET', KEYS[3]) or ''
+if redis.call('EXISTS', KEYS[2]) == 1 or gen ~= ARGV[2] then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return 1
+"""
+
+# 只更新已建好的時間軸並維持長度上限。哨兵代表「ZSET 裡就是全部」，一旦截斷就拿掉，讀到底時改查 DB
+_ZADD_TRIM_IF_EXISTS_LUA = r"""
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+local max = tonumber(ARGV[3])
+if redis.call('ZCARD', KEYS[1]) > max then
+    redis.call('ZREM', KEYS[1], '~')
+    local n = redis.call('ZCARD', KEYS[1]) - max
+    if n > 0 then
+        redis.call('ZREMRANGEBYRANK', KEYS[1], 0, n - 1)
+    end
+end
+return 1
+"""
+
+async def _add_to_timelines(tags: List[str], post_id: str, score: int) -> None:
+    pipe = get_redis().pipeline(transaction=False)
+    for t in tags:
+        pipe.eval(_ZADD_TRIM_IF_EXISTS_LUA, 1, tag_key(t), score, post_id, TAG_RECENT_MAX)
+        bump_gen(pipe, tag_key(t))
+    await pipe.execute()
+
+async def _remove_from_timelines(tags: List[str], post_id: str) -> None:
+    pipe = get_redis().pipeline(transaction=False)
+    for t in tags:
+        pipe.zrem(tag_key(t), post_id)
+        bump_gen(pipe, tag_key(t))
+    await pipe.execute()
+
+class TagsRepo:
+    async def add(self, db: AsyncSession, post_id: str, tags: Iterable[str], created_at: datetime) -> None:
+        tags = sorted(set(tags))
+        if not tags:
+            return
+        await db.execute(
+            pg_insert(post_tags)
+            .values([{"tag": t, "post_id": str(post_id), "created_at": created_at} for t in tags])
+            .on_conflict_do_nothing()
+        )
+        after_commit(db, _add_to_timelines, tags, str(post_id), micros(created_at))
+
+    async def remove(self, db: AsyncSession, post_id: str, tags: Optional[Iterable[str]] = None) -> List[str]:
+        # tags 為 None 時移除這篇貼文的全部 tag（刪文）；回傳實際移除的 tag
+        stmt = delete(post_tags).where(post_tags.c.post_id == str(post_id))
+        if tags is not None:
+            tags = list(tags)
+            if not tags:
+                return []
+            stmt = stmt.where(post_tags.c.tag.in_(tags))
+        removed = list((await db.execute(stmt.returning(post_tags.c.tag))).scalars().all())
+        if removed:
+            after_commit(db, _remove_from_timelines, removed, str(post_id))
+        return removed
+
+    async def _recent_from_db(self, db: AsyncSession, tag: str, limit: int,
+                              before: Optional[Tuple[datetime, str]] = None) -> List[Tuple[str, int]]:
+        stmt = select(post_tags.c.post_id, post_tags.c.created_at).where(post_tags.c.tag == tag)
+        if before is not None:
+            stmt = stmt.where(tuple_(post_tags.c.created_at, post_tags.c.post_id) < before)
+        stmt = stmt.order_by(post_tags.c.created_at.desc(), post_tags.c.post_id.desc()).limit(limit)
+        return [(str(pid), micros(created)) for pid, created in (await db.execute(stmt)).all()]
+
+    async def _build(self, db: AsyncSession, tag: str) -> bool:
+        # 回傳是否換上了這次建的 ZSET
+        key = tag_key(tag)
+        gen = await get_gen(key)
+        rows = await self._recent_from_db(db, tag, TAG_RECENT_MAX)
+        r = get_redis()
+        tmp = f"{key}:build:{secrets.token_hex(4)}"
+        members = {pid: score for pid, score in rows}
+        if len(rows) < TAG_RECENT_MAX:
+            members[_SENTINEL] = float("-inf")
+        await r.zadd(tmp, members)
+        return bool(await r.eval(_BUILD_LUA, 3, tmp, key, gen_key(key), TAG_RECENT_TTL_SEC, gen))
+
+    async def page(self, db: AsyncSession, tag: str, limit: int,
+                   cursor: Optional[Tuple[int, str]]) -> Tuple[List[Tuple[str, int]], bool]:
+        """
+        依 (created_at, post_id) 由新到舊，回傳 ([(post_id, score)] 最多 limit+1 筆, 是否來自 cache)。
+        cursor 為上一頁最後一筆的 (score, post_id)。ZSET 只有最新的 TAG_RECENT_MAX 筆，讀到截斷處就改查 DB 接下去。
+        """
+        r = get_redis()
+        key = tag_key(tag)
+        hit = True
+        if not await r.exists(key):
+            hit = False
+            pin_primary(db)
+            if not await self._build(db, tag) and not await r.exists(key):
+                # 建構期間有變更，這次不寫回，直接查 DB
+                before = (from_micros(cursor[0]), cursor[1]) if cursor else None
+                return await self._recent_from_db(db, tag, limit + 1, before), False
+        max_score = "+inf" if cursor is None else cursor[0]
+        rows = await r.zrevrangebyscore(key, max_score, "-inf", start=0, num=limit + 2 + (cursor is not None),
+                                        withscores=True)
+        items: List[Tuple[str, int]] = []
+        complete = False
+        for m, s in rows:
+            m = m.decode()
+            if m == _SENTINEL:
+                complete = True
+                break
+            if cursor is not None and (int(s), m) >= cursor:
+                continue
+            items.append((m, int(s)))
+        if len(items) > limit or complete:
+            return items[:limit + 1], hit
+        # ZSET 被截斷過，剩下的從 DB 接著查
+        last = (items[-1][1], items[-1][0]) if items else cursor
+        before = (from_micros(last[0]), last[1]) if last else None
+        items += await self._recent_from_db(db, tag, limit + 1 - len(items), before)
+        return items, False
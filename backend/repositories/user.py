@@ -1,26 +1,64 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
+from sqlalchemy import func, insert
 from datetime import datetime
 from models import User
 from utils.auth import hash_password
+from utils.cache import k
+from utils import cache
+from utils.uow import pin_primary
+from repositories.loaders import get_loaders
+
+# 列表顯示用的精簡使用者資料；follow 清單、建議名單等共用，使用者更新時只刪這一個 key
+CARD_TTL_SEC = 3600
+
+def card_key(user_id: str) -> str:
+    return k("card", str(user_id))
+
+def user_card(u: User) -> dict:
+    return {"user_id": str(u.user_id), "name": u.name, "username": u.username, "metadata": u.user_metadata or {}}
 
 class UsersRepo:
     async def create_user(self, db: AsyncSession, email: str, username: str, password: str) -> User:
-        new_user = User(
+        stmt = insert(User).returning(User)
+        res = await db.scalars(stmt, [dict(
             email=email.lower(),
             username=username.lower(),
             password_hash=hash_password(password),
             last_login_at=datetime.utcnow(),
-        )
-        db.add(new_user)
-        await db.commit()
-        await db.refresh(new_user)
-        return new_user
+        )])
+        user = res.one()
+        get_loaders(db).users.prime(str(user.user_id), user)
+        return user
 
     async def get_by_id(self, db: AsyncSession, user_id: str) -> User | None:
-        result = await db.execute(select(User).where(User.user_id == user_id))
-        return result.scalar_one_or_none()
+        return await get_loaders(db).users.load(str(user_id))
+
+    async def get_many(self, db: AsyncSession, user_ids) -> dict[str, User]:
+        if not user_ids:
+            return {}
+        return await get_loaders(db).users.load_many(str(u) for u in user_ids)
+
+    async def get_by_usernames(self, db: AsyncSession, usernames) -> dict[str, User]:
+        # username 註冊時已轉小寫；只回傳啟用中的帳號
+        if not usernames:
+            return {}
+        result = await db.execute(select(User).where(User.username.in_(list(usernames)), User.status == "enabled"))
+        return {u.username: u for u in result.scalars().all()}
+
+    async def get_cards(self, db: AsyncSession, user_ids: list[str]) -> dict[str, dict]:
+        # MGET 一次拿完，miss 的用一個 IN 查詢補齊再 pipeline 寫回；不存在的 user 不會出現在結果裡
+        ids = list(dict.fromkeys(str(i) for i in user_ids))
+        if not ids:
+            return {}
+        cards = {uid: c for uid, c in zip(ids, await cache.get_many([card_key(i) for i in ids])) if c is not None}
+        missing = [i for i in ids if i not in cards]
+        if missing:
+            pin_primary(db)
+            users = await self.get_many(db, missing)
+            cards.update({uid: user_card(u) for uid, u in users.items()})
+            await cache.set_many((card_key(uid), cards[uid], CARD_TTL_SEC) for uid in users)
+        return cards
 
     async def get_by_email(self, db: AsyncSession, email: str) -> User | None:
         result = await db.execute(select(User).where(func.lower(User.email) == email.lower()))
@@ -42,20 +80,17 @@ class UsersRepo:
         for k, v in update_data.items():
             setattr(user, k, v)
         user.updated_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(user)
+        await db.flush()
         return user
 
     async def touch_last_login(self, db: AsyncSession, user: User):
         user.last_login_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(user)
+        await db.flush()
 
     async def update_status(self, db: AsyncSession, user: User, status: str) -> User:
         from datetime import datetime
         user.status = status
         user.disabled_at = None if status == "enabled" else datetime.utcnow()
         user.updated_at = datetime.utcnow()
-        await db.commit()
-        await db.refresh(user)
+        await db.flush()
         return user
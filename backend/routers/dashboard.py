@@ -5,9 +5,18 @@ from zoneinfo import ZoneInfo
 
 from utils.auth import get_current_user
 from utils.mongo import get_mongo_collection
-from services.analytics import get_daily_docs_in_range
+from utils.cache import k, get_json, set_json, get_redis
+from utils import live_metrics
+from services.analytics import (
+    get_daily_docs_in_range, get_rollups_in_range, bucket_start, bucket_end, DASHBOARD_GEN_KEY, DAILY_METRICS,
+)
 
 router = APIRouter(tags=["dashboard"])
+TZ_TAIPEI = ZoneInfo("Asia/Taipei")
+
+# 保險用的上限；正常情況下下一次聚合 gen 變動就不會再讀到舊快取
+CACHE_TTL_SEC = 2 * 24 * 3600
+LIVE_DAYS = live_metrics.LIVE_TTL_SEC // (24 * 3600)
 
 def _parse_date(s: Optional[str]) -> Optional[date]:
     if not s:
@@ -17,107 +26,200 @@ def _parse_date(s: Optional[str]) -> Optional[date]:
     except Exception:
         raise HTTPException(status_code=422, detail="Invalid date format, use YYYY-MM-DD")
 
-async def _get_range_defaults() -> Tuple[Optional[date], Optional[date]]:
-    # 從 Mongo 取最早與最晚的日期作為預設
-    coll = get_mongo_collection()
-    first = await coll.find().sort("_id", 1).limit(1).to_list(1)
-    last  = await coll.find().sort("_id", -1).limit(1).to_list(1)
-    s = date.fromisoformat(first[0]["_id"]) if first else None
-    e = date.fromisoformat(last[0]["_id"])  if last else None
+async def _get_range_defaults(gen: int) -> Tuple[Optional[date], Optional[date]]:
+    # 從 Mongo 取最早與最晚的日期作為預設；同一輪聚合內結果不變，所以跟著 gen 快取
+    cache_key = k("dashboard", str(gen), "range")
+    cached = await get_json(cache_key)
+    if cached is None:
+        coll = get_mongo_collection()
+        first = await coll.find({}, {"_id": 1}).sort("_id", 1).limit(1).to_list(1)
+        last  = await coll.find({}, {"_id": 1}).sort("_id", -1).limit(1).to_list(1)
+        cached = [first[0]["_id"] if first else None, last[0]["_id"] if last else None]
+        await set_json(cache_key, cached, ttl_sec=CACHE_TTL_SEC)
+    s = date.fromisoformat(cached[0]) if cached[0] else None
+    e = date.fromisoformat(cached[1]) if cached[1] else None
     return s, e
 
-def _sum_field(docs: List[Dict[str, Any]], field: str) -> int:
-    return sum(int(doc.get(field, 0)) for doc in docs)
-
-def _group_by_weeks(docs: List[Dict[str, Any]], start_d: date, end_d: date, field: str):
+def _segments(kind: str, start_d: date, end_d: date) -> List[Tuple[date, date, bool]]:
+    # 依自然週（週一起）/ 自然月切段，頭尾被 start/end 截斷；第三個值表示是否為完整 bucket
     out = []
     cur = start_d
-    idx = 0
     while cur <= end_d:
-        win_start = cur
-        win_end = min(end_d, cur + timedelta(days=6))
-        # 取範圍內文件
-        seg = []
-        while idx < len(docs):
-            d = date.fromisoformat(docs[idx]["_id"])
-            if d < win_start:
-                idx += 1
-                continue
-            if d > win_end:
-                break
-            seg.append(docs[idx])
-            idx += 1
-        out.append({
-            "start_date": win_start.isoformat(),
-            "end_date": win_end.isoformat(),
-            "count": _sum_field(seg, field),
-        })
-        cur = win_end + timedelta(days=1)
+        b_start = bucket_start(kind, cur)
+        b_end = bucket_end(kind, b_start)
+        seg_end = min(end_d, b_end)
+        out.append((cur, seg_end, cur == b_start and seg_end == b_end))
+        cur = seg_end + timedelta(days=1)
     return out
 
-def _month_range_edges(start_d: date, end_d: date) -> List[Tuple[date, date]]:
-    # 產生跨月邊界：每一段是一個自然月區間（被 start/end 截斷）
-    out = []
-    y, m = start_d.year, start_d.month
-    cur_start = start_d
-    while True:
-        # 下個月第一天
-        if m == 12:
-            next_first = date(y + 1, 1, 1) # 取下一個月的第一天，之後再減掉一天變成這個月的最後一天，因為每個月可能是30天或31天等等，直接取這個月的最後一天比較麻煩
-        else:
-            next_first = date(y, m + 1, 1)
-        cur_end = min(end_d, next_first - timedelta(days=1)) # 若區間跨過月份就取這個月份，若區間沒有跨過月份就取到區間的最後一天
-        out.append((cur_start, cur_end))
-        if cur_end >= end_d: # 若剛好取到區間的最後一天就結束迴圈
-            break
-        # 下一段的起點為下個月的第一天
-        cur_start = cur_end + timedelta(days=1)
-        y, m = cur_start.year, cur_start.month
+def _bucket_pipeline(kind: str, fields: List[str]) -> List[Dict[str, Any]]:
+    # 以 bucket 起始日分組加總；$match 已經限制在區間內，所以頭尾 bucket 只會加到區間內的天
+    trunc: Dict[str, Any] = {"date": "$_d", "unit": kind}
+    if kind == "week":
+        trunc["startOfWeek"] = "monday"
+    return [{"$group": {
+        "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": {"$dateTrunc": trunc}}},
+        **{f: {"$sum": {"$ifNull": [f"${f}", 0]}} for f in fields},
+    }}]
+
+async def _scan_days(start_d: date, end_d: date, fields: List[str], only: Optional[str]) -> Dict[str, Any]:
+    """
+    一次 aggregation 掃過區間內的日資料，用 $facet 同時算出逐日、週、月與總計（所有指標一起）。
+    """
+    facets: Dict[str, Any] = {
+        "day": [{"$sort": {"_id": 1}}, {"$project": {f: {"$ifNull": [f"${f}", 0]} for f in fields}}],
+        "total": [{"$group": {"_id": None, **{f: {"$sum": {"$ifNull": [f"${f}", 0]}} for f in fields}}}],
+    }
+    if only is None:
+        facets["week"] = _bucket_pipeline("week", fields)
+        facets["month"] = _bucket_pipeline("month", fields)
+    pipeline = [
+        {"$match": {"_id": {"$gte": start_d.isoformat(), "$lte": end_d.isoformat()}}},
+        {"$addFields": {"_d": {"$dateFromString": {"dateString": "$_id"}}}},
+        {"$facet": facets},
+    ]
+    res = await get_mongo_collection().aggregate(pipeline).to_list(1)
+    out = res[0] if res else {}
+    return {
+        "day": out.get("day", []),
+        "total": (out.get("total") or [{}])[0],
+        "week": {doc["_id"]: doc for doc in out.get("week", [])},
+        "month": {doc["_id"]: doc for doc in out.get("month", [])},
+    }
+
+async def _buckets_from_rollups(kind: str, start_d: date, end_d: date, fields: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    只要週或月時不掃日資料：完整的 bucket 直接讀 rollup，只有頭尾不完整的段落才讀日資料，
+    讀取量只跟 bucket 數有關，不跟天數有關。回傳 bucket 起始日 -> 各指標加總。
+    """
+    segments = _segments(kind, start_d, end_d)
+    full = [seg for seg in segments if seg[2]]
+    out = await get_rollups_in_range(kind, full[0][0], full[-1][1]) if full else {}
+    for seg_start, seg_end, is_full in segments:
+        if is_full:
+            continue
+        acc = {f: 0 for f in fields}
+        for doc in await get_daily_docs_in_range(seg_start, seg_end):
+            for f in fields:
+                acc[f] += int(doc.get(f, 0))
+        out[bucket_start(kind, seg_start).isoformat()] = acc
     return out
 
-def _group_by_months(docs: List[Dict[str, Any]], start_d: date, end_d: date, field: str):
-    out = []
-    idx = 0
-    for seg_start, seg_end in _month_range_edges(start_d, end_d):
-        seg_docs = []
-        while idx < len(docs):
-            d = date.fromisoformat(docs[idx]["_id"])
-            if d < seg_start:
-                idx += 1
-                continue
-            if d > seg_end:
-                break
-            seg_docs.append(docs[idx])
-            idx += 1
-        out.append({
-            "start_date": seg_start.isoformat(),
-            "end_date": seg_end.isoformat(),
-            "count": _sum_field(seg_docs, field),
-        })
+def _bucket_counts(kind: str, start_d: date, end_d: date, sums: Dict[str, Dict[str, Any]], field: str):
+    # 沒有資料的 bucket 也要輸出 count=0
+    return [{
+        "start_date": seg_start.isoformat(),
+        "end_date": seg_end.isoformat(),
+        "count": int(sums.get(bucket_start(kind, seg_start).isoformat(), {}).get(field, 0)),
+    } for seg_start, seg_end, _ in _segments(kind, start_d, end_d)]
+
+async def _shape_metrics(start_d: date, end_d: date, fields: List[str], only: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    week_sums: Dict[str, Dict[str, Any]] = {}
+    month_sums: Dict[str, Dict[str, Any]] = {}
+    if only in (None, "day"):
+        scan = await _scan_days(start_d, end_d, fields, only)
+        days, totals = scan["day"], scan["total"]
+        week_sums, month_sums = scan["week"], scan["month"]
+    else:
+        days = []
+        if only == "week":
+            week_sums = await _buckets_from_rollups("week", start_d, end_d, fields)
+        else:
+            month_sums = await _buckets_from_rollups("month", start_d, end_d, fields)
+        sums = week_sums or month_sums
+        totals = {f: sum(int(v.get(f, 0)) for v in sums.values()) for f in fields}
+
+    out = {}
+    for f in fields:
+        out[f] = {
+            "day_count": [{"start_date": doc["_id"], "count": int(doc.get(f, 0))} for doc in days],
+            "week_count": _bucket_counts("week", start_d, end_d, week_sums, f) if only in (None, "week") else [],
+            "month_count": _bucket_counts("month", start_d, end_d, month_sums, f) if only in (None, "month") else [],
+            "total": int(totals.get(f, 0)),
+        }
     return out
 
-def _shape_response(docs: List[Dict[str, Any]], start_d: date, end_d: date, field: str, only: Optional[str]):
-    day_count = [{"start_date": doc["_id"], "count": int(doc.get(field, 0))} for doc in docs]
-    week_count = _group_by_weeks(docs, start_d, end_d, field)
-    month_count = _group_by_months(docs, start_d, end_d, field)
-    total = _sum_field(docs, field)
+def _empty_shape() -> Dict[str, Any]:
+    return {"day_count": [], "week_count": [], "month_count": [], "total": 0}
+
+def _merge_live_day(shaped: Dict[str, Any], d: date, count: int, only: Optional[str]) -> None:
+    # 把某一天的即時數字接在歷史資料後面：延伸同一個週 / 月 bucket，或開一個新的 bucket
+    iso = d.isoformat()
+    if only in (None, "day"):
+        shaped["day_count"].append({"start_date": iso, "count": count})
+    for kind in ("week", "month"):
+        if only not in (None, kind):
+            continue
+        segs = shaped[f"{kind}_count"]
+        if segs and bucket_start(kind, date.fromisoformat(segs[-1]["start_date"])) == bucket_start(kind, d):
+            segs[-1]["end_date"] = iso
+            segs[-1]["count"] += count
+        else:
+            segs.append({"start_date": iso, "end_date": iso, "count": count})
+    shaped["total"] += count
+
+async def _cached_metrics(fields: List[str], start_date: Optional[str], end_date: Optional[str],
+                          only: Optional[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    已聚合的日子讀 Mongo（依 gen 快取）；最後一筆日統計之後到今天的日子，
+    接上 Redis 的即時計數（不快取），所以 dashboard 不用等到隔天 03:00 才看得到數字。
+    """
+    gen = int(await get_redis().get(DASHBOARD_GEN_KEY) or 0)
+    s_def, e_def = await _get_range_defaults(gen)
+    today = datetime.now(tz=TZ_TAIPEI).date()
+    s_in = _parse_date(start_date) or s_def or today # 有start_date就取start_date，沒有值的話再取最早的日統計
+    e_in = _parse_date(end_date) or today
+    if e_in < s_in:
+        raise HTTPException(status_code=422, detail="end_date must be >= start_date")
 
-    # 若 type 指定，就清空其它欄位（保留key，value為空陣列）
-    if only == "day":
-        week_count, month_count = [], []
-    elif only == "week":
-        day_count, month_count = [], []
-    elif only == "month":
-        day_count, week_count = [], []
+    shaped: Optional[Dict[str, Dict[str, Any]]] = None
+    hist_end = min(e_in, e_def) if e_def else None
+    if hist_end and s_in <= hist_end:
+        # 同一輪聚合之間資料不會變，整個回應依 (metrics, range, type) 快取到下一次聚合
+        cache_key = k("dashboard", str(gen), ",".join(fields), s_in.isoformat(), hist_end.isoformat(), only or "all")
+        shaped = await get_json(cache_key)
+        if shaped is None:
+            shaped = await _shape_metrics(s_in, hist_end, fields, only)
+            await set_json(cache_key, shaped, ttl_sec=CACHE_TTL_SEC)
+
+    # 即時 key 只保留幾天，更早的日子不用去 Redis 找
+    d = max(s_in, e_def + timedelta(days=1) if e_def else s_in, today - timedelta(days=LIVE_DAYS - 1))
+    live_days = [d + timedelta(days=i) for i in range((min(e_in, today) - d).days + 1)]
+    # 幾天的即時 key 一個 pipeline 讀完；dict 依 live_days 的順序
+    for d, live in (await live_metrics.read_days(live_days)).items():
+        if live["has_data"]:
+            shaped = shaped or {f: _empty_shape() for f in fields}
+            for f in fields:
+                _merge_live_day(shaped[f], d, int(live.get(f, 0)), only)
+    return shaped
+
+def _require_admin(current) -> None:
+    if current["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
 
-    return {
-        "data": {
-            "day_count": day_count,
-            "week_count": week_count,
-            "month_count": month_count,
-            "total": total,
-        }
-    }
+async def _dashboard_count(field: str, start_date: Optional[str], end_date: Optional[str], only: Optional[str]):
+    shaped = await _cached_metrics([field], start_date, end_date, only)
+    if shaped is None:
+        # 尚無任何日統計
+        return {"data": _empty_shape()}
+    return {"data": shaped[field]}
+
+@router.get("/dashboard/metrics")
+async def dashboard_metrics(
+    metrics: Optional[str] = Query(None, description="comma separated, e.g. user_count,post_count"),
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    type: Optional[str] = Query(None, pattern="^(day|week|month)$"),
+    current=Depends(get_current_user),
+):
+    # 一次回傳多個指標，只掃一次日資料；admin 頁面不用每個指標各打一支 API
+    _require_admin(current)
+    fields = sorted({m.strip() for m in metrics.split(",") if m.strip()}) if metrics else sorted(DAILY_METRICS)
+    unknown = [f for f in fields if f not in DAILY_METRICS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown metrics: {', '.join(unknown)}")
+    shaped = await _cached_metrics(fields, start_date, end_date, type)
+    return {"data": {"metrics": shaped or {f: _empty_shape() for f in fields}}}
 
 @router.get("/dashboard/user-count")
 async def dashboard_user_count(
@@ -126,23 +228,8 @@ async def dashboard_user_count(
     type: Optional[str] = Query(None, pattern="^(day|week|month)$"),
     current=Depends(get_current_user),
 ):
-    if current["role"] != "admin":
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    s_in = _parse_date(start_date)
-    e_in = _parse_date(end_date)
-    if not (s_in and e_in): # 若其中一個沒有值，就先訂出最早以及最晚的日期
-        s_def, e_def = await _get_range_defaults()
-        if s_def is None or e_def is None:
-            # 尚無任何日統計
-            return {"data": {"day_count": [], "week_count": [], "month_count": [], "total": 0}}
-        s_in = s_in or s_def # 有s_in就取s_in， s_in沒有值的話再取s_def
-        e_in = e_in or e_def
-    if e_in < s_in:
-        raise HTTPException(status_code=422, detail="end_date must be >= start_date")
-
-    docs = await get_daily_docs_in_range(s_in, e_in)
-    return _shape_response(docs, s_in, e_in, field="user_count", only=type)
+    _require_admin(current)
+    return await _dashboard_count("user_count", start_date, end_date, type)
 
 @router.get("/dashboard/post-count")
 async def dashboard_post_count(
@@ -151,19 +238,5 @@ async def dashboard_post_count(
     type: Optional[str] = Query(None, pattern="^(day|week|month)$"),
     current=Depends(get_current_user),
 ):
-    if current["role"] != "admin":
-        raise HTTPException(status_code=403, detail="Not authorized")
-
-    s_in = _parse_date(start_date)
-    e_in = _parse_date(end_date)
-    if not (s_in and e_in):
-        s_def, e_def = await _get_range_defaults()
-        if s_def is None or e_def is None:
-            return {"data": {"day_count": [], "week_count": [], "month_count": [], "total": 0}}
-        s_in = s_in or s_def
-        e_in = e_in or e_def
-    if e_in < s_in:
-        raise HTTPException(status_code=422, detail="end_date must be >= start_date")
-
-    docs = await get_daily_docs_in_range(s_in, e_in)
-    return _shape_response(docs, s_in, e_in, field="post_count", only=type)
+    _require_admin(current)
+    return await _dashboard_count("post_count", start_date, end_date, type)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from utils.auth import get_current_user
+from utils import metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics")
+async def get_metrics(current=Depends(get_current_user)):
+    if current["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {"data": metrics.snapshot()}
@@ -1,12 +1,16 @@
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional, Literal
 
-EventType = Literal["friend_request", "friend_agree"]
+EventType = Literal["friend_request", "friend_agree", "mention"]
 
 class Pagination(BaseModel):
-    page: int
     limit: int
-    total: int  # 總頁數
+    # 帶 page 時的舊分頁
+    page: Optional[int] = None
+    total: Optional[int] = None  # 總頁數
+    # cursor 分頁：把 cursor_event_id 帶回下一次請求
+    cursor_event_id: Optional[str] = None
+    has_more: Optional[bool] = None
 
 class EventItem(BaseModel):
     event_id: str
@@ -35,3 +39,15 @@ class UnreadCountData(BaseModel):
 class UnreadCountResponse(BaseModel):
     data: UnreadCountData
     message: str = "ok"
+
+class StreamTokenData(BaseModel):
+    token: str
+    expires_in: int  # 秒
+
+class StreamTokenResponse(BaseModel):
+    data: StreamTokenData
+    message: str = "ok"
+
+class ReadAllResponse(BaseModel):
+    data: UnreadCountData  # count 為這次標成已讀的筆數
+    message: str = "ok"
@@ -5,8 +5,9 @@ from typing import Literal, List, Dict, Optional
 class FollowListQuery(BaseModel):
     type: Literal['follower', 'following']
     status: Literal['pending', 'agree']
-    page: int = 1
+    page: Optional[int] = None
     limit: int = 10
+    cursor: Optional[str] = None
 
 # Response user item
 class FollowUserItem(BaseModel):
@@ -14,11 +15,16 @@ class FollowUserItem(BaseModel):
     name: Optional[str] = None
     username: str
     metadata: Optional[Dict] = {}
+    follows_id: Optional[str] = None
 
 class FollowListPagination(BaseModel):
-    page: int
     limit: int
-    total: int   # 總頁數
+    # 帶 page 時的舊分頁
+    page: Optional[int] = None
+    total: Optional[int] = None   # 總頁數
+    # cursor 分頁：把 cursor 帶回下一次請求
+    cursor: Optional[str] = None
+    has_more: Optional[bool] = None
 
 class FollowListData(BaseModel):
     users: List[FollowUserItem]
@@ -23,7 +23,9 @@ class PostListItem(BaseModel):
 class PostListPagination(BaseModel):
     limit: int
     cursor_post_id: Optional[str] = None
-    total: int  # 總頁數
+    total: Optional[int] = None  # 總頁數（mode=recent）
+    cursor: Optional[str] = None  # mode=ranked
+    has_more: Optional[bool] = None
 
 class PostListData(BaseModel):
     posts: List[PostListItem]
@@ -32,6 +34,18 @@ class PostListData(BaseModel):
 class PostListResponse(BaseModel):
     data: PostListData
 
+class ExplorePagination(BaseModel):
+    limit: int
+    cursor: Optional[str] = None
+    has_more: bool
+
+class ExploreData(BaseModel):
+    posts: List[PostListItem]
+    pagination: ExplorePagination
+
+class ExploreResponse(BaseModel):
+    data: ExploreData
+
 class PostDetailCommentUser(BaseModel):
     user_id: str
     name: Optional[str] = None
@@ -60,6 +74,16 @@ class PostDetailResponse(BaseModel):
     data: PostDetailData
     message: str = "ok"
 
+# /posts:batch：依 ids 順序回傳；不存在的放 missing，沒權限的放 forbidden
+class PostBatchData(BaseModel):
+    posts: List[PostDetailData]
+    missing: List[str]
+    forbidden: List[str]
+
+class PostBatchResponse(BaseModel):
+    data: PostBatchData
+    message: str = "ok"
+
 class PostCreateData(BaseModel):
     post_id: str
 
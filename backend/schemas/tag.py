@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import List
+
+from schemas.post import PostListItem, ExplorePagination
+
+class TagPostsData(BaseModel):
+    tag: str
+    posts: List[PostListItem]
+    pagination: ExplorePagination
+
+class TagPostsResponse(BaseModel):
+    data: TagPostsData
@@ -81,3 +81,25 @@ class UserListResponse(BaseModel):
 
 class UserDetailResponse(BaseModel):
     data: UserDetailData
+
+# /users:batch：依 ids 順序回傳，查不到的放 missing
+class UserBatchData(BaseModel):
+    users: List[UserDetailData]
+    missing: List[str]
+
+class UserBatchResponse(BaseModel):
+    data: UserBatchData
+
+# /users/suggestions：可能認識的人，mutual_count 為共同追蹤數
+class SuggestedUser(BaseModel):
+    user_id: str
+    name: Optional[str] = None
+    username: str
+    metadata: Optional[Dict] = {}
+    mutual_count: int
+
+class SuggestionsData(BaseModel):
+    users: List[SuggestedUser]
+
+class SuggestionsResponse(BaseModel):
+    data: SuggestionsData
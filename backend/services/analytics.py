@@ -1,25 +1,64 @@
 from datetime import date, datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
-from typing import Tuple, Dict, Any, List
+from typing import Tuple, Dict, Any, List, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, cast, TIMESTAMP
+from sqlalchemy import select, func, cast, literal, union_all, TIMESTAMP
+from pymongo import UpdateOne
 
-from models import User, Post
-from utils.mongo import get_mongo_collection
+from models import User, Post, Like, Comment, Follow
+from utils.mongo import get_mongo_collection, get_job_state_collection, get_rollup_collection
+from utils.cache import get_redis, k
 
 TZ_TAIPEI = ZoneInfo("Asia/Taipei")
 
-async def _count_users_on_local_day(db: AsyncSession, d: date) -> int:
-    # date(timezone('Asia/Taipei', created_at::timestamptz)) = d
-    expr = func.date(func.timezone('Asia/Taipei', cast(User.created_at, TIMESTAMP(timezone=True))))
-    q = select(func.count()).select_from(User).where(expr == d)
-    return (await db.execute(q)).scalar_one()
+# 日統計欄位 -> 用來計數的時間欄位（需要有對應索引）
+DAILY_METRICS = {
+    "user_count": User.created_at,
+    "post_count": Post.created_at,
+    "like_count": Like.created_at,
+    "comment_count": Comment.created_at,
+    "follow_count": Follow.created_at,
+    "active_user_count": User.last_login_at,
+}
+# last_login_at 只保留最後一次登入，只有「昨天」算出來的值是準的；
+# 回補舊日期時不覆寫這類欄位，以免把當時的數字改小
+SNAPSHOT_METRICS = {"active_user_count"}
 
-async def _count_posts_on_local_day(db: AsyncSession, d: date) -> int:
-    expr = func.date(func.timezone('Asia/Taipei', cast(Post.created_at, TIMESTAMP(timezone=True))))
-    q = select(func.count()).select_from(Post).where(expr == d)
-    return (await db.execute(q)).scalar_one()
+BACKFILL_JOB_ID = "daily_stats_backfill"
+# 每次聚合完成就 +1，dashboard 的回應快取 key 帶著它，新資料進來舊快取自然失效
+DASHBOARD_GEN_KEY = k("dashboard", "gen")
+
+def _local_range_utc(start_d: date, end_d: date) -> Tuple[datetime, datetime]:
+    # 台北時間 [start_d 00:00, end_d+1 00:00) 轉成 UTC（naive，與 DB 內 utcnow() 寫入的值一致）
+    start_local = datetime(start_d.year, start_d.month, start_d.day, tzinfo=TZ_TAIPEI)
+    end_local = datetime(end_d.year, end_d.month, end_d.day, tzinfo=TZ_TAIPEI) + timedelta(days=1)
+    return (start_local.astimezone(timezone.utc).replace(tzinfo=None),
+            end_local.astimezone(timezone.utc).replace(tzinfo=None))
+
+async def count_metrics_by_local_day(db: AsyncSession, start_d: date, end_d: date) -> Dict[date, Dict[str, int]]:
+    """
+    一次 GROUP BY 算出區間內每天每個指標的數量。
+    WHERE 直接比較 created_at 的 UTC 範圍（可以走索引），台北日期只在 SELECT/GROUP BY 才換算。
+    """
+    start_utc, end_utc = _local_range_utc(start_d, end_d)
+    branches = [
+        select(literal(field).label("metric"), col.label("ts")).where(col >= start_utc, col < end_utc)
+        for field, col in DAILY_METRICS.items()
+    ]
+    rows = union_all(*branches).subquery()
+    local_day = func.date(func.timezone('Asia/Taipei', func.timezone('UTC', cast(rows.c.ts, TIMESTAMP()))))
+    stmt = select(rows.c.metric, local_day.label("d"), func.count()).group_by(rows.c.metric, local_day)
+
+    out: Dict[date, Dict[str, int]] = {}
+    cur = start_d
+    while cur <= end_d:
+        out[cur] = {field: 0 for field in DAILY_METRICS}
+        cur += timedelta(days=1)
+    for metric, d, c in (await db.execute(stmt)).all():
+        if d in out:
+            out[d][metric] = int(c)
+    return out
 
 def _day_window(d: date) -> Dict[str, str]:
     start_local = datetime(d.year, d.month, d.day, 0, 0, 0, tzinfo=TZ_TAIPEI)
@@ -33,22 +72,98 @@ def _day_window(d: date) -> Dict[str, str]:
         "end_utc":     end_utc.isoformat(),
     }
 
+async def compute_and_upsert_range(db: AsyncSession, start_d: date, end_d: date,
+                                   overrides: Optional[Dict[date, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    # overrides: 額外要寫進某天文件的欄位（例如即時計數留下的 hourly 與 HLL 活躍人數）
+    counts = await count_metrics_by_local_day(db, start_d, end_d)
+    for d, extra in (overrides or {}).items():
+        if d in counts:
+            counts[d].update(extra)
+    now_t = datetime.now(tz=TZ_TAIPEI)
+    snapshot_from = now_t.date() - timedelta(days=1)
+    docs = [{
+        "_id": d.isoformat(),      # e.g., "2025-09-13"
+        "date": d.isoformat(),
+        "tz": "Asia/Taipei",
+        "window": _day_window(d),
+        **{f: v for f, v in values.items() if d >= snapshot_from or f not in SNAPSHOT_METRICS},
+        "generated_at": now_t.isoformat(),
+    } for d, values in sorted(counts.items())]
+    if docs:
+        coll = get_mongo_collection()
+        await coll.bulk_write([UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True) for doc in docs], ordered=False)
+        await update_rollups(start_d, end_d)
+    return docs
+
+# ----- week / month rollups -----
+def bucket_start(kind: str, d: date) -> date:
+    # 週以星期一為起點，月以 1 號為起點
+    return d - timedelta(days=d.weekday()) if kind == "week" else d.replace(day=1)
+
+def bucket_end(kind: str, start: date) -> date:
+    if kind == "week":
+        return start + timedelta(days=6)
+    next_first = date(start.year + 1, 1, 1) if start.month == 12 else date(start.year, start.month + 1, 1)
+    return next_first - timedelta(days=1)
+
+async def update_rollups(start_d: date, end_d: date) -> None:
+    """重新彙總與 [start_d, end_d] 有交集的整週、整月，upsert 到 rollup collection（_id 為 bucket 起始日）"""
+    for kind in ("week", "month"):
+        lo = bucket_start(kind, start_d)
+        hi = bucket_end(kind, bucket_start(kind, end_d))
+        sums: Dict[date, Dict[str, int]] = {}
+        for doc in await get_daily_docs_in_range(lo, hi):
+            b = bucket_start(kind, date.fromisoformat(doc["_id"]))
+            acc = sums.setdefault(b, {field: 0 for field in DAILY_METRICS})
+            for field in DAILY_METRICS:
+                acc[field] += int(doc.get(field, 0))
+        ops = [UpdateOne({"_id": b.isoformat()}, {"$set": {
+            "start_date": b.isoformat(), "end_date": bucket_end(kind, b).isoformat(), **values,
+        }}, upsert=True) for b, values in sums.items()]
+        if ops:
+            await get_rollup_collection(kind).bulk_write(ops, ordered=False)
+    await get_redis().incr(DASHBOARD_GEN_KEY)
+
+async def get_rollups_in_range(kind: str, start_d: date, end_d: date) -> Dict[str, Dict[str, Any]]:
+    # 回傳 bucket 起始日 (iso) -> rollup doc，只含完整落在 [start_d, end_d] 內的 bucket
+    coll = get_rollup_collection(kind)
+    cursor = coll.find({"_id": {"$gte": start_d.isoformat(), "$lte": end_d.isoformat()}})
+    return {doc["_id"]: doc async for doc in cursor if doc["end_date"] <= end_d.isoformat()}
+
 async def compute_and_upsert_daily_stats(db: AsyncSession, local_day: date) -> Dict[str, Any]:
-    users = await _count_users_on_local_day(db, local_day)
-    posts = await _count_posts_on_local_day(db, local_day)
+    docs = await compute_and_upsert_range(db, local_day, local_day)
+    return docs[0]
 
-    doc = {
-        "_id": local_day.isoformat(),      # e.g., "2025-09-13"
-        "date": local_day.isoformat(),
-        "tz": "Asia/Taipei",
-        "window": _day_window(local_day),
-        "user_count": int(users),
-        "post_count": int(posts),
-        "generated_at": datetime.now(tz=TZ_TAIPEI).isoformat(),
-    }
-    coll = get_mongo_collection()
-    await coll.update_one({"_id": doc["_id"]}, {"$set": doc}, upsert=True)
-    return doc
+async def get_backfill_checkpoint() -> Optional[Dict[str, Any]]:
+    return await get_job_state_collection().find_one({"_id": BACKFILL_JOB_ID})
+
+async def backfill_daily_stats(db: AsyncSession, start_d: date, end_d: date, chunk_days: int = 31,
+                               resume: bool = True) -> date:
+    """
+    依 chunk_days 分段回補 [start_d, end_d]，每段完成就記錄 last_completed。
+    resume=True 且上次的區間相同時，從 last_completed 的隔天繼續。回傳最後完成的日期。
+    """
+    state = get_job_state_collection()
+    cur = start_d
+    if resume:
+        ckpt = await get_backfill_checkpoint()
+        if ckpt and ckpt.get("start") == start_d.isoformat() and ckpt.get("end") == end_d.isoformat():
+            cur = date.fromisoformat(ckpt["last_completed"]) + timedelta(days=1)
+
+    last_done = cur - timedelta(days=1)
+    while cur <= end_d:
+        seg_end = min(end_d, cur + timedelta(days=chunk_days - 1))
+        await compute_and_upsert_range(db, cur, seg_end)
+        last_done = seg_end
+        await state.update_one(
+            {"_id": BACKFILL_JOB_ID},
+            {"$set": {"start": start_d.isoformat(), "end": end_d.isoformat(),
+                      "last_completed": seg_end.isoformat(),
+                      "updated_at": datetime.now(tz=TZ_TAIPEI).isoformat()}},
+            upsert=True,
+        )
+        cur = seg_end + timedelta(days=1)
+    return last_done
 
 async def get_daily_docs_in_range(start_d: date, end_d: date) -> List[Dict[str, Any]]:
     # 取回閉區間 [start_d, end_d] 的資料。因為_id 為 'YYYY-MM-DD'，字典序與日期序相容，可直接以字串過濾。
@@ -1,28 +1,48 @@
+import os
+import uuid
+import asyncio
+import orjson
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, Optional, AsyncIterator
 
 from repositories.event import EventsRepo
+from utils.uow import UnitOfWork, pin_primary
+from utils.event_bus import hub, event_payload
+
+STREAM_HEARTBEAT_SEC = float(os.getenv("EVENT_STREAM_HEARTBEAT_SEC", "15"))
+STREAM_REPLAY_MAX = int(os.getenv("EVENT_STREAM_REPLAY_MAX", "100"))
+
+def _check_cursor(cursor_event_id: Optional[str]) -> None:
+    if cursor_event_id:
+        try:
+            uuid.UUID(cursor_event_id)
+        except Exception:
+            raise HTTPException(status_code=422, detail="Invalid cursor_event_id")
+
+def _sse(payload: Dict[str, Any], event: str = "event") -> bytes:
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (payload["event_id"].encode(), event.encode(), orjson.dumps(payload))
 
 class EventsService:
     def __init__(self, repo: EventsRepo):
         self.repo = repo
 
-    async def list_events(self, db: AsyncSession, current, page: int, limit: int) -> Dict[str, Any]:
-        if page < 1 or limit < 1:
+    async def list_events(self, db: AsyncSession, current, page: Optional[int], limit: int,
+                          cursor_event_id: Optional[str] = None) -> Dict[str, Any]:
+        if limit < 1 or (page is not None and page < 1):
             raise HTTPException(status_code=422, detail="page and limit must be >= 1")
-        items, total_pages = await self.repo.list_events(db, user_id=current["user_id"], page=page, limit=limit)
-        data = {
-            "events": [{
-                "event_id": str(e.event_id),
-                "message": e.message,
-                "is_read": e.is_read,
-                "type": e.type,
-                "metadata": e.event_metadata or {}
-            } for e in items],
-            "pagination": {"page": page, "limit": limit, "total": total_pages}
-        }
-        return {"data": data}
+        # 回應帶 ETag（版本號在 commit 後才 bump）：從落後的 replica 讀到的舊資料配上新的 ETag，之後會一直 304
+        pin_primary(db)
+        if page is not None:
+            items, total_pages = await self.repo.list_events(db, user_id=current["user_id"], page=page, limit=limit)
+            pagination = {"page": page, "limit": limit, "total": total_pages}
+        else:
+            _check_cursor(cursor_event_id)
+            items, next_cursor = await self.repo.list_events_after(
+                db, user_id=current["user_id"], limit=limit, cursor_event_id=cursor_event_id
+            )
+            pagination = {"limit": limit, "cursor_event_id": next_cursor, "has_more": next_cursor is not None}
+        return {"data": {"events": [event_payload(e) for e in items], "pagination": pagination}}
 
     async def read_event(self, db: AsyncSession, current, event_id: str) -> Dict[str, Any]:
         event = await self.repo.get_by_id(db, event_id)
@@ -32,12 +52,75 @@ class EventsService:
             raise HTTPException(status_code=403, detail="You do not have permission to read this event.")
         if event.is_read:
             raise HTTPException(status_code=400, detail="You have already read event.")
-        event = await self.repo.mark_read(db, event)
+        async with UnitOfWork(db):
+            event = await self.repo.mark_read(db, event)
         return {"data": {"event_id": str(event.event_id)}, "message": "ok"}
 
+    async def read_all_events(self, db: AsyncSession, current, cursor_event_id: Optional[str]) -> Dict[str, Any]:
+        _check_cursor(cursor_event_id)
+        async with UnitOfWork(db):
+            n = await self.repo.mark_all_read(db, user_id=current["user_id"], cursor_event_id=cursor_event_id)
+        return {"data": {"count": n}, "message": "ok"}
+
     async def unread_count(self, db: AsyncSession, current) -> Dict[str, Any]:
-        c = await self.repo.count_unread(db, user_id=current["user_id"])
+        c = await self.repo.cached_unread(db, user_id=current["user_id"])
         return {"data": {"count": c}, "message": "ok"}
 
+    async def open_stream(self, db: AsyncSession, current, last_event_id: Optional[str]) -> AsyncIterator[bytes]:
+        """
+        SSE 推播：
+        1. 先訂閱，再從 DB 補 last_event_id 之後的事件，兩段之間發生的事件靠 event_id 去重
+        2. 補完就關掉 DB session，長連線期間不佔連線池
+        3. 佇列塞滿 / Redis 斷線時送 reconnect 並結束，client 帶 Last-Event-ID 重連補齊
+        """
+        user_id = current["user_id"]
+        sub = await hub.subscribe(user_id)
+        replay: List[Dict[str, Any]] = []
+        resync = False
+        try:
+            if last_event_id:
+                _check_cursor(last_event_id)
+                # 補送一定要讀 primary，replica 落後會漏掉剛寫入的事件
+                db.info["pinned_primary"] = True
+                items = await self.repo.list_events_since(
+                    db, user_id=user_id, last_event_id=last_event_id, limit=STREAM_REPLAY_MAX + 1
+                )
+                if items is None or len(items) > STREAM_REPLAY_MAX:
+                    # cursor 已不存在或落後太多，請 client 改用 GET /events 重新載入
+                    resync = True
+                else:
+                    replay = [event_payload(e) for e in items]
+        except BaseException:
+            await hub.unsubscribe(sub)
+            raise
+        finally:
+            await db.close()
+        return self._stream(sub, replay, resync)
+
+    async def _stream(self, sub, replay: List[Dict[str, Any]], resync: bool) -> AsyncIterator[bytes]:
+        try:
+            yield b"retry: 3000\n\n"
+            if resync:
+                yield b"event: resync\ndata: {}\n\n"
+            sent = set()
+            for payload in replay:
+                sent.add(payload["event_id"])
+                yield _sse(payload)
+            while not sub.lagged:
+                try:
+                    payload = await asyncio.wait_for(sub.queue.get(), timeout=STREAM_HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    # 註解行當心跳，順便讓斷線的 client 盡早被發現
+                    yield b": ping\n\n"
+                    continue
+                if payload is None or sub.lagged:
+                    break
+                if payload["event_id"] in sent:
+                    continue
+                yield _sse(payload)
+            yield b"event: reconnect\ndata: {}\n\n"
+        finally:
+            await hub.unsubscribe(sub)
+
 def get_events_service() -> EventsService:
     return EventsService(EventsRepo())
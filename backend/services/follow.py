@@ -1,13 +1,19 @@
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, List, Optional
+import re
 import uuid
 from copy import deepcopy
 
-from repositories.follow import FollowsRepo
+from repositories.follow import FollowsRepo, apply_follow_changes, follow_score
 from repositories.user import UsersRepo
-from repositories.event import EventsRepo
-from utils.cache import k, get_json, set_json, delete, delete_pattern
+from repositories.event import EventsRepo, COALESCE_TYPES
+from repositories.outbox import OutboxRepo
+from utils.cache import k, invalidate_many, body_key
+from utils.uow import UnitOfWork
+from utils import live_metrics, versions
+
+_CURSOR_RE = re.compile(r"-?\d+:[0-9a-fA-F-]{36}\|[0-9a-fA-F-]{36}")
 
 def _as_uuid(id_str: str) -> uuid.UUID:
     try:
@@ -15,41 +21,52 @@ def _as_uuid(id_str: str) -> uuid.UUID:
     except Exception:
         raise HTTPException(status_code=400, detail="User does not exist.")
 
+def _actor(u) -> Dict[str, Any]:
+    return {"user_id": str(u.user_id), "username": u.username, "name": u.name}
+
+def _follow_request_message(sample: List[Dict[str, Any]], count: int) -> str:
+    first = sample[0]
+    name = first.get("name") or first["username"]
+    if count <= 1:
+        return f"{name} sent you a follow request"
+    others = count - 1
+    return f"{name} and {others} other{'s' if others > 1 else ''} requested to follow you"
+
+def _pair_keys(follower_id: str, following_id: str) -> List[str]:
+    # follow 清單由 ZSET 增量維護，這裡只剩雙方互看的使用者詳細資料（資料與序列化好的 body）
+    keys = [k("user", following_id, "viewer", follower_id), k("user", follower_id, "viewer", following_id)]
+    return keys + [body_key(key) for key in keys]
+
 class FollowsService:
-    def __init__(self, repo: FollowsRepo, users_repo: UsersRepo, events_repo: EventsRepo):
+    def __init__(self, repo: FollowsRepo, users_repo: UsersRepo, events_repo: EventsRepo, outbox_repo: OutboxRepo):
         self.repo = repo
         self.users = users_repo
         self.events = events_repo
+        self.outbox = outbox_repo
 
-    async def list_follows(self, db: AsyncSession, current, list_type: str, status: str, page: int, limit: int):
+    async def list_follows(self, db: AsyncSession, current, list_type: str, status: str, page: Optional[int], limit: int,
+                           cursor: Optional[str] = None):
         if list_type not in ("follower", "following"):
             raise HTTPException(status_code=422, detail="type must be 'follower' or 'following'")
         if status not in ("pending", "agree"):
             raise HTTPException(status_code=422, detail="status must be 'pending' or 'agree'")
-        if page < 1 or limit < 1:
+        if limit < 1 or (page is not None and page < 1):
             raise HTTPException(status_code=422, detail="page and limit must be >= 1")
+        if cursor and not _CURSOR_RE.fullmatch(cursor):
+            raise HTTPException(status_code=422, detail="Invalid cursor")
 
-        cache_key = k("follows_v2", current["user_id"], list_type, status, str(page), str(limit))
-        cached = await get_json(cache_key)
-        if cached:
-            return cached, "HIT"
-
-        items, total_pages = await self.repo.list_follows(
-            db, current_user_id=current["user_id"], list_type=list_type, status=status, page=page, limit=limit
+        # id 清單來自 ZSET，使用者資料來自 user card（MGET）；follow 變更與使用者更新各自只動少數 key
+        items, total, next_cursor, hit = await self.repo.page_follows(
+            db, current["user_id"], list_type, status, limit, page=None if cursor else (page or 1), cursor=cursor
         )
-        data = {
-            "users": [{
-                "user_id": str(u.user_id),
-                "name": u.name,
-                "username": u.username,
-                "metadata": (u.user_metadata or {}),
-                "follows_id": follows_id
-            } for (u, follows_id) in items],
-            "pagination": {"page": page, "limit": limit, "total": total_pages}
-        }
-        ttl = 15 if status == "pending" else 300
-        await set_json(cache_key, data, ttl_sec=ttl)
-        return data, "MISS"
+        cards = await self.users.get_cards(db, [uid for uid, _ in items])
+        users = [{**cards[uid], "follows_id": fid} for uid, fid in items if uid in cards]
+        if cursor or page is None:
+            pagination = {"limit": limit, "cursor": next_cursor, "has_more": next_cursor is not None}
+        else:
+            pagination = {"page": page, "limit": limit, "total": (total + limit - 1) // limit,
+                          "cursor": next_cursor, "has_more": next_cursor is not None}
+        return {"users": users, "pagination": pagination}, ("HIT" if hit else "MISS")
 
     async def request_follow(self, db: AsyncSession, current, user_id: str):
         follower_id = _as_uuid(current["user_id"])
@@ -65,58 +82,31 @@ class FollowsService:
 
         exist = await self.repo.get_by_pair(db, str(follower_id), str(following_id))
         if exist:
-            await delete_pattern(k("follows", str(follower_id), "*"))
-            await delete_pattern(k("follows", str(following_id), "*"))
-            await delete_pattern(k("follows_v2", str(follower_id), "*"))
-            await delete_pattern(k("follows_v2", str(following_id), "*"))
-            await delete(k("user", str(following_id), "viewer", str(follower_id)))
-            await delete(k("user", str(follower_id), "viewer", str(following_id)))
+            # 已經有關係就不動，也不需要清任何快取
             return {"data": {"follows_id": str(exist.follows_id), "status": exist.status}, "message": "ok"}
 
         initial_status = "agree" if target.is_public else "pending"
-        follow = await self.repo.create_request(db, str(follower_id), str(following_id), initial_status)
-        
-        await delete_pattern(k("follows", str(follower_id), "*"))
-        await delete_pattern(k("follows", str(following_id), "*"))
-        await delete_pattern(k("follows_v2", str(follower_id), "*"))
-        await delete_pattern(k("follows_v2", str(following_id), "*"))
-        await delete(k("events", str(following_id), "1", "10"))
-        await delete(k("user", str(following_id), "viewer", str(follower_id)))
-        await delete(k("user", str(follower_id), "viewer", str(following_id)))
-
-        follower_user = await self.users.get_by_id(db, follower_id)
-        
-        if not target.is_public:
-            await self.events.create_event(
-                db,
-                user_id=str(following_id),
-                type="friend_request",
-                message=f"{(follower_user.name or follower_user.username)} sent you a follow request",
-                metadata={
-                    "follower": {
-                        "user_id": str(follower_user.user_id),
-                        "username": follower_user.username,
-                        "metadata": deepcopy(follower_user.user_metadata or {})
-                    },
-                    "follows_id": str(follow.follows_id)
-                }
-            )
-        else:
-            await self.events.create_event(
-                db,
-                user_id=str(follower_id),
-                type="friend_agree",
-                message=f"{target.username} accepted your follow request",
-                metadata={
-                    "following": {
-                        "user_id": str(target.user_id),
-                        "username": target.username,
-                        "metadata": deepcopy(target.user_metadata or {})
-                    }
-                }
-            )
+        # follow 與 outbox 同一個 transaction；event、cache 失效、推播都交給 outbox worker
+        async with UnitOfWork(db) as uow:
+            follow = await self.repo.create_request(db, str(follower_id), str(following_id), initial_status)
+            await self._enqueue(db, follow, "friend_agree" if target.is_public else "friend_request", initial_status)
+            uow.after_commit(live_metrics.bump, "follow_count")
         return {"data": {"follows_id": str(follow.follows_id), "status": initial_status}, "message": "ok"}
 
+    async def _enqueue(self, db: AsyncSession, follow, event: Optional[str], status: Optional[str] = None) -> None:
+        # status：變更後的狀態（pending / agree），刪除時為 deleted
+        # 同一組 pair 的變更要依 commit 順序套用（清單 ZSET、建議名單都是增量更新），用 pair 當 ordering_key
+        await self.outbox.add(db, "follow", {
+            "follows_id": str(follow.follows_id),
+            "follower_id": str(follow.follower_id),
+            "following_id": str(follow.following_id),
+            "event": event,
+            "status": status or follow.status,
+            # 刪除前是 pending 還是 agree（建議名單要知道是否少了一條 agree 邊）
+            "prev_status": follow.status if status == "deleted" else None,
+            "created_at_ms": follow_score(follow.created_at),
+        }, ordering_key=f"follow:{follow.follower_id}:{follow.following_id}")
+
     async def act_on_follow(self, db: AsyncSession, current, follows_id: str, body) -> Dict[str, Any]:
         follow = await self.repo.get_by_id(db, follows_id)
         if not follow:
@@ -126,40 +116,27 @@ class FollowsService:
         if body.status == "delete":
             if follow.follower_id != me:
                 raise HTTPException(status_code=403, detail="You do not have permission to modify this relationship.")
-            await self.repo.delete_follow(db, follow)
-            await self.clear_follow_caches(follow)
+            async with UnitOfWork(db):
+                await self.repo.delete_follow(db, follow)
+                await self._enqueue(db, follow, None, "deleted")
             return {"data": {"follows_id": follows_id}, "message": "ok"}
 
         if follow.following_id != me:
             raise HTTPException(status_code=403, detail="You do not have permission to modify this relationship.")
 
         if body.status == "reject":
-            await self.repo.delete_follow(db, follow)
-            await self.clear_follow_caches(follow)
+            async with UnitOfWork(db):
+                await self.repo.delete_follow(db, follow)
+                await self._enqueue(db, follow, None, "deleted")
             return {"data": {"follows_id": follows_id}, "message": "ok"}
 
         if body.status == "agree":
             if follow.status == "agree":
-                await self.clear_follow_caches(follow)
                 return {"data": {"follows_id": follows_id, "status": "agree"}, "message": "ok"}
-            
-            follow = await self.repo.update_status(db, follow, "agree")
-            following_user = await self.users.get_by_id(db, follow.following_id)
-            await self.events.create_event(
-                db,
-                user_id=str(follow.follower_id),
-                type="friend_agree",
-                message=f"{following_user.username} accepted your follow request",
-                metadata={
-                    "following": {
-                        "user_id": str(following_user.user_id),
-                        "username": following_user.username,
-                        "metadata": deepcopy(following_user.user_metadata or {})
-                    },
-                    "follows_id": str(follow.follows_id)
-                }
-            )
-            await self.clear_follow_caches(follow)
+
+            async with UnitOfWork(db):
+                follow = await self.repo.update_status(db, follow, "agree")
+                await self._enqueue(db, follow, "friend_agree", "agree")
             return {"data": {"follows_id": str(follow.follows_id), "status": "agree"}, "message": "ok"}
 
         raise HTTPException(status_code=422, detail="Unsupported status")
@@ -171,17 +148,80 @@ class FollowsService:
         me = _as_uuid(current["user_id"])
         if follow.follower_id != me and follow.following_id != me:
             raise HTTPException(status_code=403, detail="You do not have permission to modify this relationship.")
-        await self.repo.delete_follow(db, follow)
-        await self.clear_follow_caches(follow)
+        async with UnitOfWork(db):
+            await self.repo.delete_follow(db, follow)
+            await self._enqueue(db, follow, None, "deleted")
         return {"data": {"follows_id": follows_id}, "message": "ok"}
 
-    async def clear_follow_caches(self, follow):
-        await delete_pattern(k("follows", str(follow.follower_id), "*"))
-        await delete_pattern(k("follows", str(follow.following_id), "*"))
-        await delete_pattern(k("follows_v2", str(follow.follower_id), "*"))
-        await delete_pattern(k("follows_v2", str(follow.following_id), "*"))
-        await delete(k("user", str(follow.following_id), "viewer", str(follow.follower_id)))
-        await delete(k("user", str(follow.follower_id), "viewer", str(follow.following_id)))
+    async def apply_outbox(self, db: AsyncSession, payloads: List[Dict[str, Any]], uow: UnitOfWork) -> None:
+        """
+        outbox worker 呼叫：一批 follow 變更一起處理
+        - 需要的使用者一次查完，建立 event（unread 計數與推播在 worker commit 後觸發）
+        - 同一組 pair 的 cache 只清一次；follow 本身早已 commit，所以可以在 commit 前清
+        - Redis 端整批合併：清單變更一個 pipeline、viewer 詳細資料一個 DEL、收件者的 event 快取 commit 後一個 DEL
+        """
+        with_event = [p for p in payloads if p.get("event")]
+        users = await self.users.get_many(db, {p[f] for p in with_event for f in ("follower_id", "following_id")})
+        # friend_request 依收件者分組，一組只寫（或合併進）一筆 event
+        requests: Dict[str, List[Tuple[Any, str]]] = {}
+        event_keys: List[str] = []
+        for p in with_event:
+            follower, following = users.get(p["follower_id"]), users.get(p["following_id"])
+            if not follower or not following:
+                continue
+            if p["event"] == "friend_request":
+                requests.setdefault(str(following.user_id), []).append((follower, p["follows_id"]))
+                continue
+            await self.events.create_event(
+                db,
+                user_id=str(follower.user_id),
+                type="friend_agree",
+                message=f"{following.username} accepted your follow request",
+                metadata={
+                    "following": {
+                        "user_id": str(following.user_id),
+                        "username": following.username,
+                        "metadata": deepcopy(following.user_metadata or {})
+                    },
+                    "follows_id": p["follows_id"]
+                }
+            )
+            event_keys.append(k("events", str(follower.user_id), "1", "10"))
+        for recipient, items in requests.items():
+            await self._emit_follow_requests(db, recipient, items)
+            event_keys.append(k("events", recipient, "1", "10"))
+        if event_keys:
+            uow.after_commit(invalidate_many, event_keys)
+        # 依序套用到雙方的 follow 清單 ZSET；viewer 詳細資料每組 pair 只清一次
+        await apply_follow_changes(payloads)
+        pairs = dict.fromkeys((p["follower_id"], p["following_id"]) for p in payloads)
+        await invalidate_many([key for a, b in pairs for key in _pair_keys(a, b)])
+        # 清單與 cache 都更新之後才 bump：雙方的個人頁（計數、is_following）與追蹤清單
+        touched = {u for pair in pairs for u in pair}
+        await versions.bump(*(("user", u) for u in touched), *(("follows", u) for u in touched))
+
+    async def _emit_follow_requests(self, db: AsyncSession, recipient: str, items: List[Tuple[Any, str]]) -> None:
+        def follower_meta(u, follows_id):
+            return {
+                "follower": {
+                    "user_id": str(u.user_id),
+                    "username": u.username,
+                    "metadata": deepcopy(u.user_metadata or {})
+                },
+                "follows_id": follows_id
+            }
+        if "friend_request" not in COALESCE_TYPES:
+            for follower, follows_id in items:
+                await self.events.create_event(
+                    db, user_id=recipient, type="friend_request",
+                    message=_follow_request_message([_actor(follower)], 1), metadata=follower_meta(follower, follows_id)
+                )
+            return
+        # 最新一位放在 follower / follows_id（維持原本的 metadata 形狀），其餘只留精簡的 actor 樣本
+        await self.events.create_or_coalesce(
+            db, user_id=recipient, type="friend_request", actors=[_actor(f) for f, _ in items],
+            metadata=follower_meta(*items[-1]), render=_follow_request_message
+        )
 
 def get_follows_service() -> FollowsService:
-    return FollowsService(FollowsRepo(), UsersRepo(), EventsRepo())
\ No newline at end of file
+    return FollowsService(FollowsRepo(), UsersRepo(), EventsRepo(), OutboxRepo())
\ No newline at end of file
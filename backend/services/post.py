@@ -1,23 +1,64 @@
+import os
+import re
+import asyncio
+import uuid
+from datetime import datetime
+import numpy as np
 from typing import Optional, List, Tuple, Dict, Any
 from fastapi import HTTPException, status, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
 from repositories.post import PostsRepo
-from models import User
-from utils.cache import k, get_json, set_json, delete_pattern
+from schemas.post import PostDetailResponse
+from repositories.tag import TagsRepo
+from repositories.user import UsersRepo
+from repositories.event import EventsRepo
+from utils.cache import k, get_json, set_json, get_many, set_many, invalidate_many, body_key, get_body, set_body
 from utils.s3 import upload_post_image
+from utils.uow import UnitOfWork, pin_primary
+from utils.ids import micros, from_micros, parse_id_list
+from utils import live_metrics, explore, ranking, seen, versions, etag, tags as tagging
+
+EXPLORE_MAX_LIMIT = 50
+BATCH_MAX_IDS = 50
+FEED_RANK_WINDOW = int(os.getenv("FEED_RANK_WINDOW", "200"))
+FEED_RANK_TTL_SEC = int(os.getenv("FEED_RANK_TTL_SEC", "600"))
+FEED_SCORER = os.getenv("FEED_SCORER", "linear")
+# unseen 模式下一次 request 最多往後掃幾批（explore 頁 / 首頁候選窗），全是看過的就先回傳空頁與 cursor
+SEEN_MAX_SCANS = 5
+# 第四段為上一頁最後一篇（窗過期重建時從它之後接續），舊的 cursor 沒有
+_RANK_CURSOR_RE = re.compile(r"(\d+):([0-9a-fA-F-]{36}):(\d+)(?::([0-9a-fA-F-]{36}))?")
+
+def _ranked_key(viewer_id: str, top: str, unseen: bool = False) -> str:
+    return k("feed", viewer_id, "ranked", top, "unseen") if unseen else k("feed", viewer_id, "ranked", top)
+
+def _parse_top(top: str) -> Tuple[datetime, str]:
+    us, post_id = top.split(":", 1)
+    return from_micros(int(us)), post_id
 
 class PostsService:
-    def __init__(self, repo: PostsRepo):
+    def __init__(self, repo: PostsRepo, tags_repo: TagsRepo, users_repo: UsersRepo, events_repo: EventsRepo):
         self.repo = repo
+        self.tags = tags_repo
+        self.users = users_repo
+        self.events = events_repo
 
     async def list_posts(
         self, db: AsyncSession, current, user_id: Optional[str], search: Optional[str],
-        limit: int, cursor_post_id: Optional[str]
+        limit: int, cursor_post_id: Optional[str], mode: str = "recent", cursor: Optional[str] = None,
+        unseen: bool = False,
     ) -> Dict[str, Any]:
         if limit < 1:
             raise HTTPException(status_code=422, detail="limit must be >= 1")
+        if mode == "ranked":
+            if user_id or search:
+                raise HTTPException(status_code=422, detail="ranked mode is only available for the home feed")
+            return await self.ranked_feed(db, current, limit, cursor, unseen)
+        if mode != "recent":
+            raise HTTPException(status_code=422, detail="mode must be 'recent' or 'ranked'")
+        if unseen:
+            # 時間序模式的分頁帶總頁數，略過看過的會讓頁數對不上
+            raise HTTPException(status_code=422, detail="unseen is only supported with mode=ranked")
 
         posts, next_cursor, total_pages = await self.repo.list_posts(
             db, viewer_id=current["user_id"], user_id=user_id, search=search,
@@ -26,62 +67,290 @@ class PostsService:
 
         if user_id and not await self.repo.can_view_user_posts(db, current["user_id"], user_id):
             raise HTTPException(status_code=403, detail="You are not allowed to view this user's posts due to privacy.")
+        if not user_id and not search:
+            await seen.mark(current["user_id"], [str(p.post_id) for p in posts])
+
+        return {
+            "data": {
+                "posts": await self.hydrate_posts(db, posts, current["user_id"]),
+                "pagination": {"limit": limit, "cursor_post_id": next_cursor, "total": total_pages}
+            }
+        }
+
+    async def ranked_feed(self, db: AsyncSession, current, limit: int, cursor: Optional[str],
+                          unseen: bool = False) -> Dict[str, Any]:
+        """
+        時間軸切成每 FEED_RANK_WINDOW 篇一個候選窗，窗內依分數排序後分頁。
+        cursor 為 "窗頂 created_at(µs):窗頂 post_id:窗內 offset"；同一個窗的排序結果快取起來，每讀一頁就把 TTL
+        延長為 FEED_RANK_TTL_SEC，持續翻頁時排序固定，新貼文或新的讚不會造成重複或漏掉；一個窗看完接著下一個較舊的窗。
+        cursor 閒置超過 FEED_RANK_TTL_SEC 後窗會以當下的分數重排，從上一頁最後一篇之後接續（見 _resume_window），
+        排序變了的話可能重複或漏掉幾篇。
+        unseen 時建窗就先去掉看過的貼文，整個窗都看過就直接往下一個窗。
+        """
+        viewer_id = current["user_id"]
+        top, ranked, offset = None, None, 0
+        if cursor:
+            m = _RANK_CURSOR_RE.fullmatch(cursor)
+            if not m:
+                raise HTTPException(status_code=422, detail="Invalid cursor")
+            top, offset = (from_micros(int(m.group(1))), m.group(2).lower()), int(m.group(3))
+            ranked = await get_json(_ranked_key(viewer_id, f"{m.group(1)}:{top[1]}", unseen), refresh_ttl_sec=FEED_RANK_TTL_SEC)
+            if ranked is None and offset:
+                last_id = m.group(4).lower() if m.group(4) else None
+                ranked, offset = await self._resume_window(db, viewer_id, top, unseen, last_id, offset), 0
+        if ranked is None:
+            ranked = await self._rank_window(db, viewer_id, top, unseen)
+        for _ in range(SEEN_MAX_SCANS):
+            if ranked["ids"][offset:] or not ranked["next"]:
+                break
+            ranked, offset = await self._rank_window(db, viewer_id, _parse_top(ranked["next"]), unseen), 0
+        ids, next_top = ranked["ids"], ranked["next"]
+        page_ids = ids[offset:offset + limit]
+        if offset + limit < len(ids):
+            next_cursor = f"{ranked['top']}:{offset + limit}:{page_ids[-1]}"
+        else:
+            next_cursor = f"{next_top}:0" if next_top else None
+        # 排序之後才取消追蹤 / 改成私人的貼文在這裡濾掉
+        posts = await self.repo.get_visible_posts(db, viewer_id, page_ids)
+        await seen.mark(viewer_id, [str(p.post_id) for p in posts])
+        return {
+            "data": {
+                "posts": await self.hydrate_posts(db, posts, viewer_id),
+                "pagination": {"limit": limit, "cursor": next_cursor, "has_more": next_cursor is not None},
+            }
+        }
 
+    async def _resume_window(self, db: AsyncSession, viewer_id: str, top: Tuple[datetime, str], unseen: bool,
+                             last_id: Optional[str], offset: int) -> Dict[str, Any]:
+        """
+        cursor 的窗已經過期：整個窗重新排序時不套 seen（前幾頁送出的貼文現在都標成看過了，
+        去掉之後 offset 會對到更後面，中間沒看過的就被跳過），從上一頁最後一篇之後接續，只有剩下的部分才略過看過的。
+        結果存回同一個 key，之後的 cursor offset 都以這份為準。
+        """
+        ranked = await self._rank_window(db, viewer_id, top, store=False)
+        ids = ranked["ids"]
+        rest = ids[ids.index(last_id) + 1:] if last_id in ids else ids[offset:]
+        if unseen:
+            already = await seen.seen_of(viewer_id, rest)
+            rest = [i for i in rest if i not in already]
+        resumed = {**ranked, "ids": rest}
+        if resumed["top"]:
+            await set_json(_ranked_key(viewer_id, resumed["top"], unseen), resumed, ttl_sec=FEED_RANK_TTL_SEC)
+        return resumed
+
+    async def _rank_window(self, db: AsyncSession, viewer_id: str, top: Optional[Tuple[datetime, str]],
+                           unseen: bool = False, store: bool = True) -> Dict[str, Any]:
+        pin_primary(db)
+        cands = await self.repo.timeline_window(db, viewer_id=viewer_id, limit=FEED_RANK_WINDOW + 1, top=top)
+        window, rest = cands[:FEED_RANK_WINDOW], cands[FEED_RANK_WINDOW:]
+        next_top = f"{micros(rest[0].created_at)}:{rest[0].post_id}" if rest else None
+        if not window:
+            return {"top": None, "ids": [], "next": None}
+        # 窗的位置以過濾前的第一筆為準，cursor 才接得回同一個窗
+        top_key = f"{micros(window[0].created_at)}:{window[0].post_id}"
+        if unseen:
+            already = await seen.seen_of(viewer_id, [str(p.post_id) for p in window])
+            window = [p for p in window if str(p.post_id) not in already]
+        ids = [str(p.post_id) for p in window]
+        authors = [str(p.user_id) for p in window]
+        like_count, comment_count, _ = await self.repo.get_post_counts_and_flags(db, ids)
+        images = await self.repo.count_images(db, ids)
+        affinity = await self.repo.author_affinity(db, viewer_id, sorted(set(authors)))
+        now = datetime.utcnow()
+        features = {
+            "affinity": np.array([affinity.get(a, 0) for a in authors], dtype=float),
+            "likes": np.array([like_count.get(i, 0) for i in ids], dtype=float),
+            "comments": np.array([comment_count.get(i, 0) for i in ids], dtype=float),
+            "age_hours": np.array([(now - p.created_at.replace(tzinfo=None)).total_seconds() / 3600 for p in window], dtype=float),
+            "images": np.array([images.get(i, 0) for i in ids], dtype=float),
+        }
+        order = ranking.rank(features, ranking.get_scorer(FEED_SCORER)) if ids else []
+        ranked = {"top": top_key, "ids": [ids[i] for i in order], "next": next_top}
+        if store:
+            await set_json(_ranked_key(viewer_id, top_key, unseen), ranked, ttl_sec=FEED_RANK_TTL_SEC)
+        return ranked
+
+    async def explore_posts(self, db: AsyncSession, current, limit: int, cursor: Optional[str],
+                            unseen: bool = False) -> Dict[str, Any]:
+        if limit < 1 or limit > EXPLORE_MAX_LIMIT:
+            raise HTTPException(status_code=422, detail=f"limit must be between 1 and {EXPLORE_MAX_LIMIT}")
+        if cursor:
+            try:
+                explore.parse_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=422, detail="Invalid cursor.")
+        viewer_id = current["user_id"]
+        picked: List[str] = []
+        for _ in range(SEEN_MAX_SCANS):
+            need = limit - len(picked)
+            rows, epoch = await explore.page(need, cursor)
+            has_more = len(rows) > need
+            rows = rows[:need]
+            if rows:
+                cursor = explore.make_cursor(epoch, rows[-1][1], rows[-1][0])
+            ids = [pid for pid, _ in rows]
+            if unseen:
+                already = await seen.seen_of(viewer_id, ids)
+                ids = [pid for pid in ids if pid not in already]
+            picked += ids
+            if not unseen or len(picked) >= limit or not has_more:
+                break
+        # 作者變成私人 / 停用的會被濾掉，這一頁可能少於 limit 筆，cursor 仍以 Redis 的最後一筆往下接
+        posts = await self.repo.get_explore_posts(db, picked)
+        next_cursor = cursor if has_more else None
+        await seen.mark(viewer_id, [str(p.post_id) for p in posts])
+        return {
+            "data": {
+                "posts": await self.hydrate_posts(db, posts, current["user_id"]),
+                "pagination": {"limit": limit, "cursor": next_cursor, "has_more": has_more},
+            }
+        }
+
+    async def hydrate_posts(self, db: AsyncSession, posts, viewer_id: str) -> List[Dict[str, Any]]:
         ids = [str(p.post_id) for p in posts]
-        like_count, comment_count, liked_set = await self.repo.get_post_counts_and_flags(db, ids, viewer_id=current["user_id"])
+        like_count, comment_count, liked_set = await self.repo.get_post_counts_and_flags(db, ids, viewer_id=viewer_id)
         images_map = await self.repo.list_post_images_by_posts(db, ids)
         
-        # Get user info for posts
-        user_ids = list(set([str(p.user_id) for p in posts]))
-        user_map = {}
-        if user_ids:
-            stmt = select(User).where(User.user_id.in_(user_ids))
-            result = await db.execute(stmt)
-            users = result.scalars().all()
-            user_map = {str(u.user_id): {"username": u.username, "user_id": str(u.user_id)} for u in users}
+        # 作者走 request 範圍的 loader：這個 request 前面已經載入過的（例如可見性檢查）不會再查
+        users = await self.users.get_many(db, {str(p.user_id) for p in posts})
+        user_map = {uid: {"username": u.username, "user_id": uid} for uid, u in users.items()}
 
         def image_to_dict(im):
             url = (im.image_metadata or {}).get("url")
             return {"image_id": str(im.image_id), "url": url, "width": im.width, "height": im.height, "order": im.order}
 
-        return {
-            "data": {
-                "posts": [{
-                    "post_id": str(p.post_id),
-                    "content": p.content,
-                    "images": [image_to_dict(im) for im in images_map.get(str(p.post_id), [])],
-                    "is_liked": str(p.post_id) in liked_set,
-                    "like_count": like_count.get(str(p.post_id), 0),
-                    "comment_count": comment_count.get(str(p.post_id), 0),
-                    "created_at": p.created_at.isoformat(),
-                    "user_id": str(p.user_id),
-                    "username": user_map.get(str(p.user_id), {}).get("username", f"user_{str(p.user_id)[:8]}"),
-                } for p in posts],
-                "pagination": {"limit": limit, "cursor_post_id": next_cursor, "total": total_pages}
-            }
-        }
+        return [{
+            "post_id": str(p.post_id),
+            "content": p.content,
+            "images": [image_to_dict(im) for im in images_map.get(str(p.post_id), [])],
+            "is_liked": str(p.post_id) in liked_set,
+            "like_count": like_count.get(str(p.post_id), 0),
+            "comment_count": comment_count.get(str(p.post_id), 0),
+            "created_at": p.created_at.isoformat(),
+            "user_id": str(p.user_id),
+            "username": user_map.get(str(p.user_id), {}).get("username", f"user_{str(p.user_id)[:8]}"),
+        } for p in posts]
+
+    async def _index_content(self, db: AsyncSession, p, old_content: Optional[str]) -> None:
+        """
+        依內容差異增量維護 tag 索引，並通知新被 @ 到的人；old_content 為 None 表示新貼文。
+        編輯時只處理新增 / 移除的部分，同一個人不會因為改文而重複收到通知。
+        """
+        old_tags, old_mentions = tagging.extract(old_content) if old_content is not None else ([], [])
+        new_tags, new_mentions = tagging.extract(p.content)
+        added, removed = tagging.diff(old_tags, new_tags)
+        await self.tags.remove(db, str(p.post_id), removed)
+        await self.tags.add(db, str(p.post_id), added, p.created_at)
+
+        mentioned, _ = tagging.diff(old_mentions, new_mentions)
+        users = await self.users.get_by_usernames(db, mentioned)
+        author = await self.users.get_by_id(db, str(p.user_id))
+        targets = {str(u.user_id): u for u in users.values() if u.user_id != p.user_id}
+        # 私人帳號的貼文只通知看得到的人
+        allowed = await self.repo.viewers_among(db, author, list(targets)) if author else set()
+        for uid in targets:
+            if uid in allowed:
+                await self.events.create_event(
+                    db, user_id=uid, type="mention",
+                    message=f"{author.name or author.username} mentioned you in a post",
+                    metadata={"post_id": str(p.post_id), "actor": {"user_id": str(author.user_id), "username": author.username, "name": author.name}},
+                )
+
+    async def _author_is_public(self, db: AsyncSession, p) -> bool:
+        # can_interact_with_user 已經透過 loader 載入過作者，這裡不會再查 DB
+        u = await self.users.get_by_id(db, str(p.user_id))
+        return bool(u and u.is_public and u.status == "enabled")
 
-    async def get_post_detail(self, db: AsyncSession, current, post_id: str) -> Tuple[Dict[str, Any], str]:
+    async def get_post_detail(self, db: AsyncSession, current, post_id: str, use_cache: bool = True) -> Tuple[Dict[str, Any], str]:
         cache_key = k("post", post_id, "viewer", current["user_id"])
-        cached = await get_json(cache_key)
+        cached = await get_json(cache_key) if use_cache else None
         if cached:
             return cached, "HIT"
 
+        pin_primary(db)
         p = await self.repo.get_post_by_id(db, post_id)
         if not p:
             raise HTTPException(status_code=400, detail="Post does not exist.")
         if not await self.repo.can_view_user_posts(db, current["user_id"], str(p.user_id)):
             raise HTTPException(status_code=403, detail="You are not allowed to view this post due to privacy.")
 
-        like_count, comment_count, liked_set = await self.repo.get_post_counts_and_flags(db, [post_id], viewer_id=current["user_id"])
-        images_map = await self.repo.list_post_images_by_posts(db, [post_id])
-        comments_rows = await self.repo.get_top2_comments_with_user(db, post_id)
-        
-        # Get user info for the post
-        user_stmt = select(User).where(User.user_id == p.user_id)
-        user_result = await db.execute(user_stmt)
-        post_user = user_result.scalar_one_or_none()
-        username = post_user.username if post_user else f"user_{str(p.user_id)[:8]}"
+        data = (await self._detail_dicts(db, [p], current["user_id"]))[0]
+        await set_json(cache_key, data, ttl_sec=60)
+        return data, "MISS"
+
+    async def get_post_detail_body(self, db: AsyncSession, current, post_id: str) -> Tuple[bytes, str, str]:
+        """
+        GET /posts/{post_id} 的完整回應 body 與 ETag。命中（且建立時的 ETag 與目前相同）時直接回傳 Redis 裡的 bytes，
+        不做 JSON 解碼、Pydantic 驗證與重新序列化；沒命中才從 DB 建，並且只建一次 model。
+        重建時不讀 dict 快取（版本號已經變了，dict 快取可能還是舊的），也只讀 primary：
+        版本號在 commit 之後才 bump，replica 上的資料可能比 ETag 舊，存進去之後每次 If-None-Match 都會 304。
+        同樣的理由，每個版本號都要在它對應的資料之前讀。
+        """
+        viewer_id = current["user_id"]
+        key = body_key(k("post", post_id, "viewer", viewer_id))
+        hit = await get_body(key)
+        if hit is not None:
+            # 作者 id 就在存著的 ETag 裡，不用查 DB 就能算出目前的 ETag
+            stored, body = hit
+            author_id = etag.post_author(stored)
+            if author_id and await etag.for_post(viewer_id, post_id, author_id) == stored:
+                return body, "HIT", stored
+        pin_primary(db)
+        post_ver, follows_ver = await versions.read([("post", post_id), ("follows", viewer_id)])
+        p = await self.repo.get_post_by_id(db, post_id)
+        if not p:
+            raise HTTPException(status_code=400, detail="Post does not exist.")
+        author_id = str(p.user_id)
+        (author_ver,) = await versions.read([("user", author_id)])
+        # 貼文已經在 loader 裡，get_post_detail 不會再查一次
+        data, _ = await self.get_post_detail(db, current, post_id, use_cache=False)
+        tag = etag.post_tag(viewer_id, post_id, author_id, [post_ver, author_ver, follows_ver])
+        body = PostDetailResponse(data=data).model_dump_json().encode()
+        await set_body(key, tag, body, ttl_sec=60)
+        return body, "MISS", tag
+
+    async def get_posts_batch(self, db: AsyncSession, current, raw_ids: str) -> Tuple[Dict[str, Any], str]:
+        """
+        一次取多篇貼文的 detail（格式同 get_post_detail），依 ids 的順序回傳。
+        快取：一次 MGET 每篇的 viewer 快取；沒命中的一起查（貼文一個 IN、作者與追蹤關係各一個 IN、
+        計數 / 圖片 / 留言各一個查詢），再用一個 pipeline 寫回。
+        不存在的放 missing，沒權限看的放 forbidden，不會讓整批失敗。
+        """
+        try:
+            ids = parse_id_list(raw_ids, BATCH_MAX_IDS)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid ids: {e}")
+        viewer_id = current["user_id"]
+        keys = [k("post", pid, "viewer", viewer_id) for pid in ids]
+        found = {pid: v for pid, v in zip(ids, await get_many(keys)) if v}
+
+        missing, forbidden = [], []
+        misses = [pid for pid in ids if pid not in found]
+        if misses:
+            pin_primary(db)
+            posts = await self.repo.get_posts_by_ids(db, misses)
+            # 各自檢查，但作者與追蹤關係都經過 loader，同一輪會合併成一次查詢
+            allowed = await asyncio.gather(*(self.repo.can_view_user_posts(db, viewer_id, str(p.user_id)) for p in posts.values()))
+            visible = [p for p, ok in zip(posts.values(), allowed) if ok]
+            built = {d["post_id"]: d for d in await self._detail_dicts(db, visible, viewer_id)}
+            await set_many((k("post", pid, "viewer", viewer_id), d, 60) for pid, d in built.items())
+            found.update(built)
+            missing = [pid for pid in misses if pid not in posts]
+            forbidden = [pid for pid in misses if pid in posts and pid not in built]
+
+        data = {"posts": [found[pid] for pid in ids if pid in found], "missing": missing, "forbidden": forbidden}
+        state = "HIT" if not misses else ("MISS" if len(misses) == len(ids) else "PARTIAL")
+        return data, state
+
+    async def _detail_dicts(self, db: AsyncSession, posts, viewer_id: str) -> List[Dict[str, Any]]:
+        if not posts:
+            return []
+        ids = [str(p.post_id) for p in posts]
+        like_count, comment_count, liked_set = await self.repo.get_post_counts_and_flags(db, ids, viewer_id=viewer_id)
+        images_map = await self.repo.list_post_images_by_posts(db, ids)
+        comments_map = await self.repo.get_top2_comments_by_posts(db, ids)
+        # 權限檢查時已經透過 loader 載入過作者
+        authors = await self.users.get_many(db, {str(p.user_id) for p in posts})
 
         def image_to_dict(im):
             url = (im.image_metadata or {}).get("url")
@@ -96,29 +365,41 @@ class PostsService:
                 "user": {"user_id": str(u.user_id), "name": u.name, "username": u.username, "metadata": (u.user_metadata or {})}
             }
 
-        data = {
-            "post_id": str(p.post_id),
-            "content": p.content,
-            "images": [image_to_dict(im) for im in images_map.get(post_id, [])],
-            "comments": [row_to_comment(r) for r in comments_rows],
-            "created_at": p.created_at.isoformat(),
-            "is_liked": post_id in liked_set,
-            "like_count": like_count.get(post_id, 0),
-            "comment_count": comment_count.get(post_id, 0),
-            "user_id": str(p.user_id),
-            "username": username,
-        }
-        await set_json(cache_key, data, ttl_sec=60)
-        return data, "MISS"
+        out = []
+        for p, pid in zip(posts, ids):
+            author = authors.get(str(p.user_id))
+            out.append({
+                "post_id": pid,
+                "content": p.content,
+                "images": [image_to_dict(im) for im in images_map.get(pid, [])],
+                "comments": [row_to_comment(r) for r in comments_map.get(pid, [])],
+                "created_at": p.created_at.isoformat(),
+                "is_liked": pid in liked_set,
+                "like_count": like_count.get(pid, 0),
+                "comment_count": comment_count.get(pid, 0),
+                "user_id": str(p.user_id),
+                "username": author.username if author else f"user_{str(p.user_id)[:8]}",
+            })
+        return out
 
     async def create_post(self, db: AsyncSession, current, content: str, images: List[UploadFile]) -> Dict[str, Any]:
         if not images or len(images) == 0:
             raise HTTPException(status_code=422, detail="At least one image is required.")
 
-        p = await self.repo.create_post(db, user_id=current["user_id"], content=content)
-        for idx, f in enumerate(images):
-            url, w, h = await upload_post_image(current["user_id"], str(p.post_id), f)
-            await self.repo.add_post_image(db, post_id=str(p.post_id), url=url, order=idx, width=w, height=h, meta={})
+        # 先上傳 S3 再開 transaction，避免上傳期間佔住連線；post + images 一次 commit
+        post_id = str(uuid.uuid4())
+        uploaded = [await upload_post_image(current["user_id"], post_id, f) for f in images]
+        async with UnitOfWork(db) as uow:
+            p = await self.repo.create_post(db, user_id=current["user_id"], content=content, post_id=post_id)
+            uow.after_commit(live_metrics.bump, "post_count")
+            # 作者個人頁的 post_count 變了
+            uow.after_commit(versions.bump, ("user", current["user_id"]))
+            if await self._author_is_public(db, p):
+                # 新貼文先給基本分，才有機會被看到
+                uow.after_commit(explore.record, post_id, "post")
+            for idx, (url, w, h) in enumerate(uploaded):
+                await self.repo.add_post_image(db, post_id=post_id, url=url, order=idx, width=w, height=h, meta={})
+            await self._index_content(db, p, None)
         return {"data": {"post_id": str(p.post_id)}, "message": "ok"}
 
     async def update_post(self, db: AsyncSession, current, post_id: str, payload: dict) -> Dict[str, Any]:
@@ -128,11 +409,15 @@ class PostsService:
         if str(p.user_id) != current["user_id"]:
             raise HTTPException(status_code=403, detail="You do not have permission to update this post.")
         changed = False
+        old_content = p.content
         if "content" in payload and isinstance(payload["content"], str) and payload["content"] != p.content:
             p.content = payload["content"]; changed = True
         if changed:
-            await self.repo.touch_post_updated(db, p)
-            await delete_pattern(k("post", post_id, "viewer", "*"))
+            async with UnitOfWork(db) as uow:
+                await self.repo.touch_post_updated(db, p)
+                await self._index_content(db, p, old_content)
+                uow.after_commit(invalidate_many, patterns=[k("post", post_id, "viewer", "*")])
+                uow.after_commit(versions.bump, ("post", post_id))
         return {"data": {"post_id": str(p.post_id)}, "message": "ok"}
 
     async def delete_post(self, db: AsyncSession, current, post_id: str) -> Dict[str, Any]:
@@ -141,8 +426,12 @@ class PostsService:
             raise HTTPException(status_code=404, detail="Post does not exist.")
         if str(p.user_id) != current["user_id"]:
             raise HTTPException(status_code=403, detail="You do not have permission to delete this post.")
-        await self.repo.delete_post(db, p)
-        await delete_pattern(k("post", post_id, "viewer", "*"))
+        async with UnitOfWork(db) as uow:
+            await self.tags.remove(db, post_id)
+            await self.repo.delete_post(db, p)
+            uow.after_commit(invalidate_many, patterns=[k("post", post_id, "viewer", "*")])
+            uow.after_commit(versions.bump, ("post", post_id), ("user", str(p.user_id)))
+            uow.after_commit(explore.remove, post_id)
         return {"data": {"post_id": post_id}, "message": "ok"}
 
     async def like_post(self, db: AsyncSession, current, post_id: str) -> Dict[str, Any]:
@@ -153,8 +442,13 @@ class PostsService:
             raise HTTPException(status_code=403, detail="You are not allowed to like because you are not friends with the user or the account is private.")
         if await self.repo.has_liked(db, user_id=current["user_id"], post_id=post_id):
             raise HTTPException(status_code=400, detail="You have already liked this post.")
-        await self.repo.add_like(db, user_id=current["user_id"], post_id=post_id)
-        await delete_pattern(k("post", post_id, "viewer", "*"))
+        async with UnitOfWork(db) as uow:
+            await self.repo.add_like(db, user_id=current["user_id"], post_id=post_id)
+            uow.after_commit(invalidate_many, patterns=[k("post", post_id, "viewer", "*")])
+            uow.after_commit(versions.bump, ("post", post_id))
+            uow.after_commit(live_metrics.bump, "like_count")
+            if await self._author_is_public(db, p):
+                uow.after_commit(explore.record, post_id, "like")
         return {"data": {"post_id": post_id}, "message": "ok"}
 
     async def unlike_post(self, db: AsyncSession, current, post_id: str) -> Dict[str, Any]:
@@ -165,8 +459,12 @@ class PostsService:
             raise HTTPException(status_code=400, detail="You have already unliked this post.")
         if not await self.repo.can_interact_with_user(db, current["user_id"], str(p.user_id)):
             raise HTTPException(status_code=403, detail="You are not allowed to unlike because you are not friends with the user or the account is private.")
-        await self.repo.remove_like(db, user_id=current["user_id"], post_id=post_id)
-        await delete_pattern(k("post", post_id, "viewer", "*"))
+        async with UnitOfWork(db) as uow:
+            await self.repo.remove_like(db, user_id=current["user_id"], post_id=post_id)
+            uow.after_commit(invalidate_many, patterns=[k("post", post_id, "viewer", "*")])
+            uow.after_commit(versions.bump, ("post", post_id))
+            if await self._author_is_public(db, p):
+                uow.after_commit(explore.record, post_id, "like", -1)
         return {"data": {"post_id": post_id}, "message": "ok"}
 
     async def list_comments(self, db: AsyncSession, current, post_id: str, page: int, limit: int) -> Dict[str, Any]:
@@ -198,8 +496,13 @@ class PostsService:
         content = body.get("content")
         if not isinstance(content, str) or not content.strip():
             raise HTTPException(status_code=422, detail="content is required.")
-        c = await self.repo.create_comment(db, user_id=current["user_id"], post_id=post_id, content=content.strip())
-        await delete_pattern(k("post", post_id, "viewer", "*"))
+        async with UnitOfWork(db) as uow:
+            c = await self.repo.create_comment(db, user_id=current["user_id"], post_id=post_id, content=content.strip())
+            uow.after_commit(invalidate_many, patterns=[k("post", post_id, "viewer", "*")])
+            uow.after_commit(versions.bump, ("post", post_id))
+            uow.after_commit(live_metrics.bump, "comment_count")
+            if await self._author_is_public(db, p):
+                uow.after_commit(explore.record, post_id, "comment")
         return {"data": {"comment_id": str(c.comment_id)}, "message": "ok"}
 
     async def update_comment(self, db: AsyncSession, current, comment_id: str, body: dict) -> Dict[str, Any]:
@@ -211,9 +514,11 @@ class PostsService:
         content = body.get("content")
         if not isinstance(content, str) or not content.strip():
             raise HTTPException(status_code=422, detail="content is required.")
-        c.content = content.strip()
-        await self.repo.update_comment(db, c)
-        await delete_pattern(k("post", str(c.post_id), "viewer", "*"))
+        async with UnitOfWork(db) as uow:
+            c.content = content.strip()
+            await self.repo.update_comment(db, c)
+            uow.after_commit(invalidate_many, patterns=[k("post", str(c.post_id), "viewer", "*")])
+            uow.after_commit(versions.bump, ("post", str(c.post_id)))
         return {"data": {"comment_id": str(c.comment_id)}, "message": "ok"}
 
     async def delete_comment(self, db: AsyncSession, current, comment_id: str) -> Dict[str, Any]:
@@ -222,9 +527,11 @@ class PostsService:
             raise HTTPException(status_code=404, detail="Comment not found.")
         if str(c.user_id) != current["user_id"]:
             raise HTTPException(status_code=403, detail="You are not allowed to delete comments from other users.")
-        await self.repo.delete_comment(db, c)
-        await delete_pattern(k("post", str(c.post_id), "viewer", "*"))
+        async with UnitOfWork(db) as uow:
+            await self.repo.delete_comment(db, c)
+            uow.after_commit(invalidate_many, patterns=[k("post", str(c.post_id), "viewer", "*")])
+            uow.after_commit(versions.bump, ("post", str(c.post_id)))
         return {"data": {"comment_id": str(c.comment_id)}, "message": "ok"}
 
 def get_posts_service() -> PostsService:
-    return PostsService(PostsRepo())
+    return PostsService(PostsRepo(), TagsRepo(), UsersRepo(), EventsRepo())
@@ -0,0 +1,54 @@
+import os
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List
+
+from repositories.suggestion import SuggestionsRepo
+from repositories.user import UsersRepo
+from utils.uow import UnitOfWork
+
+SUGGEST_TOP_K = int(os.getenv("SUGGEST_TOP_K", "50"))
+
+class SuggestionsService:
+    def __init__(self, repo: SuggestionsRepo, users_repo: UsersRepo):
+        self.repo = repo
+        self.users = users_repo
+
+    async def list_suggestions(self, db: AsyncSession, current, limit: int) -> Dict[str, Any]:
+        if limit < 1 or limit > SUGGEST_TOP_K:
+            raise HTTPException(status_code=422, detail=f"limit must be between 1 and {SUGGEST_TOP_K}")
+        user_id = current["user_id"]
+        rows = await self.repo.read(user_id, limit)
+        if rows is None:
+            # 批次還沒算到這位 user（新帳號或名單過期），當場算一次
+            await self.refresh(db, [user_id])
+            rows = await self.repo.read(user_id, limit) or []
+        cards = await self.users.get_cards(db, [uid for uid, _ in rows])
+        users = [{**cards[uid], "mutual_count": mutual} for uid, mutual in rows if uid in cards]
+        return {"data": {"users": users}}
+
+    async def refresh(self, db: AsyncSession, user_ids: List[str]) -> None:
+        await self.repo.store(await self.repo.compute(db, user_ids, SUGGEST_TOP_K))
+
+    async def apply_outbox(self, db: AsyncSession, payloads: List[Dict[str, Any]], uow: UnitOfWork) -> None:
+        """
+        outbox "follow" topic：只增量調整追蹤者本人（follower）的名單。
+        - 新的追蹤（pending / agree）：對方不再是候選
+        - 變成 agree：對方追蹤的人各 +1 共同追蹤
+        - 刪掉 agree：對方追蹤的人各 -1
+        follower 的粉絲們的 2-hop 也會變，但扇出可能很大，交給定期批次重算。
+        Redis 的調整等 worker commit 後才做。
+        """
+        for p in payloads:
+            follower_id, following_id, status = p["follower_id"], p["following_id"], p.get("status")
+            if status in ("pending", "agree"):
+                uow.after_commit(self.repo.remove, follower_id, following_id)
+            if status == "agree":
+                cands = await self.repo.new_candidates(db, follower_id, following_id)
+                uow.after_commit(self.repo.adjust, follower_id, cands, 1)
+            elif status == "deleted" and p.get("prev_status") == "agree":
+                cands = await self.repo.followees_of(db, following_id)
+                uow.after_commit(self.repo.adjust, follower_id, [c for c in cands if c != follower_id], -1)
+
+def get_suggestions_service() -> SuggestionsService:
+    return SuggestionsService(SuggestionsRepo(), UsersRepo())
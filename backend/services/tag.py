@@ -0,0 +1,47 @@
+import re
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, Optional, Tuple
+
+from repositories.tag import TagsRepo
+from services.post import PostsService, get_posts_service
+from utils.tags import normalize_tag
+
+TAG_PAGE_MAX = 50
+_TAG_RE = re.compile(r"\w{1,64}")
+_CURSOR_RE = re.compile(r"(\d+):([0-9a-fA-F-]{36})")
+
+class TagsService:
+    def __init__(self, repo: TagsRepo, posts: PostsService):
+        self.repo = repo
+        self.posts = posts
+
+    async def list_tag_posts(self, db: AsyncSession, current, tag: str, limit: int,
+                             cursor: Optional[str]) -> Tuple[Dict[str, Any], str]:
+        tag = normalize_tag(tag.lstrip("#"))
+        if not _TAG_RE.fullmatch(tag):
+            raise HTTPException(status_code=422, detail="Invalid tag")
+        if limit < 1 or limit > TAG_PAGE_MAX:
+            raise HTTPException(status_code=422, detail=f"limit must be between 1 and {TAG_PAGE_MAX}")
+        after = None
+        if cursor:
+            m = _CURSOR_RE.fullmatch(cursor)
+            if not m:
+                raise HTTPException(status_code=422, detail="Invalid cursor")
+            after = (int(m.group(1)), m.group(2).lower())
+
+        rows, hit = await self.repo.page(db, tag, limit, after)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        # 看不到的貼文（私人帳號、停用）在這裡濾掉；這一頁可能少於 limit 筆，cursor 仍以時間軸的最後一筆往下接
+        posts = await self.posts.repo.get_visible_posts(db, current["user_id"], [pid for pid, _ in rows])
+        next_cursor = f"{rows[-1][1]}:{rows[-1][0]}" if has_more else None
+        data = {
+            "tag": tag,
+            "posts": await self.posts.hydrate_posts(db, posts, current["user_id"]),
+            "pagination": {"limit": limit, "cursor": next_cursor, "has_more": has_more},
+        }
+        return data, ("HIT" if hit else "MISS")
+
+def get_tags_service() -> TagsService:
+    return TagsService(TagsRepo(), get_posts_service())
@@ -1,23 +1,30 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
 from fastapi import HTTPException, status
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
 from copy import deepcopy
 import json
-from schemas.user import UserRegisterInput, UserLoginInput, AdminUserStatusUpdate
-from repositories.user import UsersRepo
+import asyncio
+from schemas.user import UserRegisterInput, UserLoginInput, AdminUserStatusUpdate, UserDetailResponse
+from repositories.user import UsersRepo, card_key
 from repositories.follow import FollowsRepo
 from repositories.post import PostsRepo
-from models import Follow, Post
+from repositories.suggestion import SuggestionsRepo
 from utils.auth import create_access_token, verify_password
-from utils.cache import k, get_json, set_json, delete, delete_pattern
+from utils.cache import k, get_json, set_json, get_many, set_many, invalidate_many, body_key, get_body, set_body
 from utils.s3 import upload_user_image
+from utils.uow import UnitOfWork, pin_primary
+from utils.ids import parse_id_list
+from utils import live_metrics, versions
+
+BATCH_MAX_IDS = 50
 
 class UsersService:
-    def __init__(self, repo: UsersRepo, follow_repo: Optional[FollowsRepo] = None, post_repo: Optional[PostsRepo] = None):
+    def __init__(self, repo: UsersRepo, follow_repo: Optional[FollowsRepo] = None, post_repo: Optional[PostsRepo] = None,
+                 suggestion_repo: Optional[SuggestionsRepo] = None):
         self.repo = repo
         self.follow_repo = follow_repo or FollowsRepo()
         self.post_repo = post_repo or PostsRepo()
+        self.suggestion_repo = suggestion_repo or SuggestionsRepo()
 
     async def register(self, db: AsyncSession, data: UserRegisterInput) -> Dict[str, Any]:
         if len(data.password) < 6:
@@ -33,7 +40,10 @@ class UsersService:
         if await self.repo.get_by_username(db, username_l):
             raise HTTPException(status_code=400, detail="Username already exists.")
 
-        user = await self.repo.create_user(db, email_l, username_l, data.password)
+        async with UnitOfWork(db) as uow:
+            user = await self.repo.create_user(db, email_l, username_l, data.password)
+            uow.after_commit(live_metrics.bump, "user_count")
+        await live_metrics.mark_active(str(user.user_id))
         token = create_access_token({"sub": str(user.user_id), "role": user.role})
         return {
             "data": {
@@ -56,7 +66,9 @@ class UsersService:
         if user.status == "disabled":
             raise HTTPException(status_code=403, detail="Account is disabled.")
 
-        await self.repo.touch_last_login(db, user)
+        async with UnitOfWork(db):
+            await self.repo.touch_last_login(db, user)
+        await live_metrics.mark_active(str(user.user_id))
         token = create_access_token({"sub": str(user.user_id), "role": user.role})
         return {
             "data": {
@@ -91,57 +103,80 @@ class UsersService:
             }
         }
 
-    async def get_detail(self, db: AsyncSession, current, user_id: str) -> Tuple[Dict[str, Any], str]:
+    async def get_detail(self, db: AsyncSession, current, user_id: str, use_cache: bool = True) -> Tuple[Dict[str, Any], str]:
         cache_key = k("user", user_id, "viewer", current["user_id"])
-        cached = await get_json(cache_key)
+        cached = await get_json(cache_key) if use_cache else None
         if cached:
             return cached, "HIT"
 
+        pin_primary(db)
         user = await self.repo.get_by_id(db, user_id)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
+        data = (await self._detail_dicts(db, [user], current["user_id"]))[0]
+        await set_json(cache_key, data, ttl_sec=15)  # Cache for 15 seconds
+        return data, "MISS"
+
+    async def get_detail_body(self, db: AsyncSession, current, user_id: str, etag: str) -> Tuple[bytes, str]:
+        # 與 PostsService.get_post_detail_body 相同：ETag 沒變就直接回傳序列化好的 body
+        key = body_key(k("user", user_id, "viewer", current["user_id"]))
+        hit = await get_body(key)
+        if hit is not None and hit[0] == etag:
+            return hit[1], "HIT"
+        pin_primary(db)
+        data, _ = await self.get_detail(db, current, user_id, use_cache=False)
+        body = UserDetailResponse(data=data).model_dump_json().encode()
+        await set_body(key, etag, body, ttl_sec=15)
+        return body, "MISS"
+
+    async def get_users_batch(self, db: AsyncSession, current, raw_ids: str) -> Tuple[Dict[str, Any], str]:
+        """
+        一次取多位 user 的 detail（格式同 get_detail），依 ids 的順序回傳；不存在的放 missing。
+        先 MGET 每位的 viewer 快取，沒命中的一起查：user 與追蹤關係走 loader（各一個 IN），三種計數各一個 GROUP BY。
+        """
+        try:
+            ids = parse_id_list(raw_ids, BATCH_MAX_IDS)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid ids: {e}")
         viewer_id = current["user_id"]
-        target_user_id = str(user.user_id)
-
-        # Check if viewer is following the target user
-        follow_relation = await self.follow_repo.get_by_pair(db, viewer_id, target_user_id)
-        is_following = follow_relation is not None and follow_relation.status == "agree"
-
-        # Get follower count (how many users are following this user)
-        follower_stmt = select(func.count()).select_from(Follow).where(
-            Follow.following_id == target_user_id,
-            Follow.status == "agree"
-        )
-        follower_count = (await db.execute(follower_stmt)).scalar_one() or 0
-
-        # Get following count (how many users this user is following)
-        following_stmt = select(func.count()).select_from(Follow).where(
-            Follow.follower_id == target_user_id,
-            Follow.status == "agree"
-        )
-        following_count = (await db.execute(following_stmt)).scalar_one() or 0
-
-        # Get post count (how many posts this user has created)
-        post_stmt = select(func.count()).select_from(Post).where(Post.user_id == target_user_id)
-        post_count = (await db.execute(post_stmt)).scalar_one() or 0
-
-        data = {
+        keys = [k("user", uid, "viewer", viewer_id) for uid in ids]
+        found = {uid: v for uid, v in zip(ids, await get_many(keys)) if v}
+
+        misses = [uid for uid in ids if uid not in found]
+        if misses:
+            pin_primary(db)
+            users = await self.repo.get_many(db, misses)
+            built = {d["user"]["user_id"]: d for d in await self._detail_dicts(db, list(users.values()), viewer_id)}
+            await set_many((k("user", uid, "viewer", viewer_id), d, 15) for uid, d in built.items())
+            found.update(built)
+
+        data = {"users": [found[uid] for uid in ids if uid in found], "missing": [uid for uid in ids if uid not in found]}
+        state = "HIT" if not misses else ("MISS" if len(misses) == len(ids) else "PARTIAL")
+        return data, state
+
+    async def _detail_dicts(self, db: AsyncSession, users, viewer_id: str) -> List[Dict[str, Any]]:
+        if not users:
+            return []
+        ids = [str(u.user_id) for u in users]
+        # viewer 是否追蹤這些人：同一輪的 get_by_pair 會經 loader 合併成一次查詢
+        follows = await asyncio.gather(*(self.follow_repo.get_by_pair(db, viewer_id, uid) for uid in ids))
+        follower_count, following_count = await self.follow_repo.count_agreed(db, ids)
+        post_count = await self.post_repo.count_posts_by_users(db, ids)
+        return [{
             "user": {
-                "user_id": target_user_id,
-                "email": user.email,
-                "name": user.name,
-                "username": user.username,
-                "is_public": user.is_public,
-                "metadata": user.user_metadata or {}
+                "user_id": uid,
+                "email": u.email,
+                "name": u.name,
+                "username": u.username,
+                "is_public": u.is_public,
+                "metadata": u.user_metadata or {}
             },
-            "is_following": is_following,
-            "follower_count": follower_count,
-            "following_count": following_count,
-            "post_count": post_count
-        }
-        await set_json(cache_key, data, ttl_sec=15)  # Cache for 15 seconds
-        return data, "MISS"
+            "is_following": f is not None and f.status == "agree",
+            "follower_count": follower_count.get(uid, 0),
+            "following_count": following_count.get(uid, 0),
+            "post_count": post_count.get(uid, 0),
+        } for u, uid, f in zip(users, ids, follows)]
 
     async def update_me(self, db: AsyncSession, current, name: Optional[str], username: Optional[str],
                         is_public: Optional[bool], profile: Optional[str], profile_image, ) -> Dict[str, Any]:
@@ -192,14 +227,14 @@ class UsersService:
         if not update_data:
             return {"data": {"user_id": str(user.user_id)}, "message": "no change"}
 
-        updated = await self.repo.update_user(db, user, update_data)
-        # Delete all cached user detail data for this user (all viewers)
-        user_id_str = str(updated.user_id)
-        await delete_pattern(k("user", user_id_str, "*"))
-        # Also delete any cached user list data that might include this user
-        await delete_pattern(k("follows", "*"))
-        # Force commit to ensure changes are persisted
-        await db.commit()
+        user_id_str = str(user.user_id)
+        async with UnitOfWork(db) as uow:
+            await self.repo.update_user(db, user, update_data)
+            # Delete all cached user detail data for this user (all viewers)
+            # follow 清單只存 id，名稱與頭像來自 user card，card 跟著一起刪（同一個 DEL）
+            uow.after_commit(invalidate_many, [card_key(user_id_str)], patterns=[k("user", user_id_str, "*")])
+            # 名稱 / 頭像 / 公開狀態也會出現在這個人的貼文上（貼文的 ETag 包含作者的版本號）
+            uow.after_commit(versions.bump, ("user", user_id_str))
         return {"data": {"user_id": user_id_str}, "message": "ok"}
 
     async def admin_update_user(self, db: AsyncSession, current, user_id: str, update: AdminUserStatusUpdate) -> Dict[str, Any]:
@@ -212,9 +247,12 @@ class UsersService:
         if not user or user.role == "admin":
             raise HTTPException(status_code=403, detail="Cannot update admin users")
 
-        updated = await self.repo.update_status(db, user, update.status)
-        await delete(k("user", str(updated.user_id)))
-        await delete_pattern(k("follows", str(updated.user_id), "*"))
+        async with UnitOfWork(db) as uow:
+            updated = await self.repo.update_status(db, user, update.status)
+            uow.after_commit(invalidate_many, [k("user", str(updated.user_id)), card_key(str(updated.user_id))])
+            uow.after_commit(versions.bump, ("user", str(updated.user_id)))
+            # 停用的帳號在讀取建議名單時排除
+            uow.after_commit(self.suggestion_repo.set_disabled, str(updated.user_id), update.status != "enabled")
         return {"data": {"user_id": str(updated.user_id)}, "message": "ok"}
 
 
@@ -1,5 +1,6 @@
 import pytest
 import sys
+from types import SimpleNamespace
 from pathlib import Path
 
 # 將專案根目錄加入 Python 路徑
@@ -16,7 +17,8 @@ def fake_get_current_user():
     return {"user_id": "u1", "role": "user"}
 
 async def fake_get_db():
-    yield None
+    # 只有 session.info（pin_primary 會用到），不會真的查詢
+    yield SimpleNamespace(info={})
 
 # 假的Service，繼承自user的service物件
 class FakeUsersService(UsersService):
@@ -37,18 +39,23 @@ class FakeUsersService(UsersService):
     async def list_users(self, db, current, search, limit, page):
         return {"data":{"users":[{"user_id":"u2","email":"a@b.com","name":None,"username":"alice","is_public":True,"metadata":{}}],"pagination":{"page":1,"limit":10,"total":1}}}
 
-    async def get_detail(self, db, current, user_id):
+    async def get_detail(self, db, current, user_id, use_cache=True):
         return {"user":{"user_id":"u2","email":"a@b.com","name":None,"username":"alice","is_public":True,"metadata":{}},"is_following":False,"follower_count":0,"following_count":0,"post_count":0}, "MISS"
 
+class FakePostsRepo:
+    async def get_post_by_id(self, db, post_id):
+        return SimpleNamespace(post_id=post_id, user_id="0190f1c2-7a3b-7c4d-8e5f-000000000002")
+
 # 假的Service，繼承自post的service物件
 class FakePostsService(PostsService):
-    def __init__(self): pass
+    def __init__(self):
+        self.repo = FakePostsRepo()
 
     async def create_post(self, db, current, content, images):
         return {"data":{"post_id":"p1"},"message":"ok"}
 
-    async def get_post_detail(self, db, current, post_id):
-        return {"post_id":"p1","content":"hi","images":[],"comments":[],"created_at":"2025-09-19T00:00:00","is_liked":False,"like_count":0,"comment_count":0}, "MISS"
+    async def get_post_detail(self, db, current, post_id, use_cache=True):
+        return {"post_id":"p1","content":"hi","images":[],"comments":[],"created_at":"2025-09-19T00:00:00","is_liked":False,"like_count":0,"comment_count":0,"user_id":"u2","username":"alice"}, "MISS"
 
 # 定義全域的fixture (每一個測試都要把呼叫跟db有關的函式覆寫掉)
 @pytest.fixture(autouse=True)
@@ -0,0 +1,21 @@
+import pytest
+from utils.ids import parse_id_list
+
+A = "3f2b6c1e-0000-4000-8000-000000000001"
+B = "3f2b6c1e-0000-4000-8000-000000000002"
+
+def test_parse_id_list_dedupes_and_keeps_order():
+    assert parse_id_list(f" {B}, {A.upper()},{B},", 50) == [B, A]
+
+def test_parse_id_list_canonicalizes_alternate_forms():
+    raw = f"{{{A}}},urn:uuid:{A},{B.replace('-', '')}"
+    assert parse_id_list(raw, 50) == [A, B]
+
+@pytest.mark.parametrize("raw", ["", " , ", "not-a-uuid", ",".join([A] * 2 + [B, "x"])])
+def test_parse_id_list_rejects_bad_input(raw):
+    with pytest.raises(ValueError):
+        parse_id_list(raw, 50)
+
+def test_parse_id_list_enforces_limit():
+    with pytest.raises(ValueError):
+        parse_id_list(f"{A},{B}", 1)
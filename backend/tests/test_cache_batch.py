@@ -0,0 +1,82 @@
+import asyncio
+import fnmatch
+import orjson
+import utils.cache as cache
+import repositories.follow as follow_repo
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.calls = redis, []
+
+    def __getattr__(self, name):
+        return lambda *args, **kw: self.calls.append((name, args, kw))
+
+    async def execute(self):
+        self.redis.roundtrips += 1
+        self.redis.pipelined.append(self.calls)
+        return [None] * len(self.calls)
+
+class FakeRedis:
+    # 記錄往返次數：一般指令各算一次，pipeline 整批算一次
+    def __init__(self, data):
+        self.data, self.roundtrips, self.deleted, self.pipelined = dict(data), 0, [], []
+
+    async def mget(self, keys):
+        self.roundtrips += 1
+        return [self.data.get(k) for k in keys]
+
+    async def scan_iter(self, match, count):
+        self.roundtrips += 1
+        for key in list(self.data):
+            if fnmatch.fnmatch(key, match):
+                yield key
+
+    async def delete(self, *keys):
+        self.roundtrips += 1
+        self.deleted.append(keys)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+def test_get_many_keeps_order_and_treats_bad_values_as_miss(monkeypatch):
+    r = FakeRedis({"a": orjson.dumps({"x": 1}), "bad": b"{"})
+    monkeypatch.setattr(cache, "get_redis", lambda: r)
+    assert asyncio.run(cache.get_many(["bad", "a", "none"])) == [None, {"x": 1}, None]
+    assert r.roundtrips == 1
+
+def test_set_many_uses_one_pipeline_with_per_key_ttl(monkeypatch):
+    r = FakeRedis({})
+    monkeypatch.setattr(cache, "get_redis", lambda: r)
+    asyncio.run(cache.set_many([("a", 1, 10), ("b", 2, 20)]))
+    assert r.roundtrips == 1
+    assert [kw["ex"] for _, _, kw in r.pipelined[0]] == [10, 20]
+
+def test_invalidate_many_deletes_keys_and_pattern_matches_in_one_del(monkeypatch):
+    r = FakeRedis({f"p:1:viewer:{i}": b"1" for i in range(5)})
+    monkeypatch.setattr(cache, "get_redis", lambda: r)
+    asyncio.run(cache.invalidate_many(["card:1", "p:1:viewer:0"], patterns=["p:1:viewer:*"]))
+    assert len(r.deleted) == 1
+    assert sorted(r.deleted[0]) == sorted(["card:1", *(f"p:1:viewer:{i}" for i in range(5))])
+    assert r.roundtrips == 2  # 一次 SCAN + 一次 DEL
+
+def test_apply_follow_changes_batches_into_one_pipeline(monkeypatch):
+    r = FakeRedis({})
+    monkeypatch.setattr(follow_repo, "get_redis", lambda: r)
+    changes = [
+        {"follower_id": "a", "following_id": "b", "follows_id": "f1", "status": "agree", "created_at_ms": 1},
+        {"follower_id": "c", "following_id": "b", "follows_id": "f2", "status": "deleted", "created_at_ms": 2},
+        {"follower_id": "d", "following_id": "e", "follows_id": "f3", "status": None, "created_at_ms": 3},
+    ]
+    asyncio.run(follow_repo.apply_follow_changes(changes))
+    assert r.roundtrips == 1
+    ops = [name for name, _, _ in r.pipelined[0]]
+    # 每個動到的清單都 bump generation（INCR + EXPIRE）
+    gen = ["incr", "expire"]
+    # agree：雙方各 1 個 ZREM + 1 個 ZADD；deleted：雙方各 2 個 ZREM；沒有 status：1 個 DEL（雙方 8 個清單）
+    agree, deleted = ["zrem", *gen, *gen, "eval"], ["zrem", *gen, "zrem", *gen]
+    assert ops == agree * 2 + deleted * 2 + ["delete", *gen * 8]
+    statuses = ("pending", "agree")
+    touched = {follow_repo.list_key("b", "follower", st) for st in statuses}
+    touched |= {follow_repo.list_key(u, "following", st) for u in ("a", "c") for st in statuses}
+    touched |= set(follow_repo._list_keys("d", "e"))
+    assert {args[0] for name, args, _ in r.pipelined[0] if name == "incr"} == {cache.gen_key(key) for key in touched}
@@ -0,0 +1,24 @@
+import orjson
+import pytest
+from utils import codec
+
+POST = {
+    "post_id": "p1", "content": "hello " * 100, "images": [],
+    "comments": [{"comment_id": f"c{i}", "content": "nice", "user": {"user_id": "u", "metadata": {"bio": "x" * 50}}} for i in range(20)],
+}
+
+def test_roundtrip_and_small_values_stay_uncompressed():
+    c = codec.Codec("json", "zlib", min_bytes=1024)
+    big, small = c.encode(POST), c.encode({"a": 1})
+    assert codec.decode(big) == POST and codec.decode(small) == {"a": 1}
+    assert big[:3] == bytes((codec.MAGIC, 1, 1)) and len(big) < len(orjson.dumps(POST))
+    assert small[:3] == bytes((codec.MAGIC, 1, 0))
+
+def test_legacy_orjson_values_still_decode():
+    assert codec.decode(orjson.dumps(POST)) == POST
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        codec.decode(bytes((codec.MAGIC, 99, 0)) + b"{}")
+    with pytest.raises(ValueError):
+        codec.Codec("json", "no-such-compressor")
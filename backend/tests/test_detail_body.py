@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+import services.post as post_service
+import services.user as user_service
+from utils import etag, versions
+
+POST_ID = "0190f1c2-7a3b-7c4d-8e5f-000000000001"
+USER_ID = "0190f1c2-7a3b-7c4d-8e5f-000000000002"  # 也是 conftest 假貼文的作者
+
+@pytest.fixture
+def ver(monkeypatch):
+    # 版本號放在 dict 裡，bump 就是 +1
+    state = {}
+
+    async def read(entities):
+        return [str(state.get(e, 1)) for e in entities]
+
+    monkeypatch.setattr(versions, "read", read)
+    return state
+
+def _fake_store(monkeypatch, module):
+    store = {}
+
+    async def get_body(key):
+        return store.get(key)
+
+    async def set_body(key, tag, body, ttl_sec):
+        store[key] = (tag, body)
+
+    monkeypatch.setattr(module, "get_body", get_body)
+    monkeypatch.setattr(module, "set_body", set_body)
+    return store
+
+def test_post_detail_hit_returns_stored_body(client, monkeypatch, ver):
+    store = _fake_store(monkeypatch, post_service)
+    headers = {"Authorization": "Bearer dummy"}
+    first = client.get(f"/api/posts/{POST_ID}", headers=headers)
+    assert first.status_code == 200 and first.headers["X-Cache"] == "MISS"
+    assert first.json()["data"]["username"] == "alice"
+    assert first.headers["Cache-Control"] == etag.CACHE_CONTROL["post"]
+    # 命中時回傳的就是存進去的 bytes，不經過 service 的 get_post_detail
+    (key,) = store
+    store[key] = (store[key][0], store[key][1].replace(b'"alice"', b'"cached"'))
+    second = client.get(f"/api/posts/{POST_ID}", headers=headers)
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.headers["content-type"] == "application/json"
+    assert second.json()["data"]["username"] == "cached"
+    # 版本號變了，舊的 body 不再送出
+    ver[("post", POST_ID)] = 2
+    third = client.get(f"/api/posts/{POST_ID}", headers=headers)
+    assert third.headers["X-Cache"] == "MISS" and third.json()["data"]["username"] == "alice"
+    assert third.headers["ETag"] != first.headers["ETag"]
+
+def test_if_none_match_returns_304_without_hydration(client, monkeypatch, ver):
+    store = _fake_store(monkeypatch, user_service)
+    headers = {"Authorization": "Bearer dummy"}
+    r = client.get(f"/api/users/{USER_ID}", headers=headers)
+    assert r.status_code == 200 and r.json()["data"]["user"]["username"] == "alice"
+    assert [body for _, body in store.values()] == [r.content]
+
+    calls = []
+    real = user_service.UsersService.get_detail_body
+    async def counting(self, *args, **kwargs):
+        calls.append(args)
+        return await real(self, *args, **kwargs)
+    monkeypatch.setattr(user_service.UsersService, "get_detail_body", counting)
+    again = client.get(f"/api/users/{USER_ID}", headers={**headers, "If-None-Match": f'W/{r.headers["ETag"]}, "other"'})
+    assert again.status_code == 304 and again.headers["ETag"] == r.headers["ETag"] and calls == []
+
+    ver[("user", USER_ID)] = 2
+    changed = client.get(f"/api/users/{USER_ID}", headers={**headers, "If-None-Match": r.headers["ETag"]})
+    assert changed.status_code == 200 and len(calls) == 1
+
+def test_matches():
+    assert etag.matches('"a", W/"b"', '"b"') and etag.matches("*", '"x"', exists=True)
+    assert not etag.matches("*", '"x"')
+    assert not etag.matches(None, '"a"') and not etag.matches('"a"', '"b"')
+
+def test_wildcard_and_invalid_ids(client, monkeypatch, ver):
+    _fake_store(monkeypatch, post_service)
+    headers = {"Authorization": "Bearer dummy"}
+    # 不是 UUID：不查版本號，也不會因為 "*" 回 304
+    bad = client.get("/api/posts/not-a-uuid", headers={**headers, "If-None-Match": "*"})
+    assert bad.status_code == 400
+    assert client.get("/api/users/not-a-uuid", headers=headers).status_code == 404
+    # 存在的貼文：讀到之後 "*" 才回 304
+    r = client.get(f"/api/posts/{POST_ID.upper()}", headers={**headers, "If-None-Match": "*"})
+    assert r.status_code == 304 and r.headers["ETag"]
+
+def test_post_etag_tracks_author_not_other_profiles(client, monkeypatch, ver):
+    _fake_store(monkeypatch, post_service)
+    headers = {"Authorization": "Bearer dummy"}
+    r = client.get(f"/api/posts/{POST_ID}", headers=headers)
+    assert r.headers["ETag"].endswith(f'.{USER_ID}"') and etag.post_author(r.headers["ETag"]) == USER_ID
+
+    calls = []
+    real = post_service.PostsService.get_post_detail_body
+    async def counting(self, *args, **kwargs):
+        calls.append(args)
+        return await real(self, *args, **kwargs)
+    monkeypatch.setattr(post_service.PostsService, "get_post_detail_body", counting)
+    cond = {**headers, "If-None-Match": r.headers["ETag"]}
+    # 別人改個人資料不影響；作者改了才重建
+    ver[("user", "0190f1c2-7a3b-7c4d-8e5f-0000000000ff")] = 2
+    assert client.get(f"/api/posts/{POST_ID}", headers=cond).status_code == 304 and calls == []
+    ver[("user", USER_ID)] = 2
+    changed = client.get(f"/api/posts/{POST_ID}", headers=cond)
+    assert changed.status_code == 200 and len(calls) == 1 and changed.headers["ETag"] != r.headers["ETag"]
+
+def test_post_and_follows_etags_roll_over(client, monkeypatch, ver):
+    # 留言者 / 清單成員的名稱不在版本號裡，靠時間區段讓 ETag 換掉
+    _fake_store(monkeypatch, post_service)
+    bucket = [0]
+    monkeypatch.setattr(etag, "_bucket", lambda: bucket[0])
+    headers = {"Authorization": "Bearer dummy"}
+    r = client.get(f"/api/posts/{POST_ID}", headers=headers)
+    cond = {**headers, "If-None-Match": r.headers["ETag"]}
+    assert client.get(f"/api/posts/{POST_ID}", headers=cond).status_code == 304
+    follows = asyncio.run(etag.for_follows("v1", "follower", "agree"))
+    bucket[0] = 1
+    rolled = client.get(f"/api/posts/{POST_ID}", headers=cond)
+    assert rolled.status_code == 200 and rolled.headers["X-Cache"] == "MISS" and rolled.headers["ETag"] != r.headers["ETag"]
+    assert asyncio.run(etag.for_follows("v1", "follower", "agree")) != follows
@@ -0,0 +1,28 @@
+import orjson
+from utils.event_bus import EventHub, Subscription, channel
+
+def _msg(user_id, event_id):
+    return {"type": "message", "channel": channel(user_id).encode(), "data": orjson.dumps({"event_id": event_id})}
+
+def test_dispatch_routes_by_user_channel():
+    hub = EventHub(maxsize=10)
+    a, b = Subscription("u1", 10), Subscription("u2", 10)
+    hub._subs = {"u1": {a}, "u2": {b}}
+    hub._dispatch(_msg("u1", "e1"))
+    assert a.queue.get_nowait() == {"event_id": "e1"}
+    assert b.queue.empty()
+
+def test_full_queue_marks_subscription_lagged():
+    sub = Subscription("u1", 2)
+    for i in range(3):
+        sub.offer({"event_id": str(i)})
+    assert sub.lagged
+    assert sub.queue.qsize() == 2
+    # lagged 之後不再收，等 client 重連從 DB 補
+    sub.offer({"event_id": "x"})
+    assert sub.queue.qsize() == 2
+
+def test_mark_lagged_wakes_consumer():
+    sub = Subscription("u1", 2)
+    sub.mark_lagged()
+    assert sub.lagged and sub.queue.get_nowait() is None
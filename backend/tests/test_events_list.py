@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+import pytest
+from main import app
+from services.event import EventsService, get_events_service
+from utils import versions
+
+def _event(n, type_, metadata):
+    return SimpleNamespace(event_id=f"e{n}", message=f"m{n}", is_read=False, type=type_, event_metadata=metadata)
+
+class FakeEventsRepo:
+    async def list_events_after(self, db, user_id, limit, cursor_event_id):
+        return [
+            _event(1, "mention", {"post_id": "p1", "actor": {"user_id": "u2", "username": "alice", "name": None}}),
+            _event(2, "friend_request", {"follower": {"user_id": "u2", "username": "alice", "metadata": {}}, "follows_id": "f1"}),
+        ], None
+
+@pytest.fixture
+def events_app(monkeypatch):
+    async def read(entities):
+        return ["1" for _ in entities]
+    monkeypatch.setattr(versions, "read", read)
+    app.dependency_overrides[get_events_service] = lambda: EventsService(FakeEventsRepo())
+    yield
+    app.dependency_overrides.pop(get_events_service, None)
+
+def test_events_list_includes_mentions(client, events_app):
+    # 回應經過 EventsListResponse 驗證，每一種 event type 都要列在 EventType 裡
+    r = client.get("/api/events", headers={"Authorization": "Bearer dummy"})
+    assert r.status_code == 200
+    events = r.json()["data"]["events"]
+    assert [e["type"] for e in events] == ["mention", "friend_request"]
+    assert events[0]["metadata"]["post_id"] == "p1"
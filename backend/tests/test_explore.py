@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from utils import explore
+
+class FakeRedis:
+    # 只實作 page() 用到的部分；ZSET 同分時依 member 由大到小，與 Redis 的 ZREVRANGEBYSCORE 相同
+    def __init__(self, scores, epoch):
+        self.scores, self.epoch = scores, epoch
+
+    async def get(self, key):
+        return str(self.epoch).encode()
+
+    async def zrevrangebyscore(self, key, max, min, start, num, withscores):
+        rows = sorted(self.scores.items(), key=lambda x: (x[1], x[0]), reverse=True)
+        if max != "+inf":
+            rows = [r for r in rows if r[1] <= float(max)]
+        return [(m.encode(), s) for m, s in rows[start:start + num]]
+
+def _walk(monkeypatch, scores, limit):
+    monkeypatch.setattr(explore, "get_redis", lambda: FakeRedis(scores, 1000))
+    seen, cursor = [], None
+    while True:
+        rows, epoch = asyncio.run(explore.page(limit, cursor))
+        seen += [m for m, _ in rows[:limit]]
+        if len(rows) <= limit:
+            return seen
+        cursor = explore.make_cursor(epoch, rows[limit - 1][1], rows[limit - 1][0])
+
+def test_pages_through_ties_without_gaps_or_duplicates(monkeypatch):
+    scores = {f"p{i}": 1.0 for i in range(7)}
+    scores.update({"a": 5.0, "b": 3.0})
+    seen = _walk(monkeypatch, scores, limit=2)
+    assert seen == ["a", "b", "p6", "p5", "p4", "p3", "p2", "p1", "p0"]
+
+def test_rescale_keeps_cursor_position_after_compaction():
+    half = explore.EXPLORE_HALF_LIFE_SEC
+    # 往後移一個半衰期，同一份分數要減半
+    assert explore.rescale(8.0, 1000, 1000 + int(half)) == pytest.approx(4.0)
+    assert explore.rescale(8.0, 0, 1000) == 8.0
+
+def test_parse_cursor_rejects_garbage():
+    assert explore.parse_cursor(explore.make_cursor(10, 1.5, "p1")) == (10, 1.5, "p1")
+    with pytest.raises(ValueError):
+        explore.parse_cursor("nope")
+
+def test_remove_does_not_raise_when_redis_fails(monkeypatch):
+    class Down:
+        async def zrem(self, *args):
+            raise ConnectionError("redis down")
+    monkeypatch.setattr(explore, "get_redis", lambda: Down())
+    asyncio.run(explore.remove("p1"))
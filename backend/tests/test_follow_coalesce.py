@@ -0,0 +1,9 @@
+from services.follow import _follow_request_message
+
+def test_single_request_message():
+    assert _follow_request_message([{"user_id": "u1", "username": "amy", "name": None}], 1) == "amy sent you a follow request"
+
+def test_grouped_request_message_uses_latest_actor():
+    sample = [{"user_id": "u2", "username": "bob", "name": "Bob"}, {"user_id": "u1", "username": "amy", "name": None}]
+    assert _follow_request_message(sample, 2) == "Bob and 1 other requested to follow you"
+    assert _follow_request_message(sample, 42) == "Bob and 41 others requested to follow you"
@@ -0,0 +1,61 @@
+import asyncio
+import repositories.follow as follow_repo
+
+class FakeZRedis:
+    # 只實作 _zset_page 用到的指令
+    def __init__(self, zsets):
+        self.zsets = zsets
+
+    def _desc(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda x: (x[1], x[0]), reverse=True)
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    async def zrevrank(self, key, member):
+        members = [m for m, _ in self._desc(key)]
+        return members.index(member) if member in members else None
+
+    async def zrevrange(self, key, start, stop, withscores=False):
+        return [(m.encode(), s) for m, s in self._desc(key)[start:stop + 1]]
+
+    async def zrevrangebyscore(self, key, max, min, start=0, num=None, withscores=False):
+        bound = float(max.lstrip("("))
+        rows = [(m.encode(), s) for m, s in self._desc(key) if s < bound]
+        return rows[start:start + num]
+
+def _key_with(n):
+    members = {f"{i:08d}-0000-0000-0000-000000000000|{i:08d}-0000-0000-0000-00000000000f": 1000 + i for i in range(n)}
+    members[follow_repo._SENTINEL] = float("-inf")
+    return {"k": members}
+
+def test_page_mode_excludes_sentinel_and_reports_total(monkeypatch):
+    monkeypatch.setattr(follow_repo, "get_redis", lambda: FakeZRedis(_key_with(3)))
+    items, total = asyncio.run(follow_repo._zset_page("k", 2, 2, None))
+    assert total == 3
+    assert [sc for _, sc in items] == [1000]
+
+def test_cursor_continues_after_last_item(monkeypatch):
+    monkeypatch.setattr(follow_repo, "get_redis", lambda: FakeZRedis(_key_with(5)))
+    first, _ = asyncio.run(follow_repo._zset_page("k", 2, 1, None))
+    member, score = first[1]
+    nxt, _ = asyncio.run(follow_repo._zset_page("k", 2, None, f"{int(score)}:{member}"))
+    assert [sc for _, sc in nxt] == [1002, 1001, 1000]
+
+def test_missing_key_reports_none(monkeypatch):
+    monkeypatch.setattr(follow_repo, "get_redis", lambda: FakeZRedis({}))
+    assert asyncio.run(follow_repo._zset_page("k", 2, 1, None)) == ([], None)
+
+def test_rows_page_matches_zset_page(monkeypatch):
+    from datetime import datetime, timedelta
+    base = datetime(2025, 9, 1)
+    rows = [(f"{i:08d}-0000-0000-0000-000000000000", f"{i:08d}-0000-0000-0000-00000000000f",
+             base + timedelta(seconds=i)) for i in range(5)]
+    members = {f"{o}|{fid}": follow_repo.follow_score(c) for o, fid, c in rows}
+    members[follow_repo._SENTINEL] = float("-inf")
+    monkeypatch.setattr(follow_repo, "get_redis", lambda: FakeZRedis({"k": members}))
+    for page, cursor in [(1, None), (2, None), (3, None)]:
+        assert follow_repo._rows_page(rows, 2, page, cursor) == asyncio.run(follow_repo._zset_page("k", 2, page, cursor))
+    first, _ = follow_repo._rows_page(rows, 2, 1, None)
+    cursor = f"{first[1][1]}:{first[1][0]}"
+    assert follow_repo._rows_page(rows, 2, None, cursor) == asyncio.run(follow_repo._zset_page("k", 2, None, cursor))
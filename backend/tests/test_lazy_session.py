@@ -0,0 +1,31 @@
+import asyncio
+from db import LazySession
+
+class FakeSession:
+    def __init__(self):
+        self.closed = False
+
+    async def execute(self, stmt):
+        return stmt
+
+    async def close(self):
+        self.closed = True
+
+def test_lazy_session_not_created_when_unused():
+    created = []
+    db = LazySession(lambda: created.append(FakeSession()) or created[-1])
+    asyncio.run(db.close())
+    assert created == []
+    assert not db.opened
+
+def test_lazy_session_created_on_first_use_and_closed():
+    created = []
+    db = LazySession(lambda: created.append(FakeSession()) or created[-1])
+
+    async def run():
+        assert await db.execute("select 1") == "select 1"
+        assert await db.execute("select 2") == "select 2"
+        await db.close()
+    asyncio.run(run())
+    assert len(created) == 1
+    assert created[0].closed
@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from utils import metrics
+from utils.loader import Loader
+
+def _loader(calls, fail=False):
+    async def batch(keys):
+        calls.append(list(keys))
+        if fail:
+            raise RuntimeError("db down")
+        return {k: f"v{k}" for k in keys if k != "missing"}
+    return Loader("t", batch, asyncio.Lock())
+
+def test_concurrent_loads_coalesce_into_one_batch():
+    calls = []
+
+    async def run():
+        stats = metrics.begin_request()
+        loader = _loader(calls)
+        values = await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("a"), loader.load("missing"))
+        return values, stats
+    values, stats = asyncio.run(run())
+    assert values == ["va", "vb", "va", None]
+    assert calls == [["a", "b", "missing"]]
+    assert stats["db.loader.queries"] == 1 and stats["db.loader.saved"] == 3
+
+def test_results_are_memoized_and_primed_values_skip_the_query():
+    calls = []
+
+    async def run():
+        loader = _loader(calls)
+        await loader.load("a")
+        loader.prime("b", "primed")
+        return await loader.load("a"), await loader.load("b"), await loader.load_many(["a", "b", "missing"])
+    assert asyncio.run(run()) == ("va", "primed", {"a": "va", "b": "primed"})
+    assert calls == [["a"], ["missing"]]
+
+def test_failed_batch_is_not_cached():
+    calls = []
+
+    async def run():
+        loader = _loader(calls, fail=True)
+        with pytest.raises(RuntimeError):
+            await loader.load("a")
+        with pytest.raises(RuntimeError):
+            await loader.load("a")
+    asyncio.run(run())
+    assert calls == [["a"], ["a"]]
+
+def test_dispatch_task_is_held_until_done():
+    calls = []
+
+    async def run():
+        loader = _loader(calls)
+        fut = asyncio.ensure_future(loader.load("a"))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        held = len(loader._tasks)
+        await fut
+        return held, len(loader._tasks)
+    assert asyncio.run(run()) == (1, 0)
+
+def test_hydrate_posts_reuses_authors_loaded_earlier_in_the_request():
+    from datetime import datetime
+    from types import SimpleNamespace
+    from repositories.loaders import get_loaders
+    from repositories.user import UsersRepo
+    from services.post import PostsService
+
+    class NoQuerySession:
+        info = {}
+
+        async def execute(self, stmt):
+            raise AssertionError("unexpected query")
+
+    class Posts:
+        async def get_post_counts_and_flags(self, db, ids, viewer_id=None):
+            return {}, {}, set()
+
+        async def list_post_images_by_posts(self, db, ids):
+            return {}
+
+    async def run():
+        db = NoQuerySession()
+        # 例如可見性檢查時已經載入過作者
+        get_loaders(db).users.prime("a1", SimpleNamespace(user_id="a1", username="alice"))
+        svc = PostsService(Posts(), None, UsersRepo(), None)
+        post = SimpleNamespace(post_id="p1", user_id="a1", content="hi", created_at=datetime(2025, 9, 19))
+        return await svc.hydrate_posts(db, [post], "v1")
+    (item,) = asyncio.run(run())
+    assert item["username"] == "alice" and item["user_id"] == "a1"
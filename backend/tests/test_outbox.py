@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+import jobs.outbox as outbox_mod
+from utils import metrics
+from jobs.outbox import OutboxWorker
+
+class FakeSession:
+    def __init__(self):
+        self.info = {}
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeRepo:
+    def __init__(self, rows, max_attempts=10):
+        self.rows = {r.id: r for r in rows}
+        self.retried, self.attempts, self.max_attempts = [], {}, max_attempts
+
+    async def claim(self, db, limit, ids=None):
+        return [r for i, r in sorted(self.rows.items()) if ids is None or i in ids][:limit]
+
+    async def remove(self, db, ids):
+        for i in ids:
+            self.rows.pop(i)
+
+    async def retry_later(self, db, ids, base_sec):
+        self.retried.extend(ids)
+        dead = []
+        for i in ids:
+            self.attempts[i] = self.attempts.get(i, 0) + 1
+            if self.attempts[i] >= self.max_attempts:
+                dead.append(SimpleNamespace(id=i, topic=self.rows.pop(i).topic, attempts=self.attempts[i]))
+        return dead
+
+def _row(id_, payload):
+    return SimpleNamespace(id=id_, topic="t", payload=payload)
+
+def test_bad_row_is_isolated_from_the_batch(monkeypatch):
+    monkeypatch.setattr(outbox_mod, "AsyncSessionLocal", FakeSession)
+    handled = []
+
+    async def handler(db, payloads, uow):
+        if any(p.get("bad") for p in payloads):
+            raise ValueError("boom")
+        handled.extend(p["n"] for p in payloads)
+
+    w = OutboxWorker()
+    w.repo = FakeRepo([_row(1, {"n": 1}), _row(2, {"bad": True}), _row(3, {"n": 3})])
+    w.register("t", handler)
+    done = asyncio.run(w.drain_once())
+    assert done == 2 and handled == [1, 3]
+    assert w.repo.retried == [2] and list(w.repo.rows) == [2]
+
+def test_exhausted_row_is_moved_out_and_counted(monkeypatch):
+    monkeypatch.setattr(outbox_mod, "AsyncSessionLocal", FakeSession)
+
+    async def handler(db, payloads, uow):
+        raise ValueError("boom")
+
+    w = OutboxWorker()
+    w.repo = FakeRepo([_row(1, {"n": 1})], max_attempts=2)
+    w.register("t", handler)
+    stats = metrics.begin_request()
+    assert asyncio.run(w.drain_once()) == 0 and list(w.repo.rows) == [1]
+    assert "outbox.dead" not in stats
+    # 第二次失敗用完次數：從 outbox 移走（不再擋住同一個 key 後面的資料），並記在 outbox.dead
+    assert asyncio.run(w.drain_once()) == 0 and w.repo.rows == {}
+    assert stats["outbox.dead"] == 1
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+import services.post as post_service
+from repositories.post import PostsRepo
+from services.post import PostsService
+
+NOW = datetime(2025, 9, 19, 12, 0, 0)
+POSTS = [SimpleNamespace(post_id=f"3f2b6c1e-0000-4000-8000-00000000000{i}", user_id=f"a{i % 2}",
+                         created_at=NOW - timedelta(minutes=i)) for i in range(1, 6)]
+
+@pytest.fixture
+def svc(monkeypatch):
+    store, refreshed = {}, []
+
+    async def get_json(key, refresh_ttl_sec=None):
+        if key in store and refresh_ttl_sec:
+            refreshed.append(key)
+        return store.get(key)
+
+    async def set_json(key, obj, ttl_sec):
+        store[key] = obj
+
+    marked = set()
+
+    async def mark(viewer_id, ids):
+        marked.update(ids)
+
+    async def seen_of(viewer_id, ids):
+        return marked & set(ids)
+
+    async def timeline_window(self, db, *, viewer_id, limit, top=None):
+        start = 0 if top is None else next(i for i, p in enumerate(POSTS) if p.post_id == top[1])
+        return POSTS[start:start + limit]
+
+    async def counts(self, db, post_ids, viewer_id=None):
+        return {POSTS[3].post_id: 50}, {}, set()
+
+    async def count_images(self, db, post_ids):
+        return {}
+
+    async def author_affinity(self, db, viewer_id, author_ids):
+        return {}
+
+    async def visible(self, db, viewer_id, post_ids):
+        by_id = {p.post_id: p for p in POSTS}
+        return [by_id[i] for i in post_ids]
+
+    async def hydrate(self, db, posts, viewer_id):
+        return [{"post_id": p.post_id} for p in posts]
+
+    monkeypatch.setattr(post_service, "get_json", get_json)
+    monkeypatch.setattr(post_service, "set_json", set_json)
+    monkeypatch.setattr(post_service.seen, "mark", mark)
+    monkeypatch.setattr(post_service.seen, "seen_of", seen_of)
+    monkeypatch.setattr(post_service, "FEED_RANK_WINDOW", 3)
+    # 用 setattr 的預設 raising=True：repo 少了排序需要的方法時這裡就會失敗
+    for name, fn in [("timeline_window", timeline_window), ("get_post_counts_and_flags", counts),
+                     ("count_images", count_images), ("author_affinity", author_affinity),
+                     ("get_visible_posts", visible)]:
+        monkeypatch.setattr(PostsRepo, name, fn)
+    monkeypatch.setattr(PostsService, "hydrate_posts", hydrate)
+    svc = PostsService(PostsRepo(), None, None, None)
+    svc.store, svc.refreshed = store, refreshed
+    return svc
+
+def _page(svc, cursor=None, limit=2, db=None, unseen=False):
+    db = db or SimpleNamespace(info={})
+    out = asyncio.run(svc.list_posts(db, {"user_id": "u1"}, None, None, limit, None, mode="ranked", cursor=cursor,
+                                     unseen=unseen))
+    return [p["post_id"] for p in out["data"]["posts"]], out["data"]["pagination"]["cursor"]
+
+def test_rank_window_reads_from_primary(svc):
+    db = SimpleNamespace(info={"read_only": True})
+    _page(svc, db=db)
+    # 排序結果會快取，建窗的查詢不能讀到落後的 replica
+    assert db.info["pinned_primary"] is True
+
+def test_ranked_mode_pages_through_every_window(svc):
+    seen_ids, cursor = [], None
+    for _ in range(5):
+        ids, cursor = _page(svc, cursor)
+        seen_ids += ids
+        if cursor is None:
+            break
+    assert sorted(seen_ids) == sorted(p.post_id for p in POSTS)
+    # 窗大小 3：第二個窗裡讚最多的較舊貼文排到窗的最前面
+    assert seen_ids[3] == POSTS[3].post_id
+
+def test_paging_keeps_the_window_ranking_alive(svc):
+    _, cursor = _page(svc)
+    _page(svc, cursor)
+    # 讀下一頁時延長窗的 TTL，持續翻頁的期間不會被重新計分
+    assert svc.refreshed == list(svc.store)[:1]
+
+def test_unseen_cursor_resumes_after_window_expires(svc):
+    first, cursor = _page(svc, limit=1, unseen=True)
+    # 窗過期：前一頁的貼文已經標成看過，重建後仍要從它之後接續，不能跳過沒看過的
+    svc.store.clear()
+    second, cursor = _page(svc, cursor, limit=1, unseen=True)
+    third, _ = _page(svc, cursor, limit=1, unseen=True)
+    assert first + second + third == [p.post_id for p in POSTS[:3]]
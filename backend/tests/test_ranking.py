@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from utils import ranking
+
+def _features(**overrides):
+    n = len(next(iter(overrides.values())))
+    f = {name: np.zeros(n) for name in ranking.FEATURES}
+    f.update({name: np.asarray(v, dtype=float) for name, v in overrides.items()})
+    return f
+
+def test_ties_keep_timeline_order():
+    assert ranking.rank(_features(likes=[0, 0, 0]), ranking.get_scorer("linear")) == [0, 1, 2]
+
+def test_engagement_and_affinity_lift_older_posts():
+    f = _features(age_hours=[0, 1, 2], likes=[0, 50, 0], affinity=[0, 0, 20])
+    order = ranking.rank(f, ranking.get_scorer("linear"))
+    assert order.index(0) == 2
+
+def test_recent_scorer_is_chronological():
+    assert ranking.rank(_features(age_hours=[3, 1, 2]), ranking.get_scorer("recent")) == [1, 2, 0]
+
+def test_unknown_scorer():
+    with pytest.raises(ValueError):
+        ranking.get_scorer("nope")
@@ -0,0 +1,91 @@
+from datetime import datetime, date, time
+from zoneinfo import ZoneInfo
+from jobs.scheduler import DailyJob
+
+TZ = ZoneInfo("Asia/Taipei")
+
+async def _noop(start_d, end_d):
+    pass
+
+def test_daily_job_runs_yesterday_after_run_time():
+    job = DailyJob("t", _noop, at=time(3, 0))
+    now = datetime(2025, 9, 14, 3, 5, tzinfo=TZ)
+    assert job.due(now, "2025-09-12") == (date(2025, 9, 13), date(2025, 9, 13))
+    assert job.due(now, "2025-09-13") is None
+
+def test_daily_job_waits_until_run_time():
+    job = DailyJob("t", _noop, at=time(3, 0))
+    now = datetime(2025, 9, 14, 1, 0, tzinfo=TZ)
+    assert job.due(now, "2025-09-12") is None
+
+def test_daily_job_catches_up_missed_days_in_one_range():
+    job = DailyJob("t", _noop, at=time(3, 0), max_catch_up_days=5)
+    now = datetime(2025, 9, 20, 4, 0, tzinfo=TZ)
+    assert job.due(now, "2025-09-15") == (date(2025, 9, 16), date(2025, 9, 19))
+    # 超過上限只補最近 max_catch_up_days 天
+    assert job.due(now, "2025-08-01") == (date(2025, 9, 15), date(2025, 9, 19))
+
+class _Lease:
+    def __init__(self, renewals):
+        self.renewals = renewals  # 續約成功幾次之後失去 lease
+        self.held = True
+
+    async def renew(self):
+        self.renewals -= 1
+        self.held = self.held and self.renewals >= 0
+        return self.held
+
+class _Ledger:
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query):
+        return self.docs.get(query["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        self.docs.setdefault(query["_id"], {}).update(update["$set"])
+
+def _scheduler(monkeypatch, renewals):
+    import jobs.scheduler as sched
+    ledger = _Ledger()
+    monkeypatch.setattr(sched, "get_job_state_collection", lambda: ledger)
+    monkeypatch.setattr(sched, "LEASE_SEC", 0.03)
+    s = sched.Scheduler()
+    s._lease = _Lease(renewals)
+    return s, ledger
+
+def test_job_is_cancelled_when_the_lease_is_lost(monkeypatch):
+    import asyncio
+    from jobs.scheduler import IntervalJob
+    state = {"started": False, "finished": False, "cancelled": False}
+
+    async def slow():
+        state["started"] = True
+        try:
+            await asyncio.sleep(1)
+            state["finished"] = True
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    s, ledger = _scheduler(monkeypatch, renewals=2)
+    asyncio.run(s._run_if_due(IntervalJob("slow", slow, every_sec=60)))
+    assert state == {"started": True, "finished": False, "cancelled": True}
+    # 沒有記成功也沒有記錯誤，接手的 worker 會依 ledger 重跑
+    assert ledger.docs == {}
+
+def test_jitter_sleep_renews_and_stops_without_the_lease(monkeypatch):
+    import asyncio
+    from jobs.scheduler import IntervalJob
+    ran = []
+
+    async def fn():
+        ran.append(1)
+
+    s, ledger = _scheduler(monkeypatch, renewals=1)
+    asyncio.run(s._run_if_due(IntervalJob("j", fn, every_sec=60, jitter_sec=0.2)))
+    assert ran == [] and ledger.docs == {}
+
+    s, ledger = _scheduler(monkeypatch, renewals=100)
+    asyncio.run(s._run_if_due(IntervalJob("j", fn, every_sec=60, jitter_sec=0.05)))
+    assert ran == [1] and ledger.docs["scheduler:j"]["last_success"]
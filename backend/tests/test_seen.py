@@ -0,0 +1,15 @@
+import math
+from utils import seen
+
+def test_sizing_follows_fp_rate_and_memory():
+    assert seen.M_BITS == seen.SEEN_BYTES * 8
+    # 以推出來的容量與 hash 數，理論誤判率不超過設定值太多
+    fp = (1 - math.exp(-seen.K_HASHES * seen.CAPACITY / seen.M_BITS)) ** seen.K_HASHES
+    assert fp <= seen.SEEN_FP_RATE * 1.1
+
+def test_positions_are_stable_and_in_range():
+    a = seen.positions("3f2b6c1e-0000-4000-8000-000000000001")
+    assert a == seen.positions("3f2b6c1e-0000-4000-8000-000000000001")
+    assert len(a) == seen.K_HASHES
+    assert all(0 <= p < seen.M_BITS for p in a)
+    assert a != seen.positions("3f2b6c1e-0000-4000-8000-000000000002")
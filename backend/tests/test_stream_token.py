@@ -0,0 +1,22 @@
+import pytest
+from fastapi import HTTPException
+from utils.auth import create_access_token, create_stream_token, decode_token, STREAM_SCOPE
+
+CURRENT = {"user_id": "u1", "role": "user"}
+
+def test_stream_token_only_opens_the_stream():
+    token = create_stream_token(CURRENT)
+    assert decode_token(token, scope=STREAM_SCOPE) == CURRENT
+    with pytest.raises(HTTPException):
+        decode_token(token)
+
+def test_long_lived_token_is_not_accepted_in_the_query_string():
+    token = create_access_token({"sub": "u1", "role": "user"})
+    assert decode_token(token) == CURRENT
+    with pytest.raises(HTTPException):
+        decode_token(token, scope=STREAM_SCOPE)
+
+def test_stream_rejects_access_token_param(client):
+    token = create_access_token({"sub": "u1", "role": "user"})
+    r = client.get(f"/api/events/stream?stream_token={token}")
+    assert r.status_code == 401
@@ -0,0 +1,53 @@
+import asyncio
+from services.suggestion import SuggestionsService
+from utils.uow import UnitOfWork
+
+class FakeSession:
+    def __init__(self):
+        self.info = {}
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+class FakeRepo:
+    def __init__(self):
+        self.calls = []
+
+    async def new_candidates(self, db, user_id, via_user_id):
+        return ["c1", "c2"]
+
+    async def followees_of(self, db, user_id):
+        return ["a", "c1"]
+
+    async def remove(self, user_id, candidate):
+        self.calls.append(("remove", user_id, candidate))
+
+    async def adjust(self, user_id, candidates, delta):
+        self.calls.append(("adjust", user_id, list(candidates), delta))
+
+def _apply(payloads):
+    repo = FakeRepo()
+    svc = SuggestionsService(repo, users_repo=None)
+    db = FakeSession()
+
+    async def run():
+        async with UnitOfWork(db) as uow:
+            await svc.apply_outbox(db, payloads, uow)
+            # commit 之前不會碰 Redis
+            assert repo.calls == []
+    asyncio.run(run())
+    return repo.calls
+
+def test_agree_removes_target_and_adds_its_followees():
+    calls = _apply([{"follower_id": "a", "following_id": "b", "status": "agree"}])
+    assert calls == [("remove", "a", "b"), ("adjust", "a", ["c1", "c2"], 1)]
+
+def test_unfollow_of_agreed_edge_decrements():
+    calls = _apply([{"follower_id": "a", "following_id": "b", "status": "deleted", "prev_status": "agree"}])
+    assert calls == [("adjust", "a", ["c1"], -1)]
+
+def test_rejected_request_changes_nothing():
+    assert _apply([{"follower_id": "a", "following_id": "b", "status": "deleted", "prev_status": "pending"}]) == []
@@ -0,0 +1,14 @@
+from utils.tags import extract, diff
+
+def test_extracts_normalized_tags_and_mentions():
+    tags, mentions = extract("Sunset #Beach #beach #ＢＥＡＣＨ #咖啡 with @Alice. and @bob_1")
+    assert tags == ["beach", "咖啡"]
+    assert mentions == ["alice", "bob_1"]
+
+def test_ignores_emails_anchors_and_entities():
+    tags, mentions = extract("mail me a@b.com, see page#top &#39;")
+    assert tags == [] and mentions == []
+
+def test_diff_only_reports_changes():
+    added, removed = diff(["a", "b"], ["b", "c"])
+    assert added == {"c"} and removed == {"a"}
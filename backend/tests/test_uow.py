@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from utils.uow import UnitOfWork
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+        self.info = {}
+
+    async def commit(self):
+        self.calls.append("commit")
+
+    async def rollback(self):
+        self.calls.append("rollback")
+
+def test_uow_commits_once_then_runs_hooks():
+    db = FakeSession()
+
+    async def hook(name):
+        db.calls.append(name)
+
+    async def run():
+        async with UnitOfWork(db) as uow:
+            uow.after_commit(hook, "clear_cache")
+            uow.after_commit(hook, "clear_list")
+    asyncio.run(run())
+    assert db.calls == ["commit", "clear_cache", "clear_list"]
+
+def test_uow_rollback_skips_hooks():
+    db = FakeSession()
+
+    async def hook():
+        db.calls.append("hook")
+
+    async def run():
+        async with UnitOfWork(db) as uow:
+            uow.after_commit(hook)
+            raise ValueError("boom")
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert db.calls == ["rollback"]
+
+def test_uow_runs_hooks_registered_on_session():
+    from utils.uow import after_commit
+    db = FakeSession()
+
+    async def hook(name):
+        db.calls.append(name)
+
+    async def run():
+        async with UnitOfWork(db) as uow:
+            after_commit(db, hook, "from_repo")
+            uow.after_commit(hook, "from_service")
+    asyncio.run(run())
+    assert db.calls == ["commit", "from_service", "from_repo"]
@@ -1,15 +1,21 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from utils import live_metrics
 
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 43200
+# SSE 用的 token 會放在網址上（會進 access / proxy log），只給 stream 用而且很快過期；只在建立連線時檢查
+STREAM_TOKEN_EXPIRE_SEC = 300
+STREAM_SCOPE = "events:stream"
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/users/login", auto_error=False)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -23,16 +29,34 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_token(token: str):
+def create_stream_token(current: dict) -> str:
+    return create_access_token({"sub": current["user_id"], "role": current["role"], "scope": STREAM_SCOPE},
+                               timedelta(seconds=STREAM_TOKEN_EXPIRE_SEC))
+
+def decode_token(token: str, scope: Optional[str] = None):
+    # scope 要完全相符：一般 API 不收 stream token，stream 的網址參數也不收一般 token
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         role: str = payload.get("role")
-        if user_id is None or role is None:
+        if user_id is None or role is None or payload.get("scope") != scope:
             raise HTTPException(status_code=401, detail="Invalid token payload")
         return {"user_id": user_id, "role": role}
     except JWTError:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    return decode_token(token)
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    current = decode_token(token)
+    # 每個 worker 每天每位 user 只會真的寫一次 HLL
+    await live_metrics.mark_active(current["user_id"])
+    return current
+
+async def get_stream_user(token: Optional[str] = Depends(oauth2_scheme_optional), stream_token: Optional[str] = None):
+    # 瀏覽器的 EventSource 不能帶 Authorization header，改用 POST /events/stream-token 換來的 ?stream_token=
+    if token:
+        return await get_current_user(token)
+    if not stream_token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    current = decode_token(stream_token, scope=STREAM_SCOPE)
+    await live_metrics.mark_active(current["user_id"])
+    return current
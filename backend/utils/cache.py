@@ -1,7 +1,27 @@
 import asyncio
-import orjson
-from typing import Any, Optional
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from utils import metrics
+from utils.codec import Codec, decode, default_codec
+
+class _CountingPipeline(Pipeline):
+    # 整個 pipeline 只算一次往返
+    async def execute(self, raise_on_error: bool = True):
+        if self.command_stack:
+            metrics.incr("redis.roundtrips")
+        return await super().execute(raise_on_error)
+
+class _CountingRedis(Redis):
+    """每送出一個指令（或一整個 pipeline）記一次 redis.roundtrips，middleware 會放進 X-Redis-Roundtrips"""
+    async def execute_command(self, *args, **options):
+        metrics.incr("redis.roundtrips")
+        return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Pipeline:
+        return _CountingPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
 
 _redis: Optional[Redis] = None #設定一個全域變數，類型是Redit物件，用這來操作Redis server
 
@@ -13,9 +33,18 @@ def get_redis() -> Redis:
         url = os.getenv("REDIS_URL")
         if not url:
             raise RuntimeError("REDIS_URL not set")
-        _redis = Redis.from_url(url, encoding="utf-8", decode_responses=False)  # 二進位值，自己用 orjson 做轉換
+        _redis = _CountingRedis.from_url(url, encoding="utf-8", decode_responses=False)  # 二進位值，自己用 codec 做轉換
     return _redis
 
+_codec: Optional[Codec] = None
+
+def get_codec() -> Codec:
+    # 跟 get_redis 一樣 lazy，環境變數在第一次用到時才讀
+    global _codec
+    if _codec is None:
+        _codec = default_codec()
+    return _codec
+
 # 統一 Key 前綴，避免與其他服務衝突
 PREFIX = "socialapi"
 
@@ -23,13 +52,24 @@ def k(*parts: str) -> str:
     # Key 統一用 : 分隔，所有變動參數都要體現在 key 內
     return ":".join([PREFIX, *parts])
 
-async def get_json(key: str) -> Optional[Any]:
+def family(key) -> str:
+    # "socialapi:post:<id>:viewer:<id>" -> "post"，記憶體與寫入量依這個分組
+    parts = (key.decode() if isinstance(key, bytes) else key).split(":", 2)
+    return parts[1] if len(parts) > 1 and parts[0] == PREFIX else "<other>"
+
+def _encode(key: str, obj: Any) -> bytes:
+    raw = get_codec().encode(obj)
+    metrics.incr(f"cache.write_bytes.{family(key)}", len(raw))
+    return raw
+
+async def get_json(key: str, refresh_ttl_sec: Optional[int] = None) -> Optional[Any]:
+    # refresh_ttl_sec：命中時順便把 TTL 延長（GETEX），一直有人讀的 key 不會過期
     r = get_redis()
-    val = await r.get(key)
+    val = await r.getex(key, ex=refresh_ttl_sec) if refresh_ttl_sec else await r.get(key)
     if val is None:
         return None
     try:
-        return orjson.loads(val)
+        return decode(val)
     except Exception:
         # 如果出現錯誤就直接刪除這以資料
         await r.delete(key)
@@ -37,19 +77,118 @@ async def get_json(key: str) -> Optional[Any]:
 
 async def set_json(key: str, obj: Any, ttl_sec: int) -> None:
     r = get_redis()
-    await r.set(key, orjson.dumps(obj, default=str), ex=ttl_sec)
+    await r.set(key, _encode(key, obj), ex=ttl_sec)
 
-async def delete(key: str) -> None:
-    r = get_redis()
-    await r.delete(key)
+# ----- 已序列化好的回應 body -----
+def body_key(key: str) -> str:
+    # 接在資料 key 後面，資料 key 的 pattern（"...:viewer:*"）也會一起刪到
+    return f"{key}:body"
+
+async def get_body(key: str) -> Optional[Tuple[str, bytes]]:
+    """
+    存的是 "<ETag> <body>"，回傳 (ETag, body)：ETag 跟目前的不一樣代表 body 是在某次 bump 之前建的，呼叫端當成 miss。
+    這樣不必每種變更都去刪 body，版本號變了舊的 body 自然不會再被送出去。
+    """
+    raw = await get_redis().get(key)
+    if raw is None:
+        return None
+    tag, _, body = raw.partition(b" ")
+    return tag.decode(), body
+
+async def set_body(key: str, etag: str, body: bytes, ttl_sec: int) -> None:
+    # 原樣存放，不經過 codec：命中時直接當 HTTP body 回傳，不需要任何解碼
+    raw = etag.encode() + b" " + body
+    metrics.incr(f"cache.write_bytes.{family(key)}", len(raw))
+    await get_redis().set(key, raw, ex=ttl_sec)
+
+# ----- 從 DB 重建的 key -----
+# 增量維護的 key（ZSET 清單等）在 key 不存在時的變更是 no-op；重建要先記下 generation，
+# 寫回前確認期間沒有變更（寫入端每次套用變更都 INCR），否則快照可能漏掉那筆變更
+GEN_TTL_SEC = 3600
+
+def gen_key(key: str) -> str:
+    return f"{key}:gen"
 
-async def delete_many(*keys: str) -> None:
+async def get_gen(key: str) -> str:
+    # 沒有 generation 時回 ""；與 Lua 裡的 GET ... or '' 對應
+    g = await get_redis().get(gen_key(key))
+    return g.decode() if g is not None else ""
+
+def bump_gen(pipe: Pipeline, key: str) -> None:
+    pipe.incr(gen_key(key))
+    pipe.expire(gen_key(key), GEN_TTL_SEC)
+
+# ----- 批次版：多個 key 一次往返 -----
+async def get_many(keys: List[str]) -> List[Optional[Any]]:
+    # 一次 MGET，順序同 keys；壞掉的值視為 miss（讀取端會重建並覆蓋）
     if not keys:
-        return
+        return []
+    out: List[Optional[Any]] = []
+    for val in await get_redis().mget(keys):
+        try:
+            out.append(decode(val) if val is not None else None)
+        except Exception:
+            out.append(None)
+    return out
+
+async def set_many(entries: Iterable[Tuple[str, Any, int]]) -> None:
+    # (key, 值, ttl 秒)；每個 key 可以有自己的 TTL，所以用 pipeline 而不是 MSET
+    pipe = get_redis().pipeline(transaction=False)
+    for key, obj, ttl_sec in entries:
+        pipe.set(key, _encode(key, obj), ex=ttl_sec)
+    await pipe.execute()
+
+async def invalidate_many(keys: Iterable[str] = (), patterns: Iterable[str] = ()) -> None:
+    """
+    一次刪掉多個 key 與符合 pattern 的 key：pattern 仍要 SCAN（每批一次往返），
+    但找到的 key 與直接給的 key 最後合成一個 DEL，不再一個 key 一次。
+    """
     r = get_redis()
-    await r.delete(*keys)
+    keys = list(keys)
+    for pattern in patterns:
+        keys.extend([key async for key in r.scan_iter(match=pattern, count=500)])
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return
+    if len(keys) <= 1000:
+        await r.delete(*keys)
+        return
+    pipe = r.pipeline(transaction=False)
+    for i in range(0, len(keys), 1000):
+        pipe.delete(*keys[i:i + 1000])
+    await pipe.execute()
+
+async def delete(key: str) -> None:
+    await invalidate_many([key])
 
 async def delete_pattern(pattern: str) -> None:
+    await invalidate_many(patterns=[pattern])
+
+async def memory_by_family(match: Optional[str] = None, batch: int = 500) -> Dict[str, Dict[str, int]]:
+    """
+    掃過所有 key（預設只看本服務前綴），以 MEMORY USAGE 估算每個 family 佔的記憶體：
+    {family: {"keys": 筆數, "bytes": 位元組}}。每批 key 一個 pipeline，適合離峰手動跑。
+    """
     r = get_redis()
-    async for key in r.scan_iter(match=pattern, count=500):
-        await r.delete(key)
+    out: Dict[str, Dict[str, int]] = defaultdict(lambda: {"keys": 0, "bytes": 0})
+    keys: List[bytes] = []
+
+    async def flush() -> None:
+        pipe = r.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+        for key, used in zip(keys, await pipe.execute()):
+            if used is None:
+                continue  # 掃描之後過期了
+            fam = out[family(key)]
+            fam["keys"] += 1
+            fam["bytes"] += used
+        keys.clear()
+
+    async for key in r.scan_iter(match=match or k("*"), count=batch):
+        keys.append(key)
+        if len(keys) >= batch:
+            await flush()
+    if keys:
+        await flush()
+    return dict(out)
@@ -0,0 +1,85 @@
+import os
+import zlib
+from typing import Any, Callable, Dict, Tuple
+
+import orjson
+
+# 快取值的編碼：1 byte magic + 1 byte 格式 id + 1 byte 壓縮 id，後面接內容。
+# orjson 輸出一定是 ASCII 開頭，不會是 0xC1，所以沒有 header 的舊值直接當 orjson 讀（升級時不用清快取，
+# 舊值讀得到、下次寫入就換成新格式，TTL 到了也就沒了）。
+# 要換格式或壓縮方式只要改環境變數；讀取看的是 header，不同設定的 worker 同時在跑也讀得到彼此寫的值。
+MAGIC = 0xC1
+
+Dumps = Callable[[Any], bytes]
+Loads = Callable[[bytes], Any]
+_FORMATS: Dict[int, Tuple[str, Dumps, Loads]] = {}
+_COMPRESSORS: Dict[int, Tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {}
+
+def register_format(fid: int, name: str, dumps: Dumps, loads: Loads) -> None:
+    _FORMATS[fid] = (name, dumps, loads)
+
+def register_compressor(cid: int, name: str, compress: Callable[[bytes], bytes], decompress: Callable[[bytes], bytes]) -> None:
+    # cid 0 保留給「不壓縮」
+    _COMPRESSORS[cid] = (name, compress, decompress)
+
+def _by_name(table: Dict[int, tuple], name: str, kind: str) -> int:
+    for i, entry in table.items():
+        if entry[0] == name:
+            return i
+    raise ValueError(f"unknown or unavailable cache {kind}: {name}")
+
+register_format(1, "json", lambda obj: orjson.dumps(obj, default=str), orjson.loads)
+# 快取是熱路徑，zlib 用最快的等級：大小跟預設等級差不多，CPU 少很多
+register_compressor(1, "zlib", lambda b: zlib.compress(b, 1), zlib.decompress)
+
+# 以下有裝才能用；沒裝的 worker 讀到這些格式會當成 miss
+try:
+    import msgpack
+    register_format(2, "msgpack", lambda obj: msgpack.packb(obj, default=str, use_bin_type=True),
+                    lambda b: msgpack.unpackb(b, raw=False))
+except ImportError:
+    pass
+try:
+    import zstandard
+    register_compressor(2, "zstd", zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress)
+except ImportError:
+    pass
+try:
+    import lz4.frame
+    register_compressor(3, "lz4", lz4.frame.compress, lz4.frame.decompress)
+except ImportError:
+    pass
+
+class Codec:
+    def __init__(self, fmt: str = "json", compression: str = "zlib", min_bytes: int = 1024):
+        self.fid = _by_name(_FORMATS, fmt, "format")
+        self.cid = _by_name(_COMPRESSORS, compression, "compression") if compression != "none" else 0
+        # 小的值壓縮省不了多少，還多花 CPU
+        self.min_bytes = min_bytes
+
+    def encode(self, obj: Any) -> bytes:
+        body = _FORMATS[self.fid][1](obj)
+        cid = 0
+        if self.cid and len(body) >= self.min_bytes:
+            packed = _COMPRESSORS[self.cid][1](body)
+            if len(packed) < len(body):
+                body, cid = packed, self.cid
+        return bytes((MAGIC, self.fid, cid)) + body
+
+def decode(raw: bytes) -> Any:
+    """依 header 解碼；沒有 header 的是舊版 orjson。格式不認得時丟 ValueError，呼叫端當 miss"""
+    if not raw or raw[0] != MAGIC:
+        return orjson.loads(raw)
+    fid, cid, body = raw[1], raw[2], raw[3:]
+    if fid not in _FORMATS or (cid and cid not in _COMPRESSORS):
+        raise ValueError(f"unsupported cache encoding: format={fid} compression={cid}")
+    if cid:
+        body = _COMPRESSORS[cid][2](body)
+    return _FORMATS[fid][2](body)
+
+def default_codec() -> Codec:
+    return Codec(
+        os.getenv("CACHE_CODEC", "json"),
+        os.getenv("CACHE_COMPRESSION", "zlib"),
+        int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024")),
+    )
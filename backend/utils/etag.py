@@ -0,0 +1,84 @@
+import os
+import time
+import hashlib
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from utils import versions
+from utils.ids import canonical_id
+
+# 每個路由的 Cache-Control：內容依 viewer 而不同，一律 private；no-cache 表示每次都要帶 If-None-Match 回來驗證
+CACHE_CONTROL = {
+    "post": "private, no-cache",
+    "user": "private, no-cache",
+    "follows": "private, no-cache",
+    "events": "private, no-cache",
+}
+
+# 貼文與追蹤清單裡有其他人的名稱（留言者、清單成員），他們的版本號不在 ETag 裡；
+# 這兩個路由的 ETag 每 ETAG_ROLLOVER_SEC 換一次，名稱最多舊這麼久
+ETAG_ROLLOVER_SEC = int(os.getenv("ETAG_ROLLOVER_SEC", "300"))
+
+def _bucket() -> int:
+    return int(time.time()) // ETAG_ROLLOVER_SEC
+
+def _digest(route: str, viewer_id: str, vers: Iterable[str], *params) -> str:
+    parts = [route, str(viewer_id), *vers, *(str(p) for p in params)]
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=12).hexdigest()
+
+async def compute(route: str, viewer_id: str, entities: Iterable[Tuple[str, str]], *params) -> str:
+    """強 ETag：route、viewer、相關版本號與查詢參數的 hash；只需要一次 Redis 往返"""
+    return '"%s"' % _digest(route, viewer_id, await versions.read(entities), *params)
+
+# 各路由的內容取決於哪些版本號（寫入端 bump 的地方要跟這裡對得上）
+# 貼文：本身（內容、讚、留言）、作者的名稱 / 公開狀態、viewer 的追蹤關係（可見性）；留言者的名稱靠時間區段更新。
+# 作者 id 要查 DB 才知道，所以放在 ETag 裡（"<hash>.<author_id>"），client 帶回來時就不必查 DB
+def post_entities(viewer_id: str, post_id: str, author_id: str) -> List[Tuple[str, str]]:
+    return [("post", post_id), ("user", author_id), ("follows", viewer_id)]
+
+def post_tag(viewer_id: str, post_id: str, author_id: str, vers: List[str]) -> str:
+    # vers 的順序同 post_entities
+    return '"%s.%s"' % (_digest("post", viewer_id, vers, _bucket()), author_id)
+
+async def for_post(viewer_id: str, post_id: str, author_id: str) -> str:
+    return post_tag(viewer_id, post_id, author_id, await versions.read(post_entities(viewer_id, post_id, author_id)))
+
+def post_author(if_none_match: Optional[str]) -> Optional[str]:
+    # 從 client 帶回來的 ETag 取出作者 id；沒有或格式不對回 None（改走 service）
+    for t in (if_none_match or "").split(","):
+        _, dot, author = t.strip().removeprefix("W/").strip('"').partition(".")
+        if dot:
+            try:
+                return canonical_id(author)
+            except ValueError:
+                continue
+    return None
+
+async def for_user(viewer_id: str, user_id: str) -> str:
+    # 個人資料、三種計數與 is_following；追蹤變更會 bump 雙方
+    return await compute("user", viewer_id, [("user", user_id)])
+
+async def for_follows(viewer_id: str, *params) -> str:
+    # 自己的追蹤清單（成員與狀態）；成員改名 / 換頭像不會 bump，靠時間區段更新
+    return await compute("follows", viewer_id, [("follows", viewer_id)], *params, _bucket())
+
+async def for_events(viewer_id: str, *params) -> str:
+    # 自己的收件匣；封存舊事件時 bump 全域的 ("events", "all")
+    return await compute("events", viewer_id, [("events", viewer_id), ("events", "all")], *params)
+
+def matches(if_none_match: Optional[str], etag: str, exists: bool = False) -> bool:
+    # If-None-Match 用弱比較：W/ 前綴忽略；"*" 代表任何版本，只有確定資源存在（而且看得到）時才算符合
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return any((t == "*" and exists) or t.removeprefix("W/") == etag for t in tags)
+
+def not_modified(request: Request, etag: str, route: str, exists: bool = False) -> Optional[Response]:
+    # 符合就直接回 304，不做任何 hydration；版本號不代表資源存在，"*" 要等讀到資源後再用 exists=True 檢查一次
+    if matches(request.headers.get("if-none-match"), etag, exists):
+        return Response(status_code=304, headers=headers(etag, route))
+    return None
+
+def headers(etag: str, route: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL[route]}
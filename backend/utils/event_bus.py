@@ -0,0 +1,144 @@
+import os
+import asyncio
+import logging
+import orjson
+from typing import Any, Dict, Optional, Set
+
+from utils.cache import get_redis, k
+from utils import metrics
+
+log = logging.getLogger(__name__)
+
+# 每條 SSE 連線最多暫存幾筆還沒送出的事件；client 讀太慢塞滿時直接斷線，讓它帶 Last-Event-ID 重連從 DB 補
+STREAM_QUEUE_MAX = int(os.getenv("EVENT_STREAM_QUEUE_MAX", "100"))
+
+def channel(user_id: str) -> str:
+    return k("events", "ch", str(user_id))
+
+def event_payload(e) -> Dict[str, Any]:
+    return {
+        "event_id": str(e.event_id),
+        "message": e.message,
+        "is_read": e.is_read,
+        "type": e.type,
+        "metadata": e.event_metadata or {}
+    }
+
+async def publish(user_id: str, payload: Dict[str, Any]) -> None:
+    try:
+        await get_redis().publish(channel(user_id), orjson.dumps(payload, default=str))
+        metrics.incr("events.published")
+    except Exception:
+        # 推播失敗不影響寫入；client 下次重連或輪詢 /events 時會從 DB 拿到
+        log.warning("event publish failed for user %s", user_id, exc_info=True)
+
+class Subscription:
+    def __init__(self, user_id: str, maxsize: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # True 表示有事件沒送進來（佇列滿或 Redis 斷線），連線應該結束讓 client 重連補資料
+        self.lagged = False
+
+    def offer(self, payload: Dict[str, Any]) -> None:
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # 佇列滿代表 consumer 正在消化，不會卡在 get，下一輪就會看到 lagged
+            self.lagged = True
+            metrics.incr("events.stream.overflow")
+
+    def mark_lagged(self) -> None:
+        self.lagged = True
+        try:
+            # 放一個 None 喚醒正在等待的 consumer
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+class EventHub:
+    """
+    每個 worker 一條 Redis pub/sub 連線，所有 SSE 連線共用：
+    - 同一個 user 的第一條連線才 SUBSCRIBE，最後一條離開才 UNSUBSCRIBE
+    - 背景 task 讀訊息，依 channel 分派到各連線自己的有界佇列
+    """
+    def __init__(self, maxsize: int = STREAM_QUEUE_MAX):
+        self.maxsize = maxsize
+        self._subs: Dict[str, Set[Subscription]] = {}
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        metrics.register_gauge("events.stream.connections", lambda: sum(len(s) for s in self._subs.values()))
+
+    async def subscribe(self, user_id: str) -> Subscription:
+        sub = Subscription(str(user_id), self.maxsize)
+        async with self._lock:
+            if self._pubsub is None:
+                self._pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            subs = self._subs.setdefault(sub.user_id, set())
+            if not subs:
+                await self._pubsub.subscribe(channel(sub.user_id))
+            subs.add(sub)
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._reader())
+        return sub
+
+    async def unsubscribe(self, sub: Subscription) -> None:
+        async with self._lock:
+            subs = self._subs.get(sub.user_id)
+            if subs is None:
+                return
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.user_id]
+                try:
+                    await self._pubsub.unsubscribe(channel(sub.user_id))
+                except Exception:
+                    log.warning("event unsubscribe failed", exc_info=True)
+
+    def _dispatch(self, msg: Dict[str, Any]) -> None:
+        user_id = msg["channel"].decode().rsplit(":", 1)[-1]
+        try:
+            payload = orjson.loads(msg["data"])
+        except Exception:
+            return
+        for sub in list(self._subs.get(user_id, ())):
+            sub.offer(payload)
+
+    def _mark_all_lagged(self) -> None:
+        for subs in self._subs.values():
+            for sub in subs:
+                sub.mark_lagged()
+
+    async def _reader(self) -> None:
+        while True:
+            if not self._subs:
+                await asyncio.sleep(0.5)
+                continue
+            try:
+                msg = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 斷線期間的訊息已經遺失：所有連線結束，client 重連時從 DB 補
+                log.warning("event pubsub read failed", exc_info=True)
+                self._mark_all_lagged()
+                await asyncio.sleep(1.0)
+                continue
+            if msg and msg.get("type") == "message":
+                self._dispatch(msg)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+
+hub = EventHub()
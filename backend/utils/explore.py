@@ -0,0 +1,112 @@
+import os
+import time
+import logging
+from typing import List, Optional, Tuple
+
+from utils.cache import get_redis, k
+
+log = logging.getLogger(__name__)
+
+# 公開貼文的熱門分數（forward decay）：每次互動加 weight × 2^((now - epoch) / half_life)，
+# 越新的互動加得越多，等同舊互動以半衰期衰減；分數只會變大，所以定期以新的 epoch 等比例縮回來
+EXPLORE_HALF_LIFE_SEC = float(os.getenv("EXPLORE_HALF_LIFE_SEC", str(12 * 3600)))
+EXPLORE_MAX_POSTS = int(os.getenv("EXPLORE_MAX_POSTS", "5000"))
+EXPLORE_MIN_SCORE = float(os.getenv("EXPLORE_MIN_SCORE", "0.05"))
+
+WEIGHTS = {"post": 1.0, "like": 1.0, "comment": 2.0}
+
+def _key() -> str:
+    return k("explore", "posts")
+
+def _epoch_key() -> str:
+    return k("explore", "epoch")
+
+# KEYS: zset, epoch；ARGV: post_id, now, weight, half_life。epoch 在 script 裡讀，與 compaction 不會交錯
+RECORD_LUA = r"""
+local epoch = tonumber(redis.call('GET', KEYS[2]))
+if not epoch then
+    epoch = tonumber(ARGV[2])
+    redis.call('SET', KEYS[2], ARGV[2])
+end
+local w = tonumber(ARGV[3]) * math.pow(2, (tonumber(ARGV[2]) - epoch) / tonumber(ARGV[4]))
+local v = tonumber(redis.call('ZINCRBY', KEYS[1], w, ARGV[1]))
+if v <= 0 then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+return tostring(v)
+"""
+
+# KEYS: zset, epoch；ARGV: now, half_life, max_posts, min_score
+# 把 epoch 移到 now、全部分數乘上同一個係數（排序不變），再刪掉尾巴與分數太低的貼文
+COMPACT_LUA = r"""
+local now = tonumber(ARGV[1])
+local epoch = tonumber(redis.call('GET', KEYS[2])) or now
+local factor = math.pow(2, (epoch - now) / tonumber(ARGV[2]))
+local max_posts = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -(max_posts + 1))
+local rows = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+for i = 1, #rows, 2 do
+    redis.call('ZADD', KEYS[1], tonumber(rows[i + 1]) * factor, rows[i])
+end
+redis.call('SET', KEYS[2], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[4])
+return redis.call('ZCARD', KEYS[1])
+"""
+
+async def record(post_id: str, kind: str, sign: int = 1) -> None:
+    try:
+        await get_redis().eval(RECORD_LUA, 2, _key(), _epoch_key(), str(post_id), int(time.time()),
+                               sign * WEIGHTS[kind], EXPLORE_HALF_LIFE_SEC)
+    except Exception:
+        # 熱門分數只是排序參考，Redis 出問題不影響按讚 / 留言
+        log.warning("explore record failed: %s", kind, exc_info=True)
+
+async def remove(post_id: str) -> None:
+    try:
+        await get_redis().zrem(_key(), str(post_id))
+    except Exception:
+        # 刪文已經 commit，不能因此回 500；殘留的 id 讀取時會被 get_explore_posts 濾掉，分數衰減後由 compaction 清掉
+        log.warning("explore remove failed: %s", post_id, exc_info=True)
+
+async def compact() -> int:
+    return int(await get_redis().eval(COMPACT_LUA, 2, _key(), _epoch_key(), int(time.time()),
+                                      EXPLORE_HALF_LIFE_SEC, EXPLORE_MAX_POSTS, EXPLORE_MIN_SCORE))
+
+def make_cursor(epoch: int, score: float, post_id: str) -> str:
+    return f"{epoch}:{score!r}:{post_id}"
+
+def parse_cursor(cursor: str) -> Tuple[int, float, str]:
+    # 格式錯誤丟 ValueError，由 service 轉成 422
+    c_epoch, c_score, post_id = cursor.split(":", 2)
+    return int(c_epoch), float(c_score), post_id
+
+def rescale(score: float, from_epoch: int, to_epoch: int) -> float:
+    # 同一份分數在不同 epoch 下的值；compaction 之後舊 cursor 要先換算
+    if not from_epoch or not to_epoch:
+        return score
+    return score * 2 ** ((from_epoch - to_epoch) / EXPLORE_HALF_LIFE_SEC)
+
+async def page(limit: int, cursor: Optional[str]) -> Tuple[List[Tuple[str, float]], int]:
+    """
+    依 (score, post_id) 由大到小，回傳 ([(post_id, score)] 最多 limit+1 筆, epoch)。
+    同分的貼文很常見（同一秒發文、沒有互動），所以 cursor 帶 post_id，從 cursor 的分數（含）往下取再跳過已看過的。
+    """
+    r = get_redis()
+    epoch = int(await r.get(_epoch_key()) or 0)
+    if not cursor:
+        rows = await r.zrevrangebyscore(_key(), "+inf", "-inf", start=0, num=limit + 1, withscores=True)
+        return [(m.decode(), s) for m, s in rows], epoch
+    c_epoch, c_score, c_id = parse_cursor(cursor)
+    score = rescale(c_score, c_epoch, epoch)
+    out: List[Tuple[str, float]] = []
+    offset, chunk = 0, limit + 1
+    while len(out) < limit + 1:
+        rows = await r.zrevrangebyscore(_key(), score, "-inf", start=offset, num=chunk, withscores=True)
+        for m, s in rows:
+            m = m.decode()
+            if s < score or (s == score and m < c_id):
+                out.append((m, s))
+        if len(rows) < chunk:
+            break
+        offset += chunk
+    return out[:limit + 1], epoch
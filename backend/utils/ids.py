@@ -0,0 +1,47 @@
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+def uuid7() -> uuid.UUID:
+    # 前 48 bits 是毫秒時間戳（RFC 9562 UUIDv7），id 本身就帶著建立時間，可以拿來縮小分區掃描範圍
+    ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (ms & ((1 << 48) - 1)) << 80
+    value |= 0x7 << 76
+    value |= ((rand >> 62) & 0xFFF) << 64
+    value |= 0b10 << 62
+    value |= rand & ((1 << 62) - 1)
+    return uuid.UUID(int=value)
+
+def uuid7_time(value) -> Optional[datetime]:
+    # 回傳 UTC（naive，與 datetime.utcnow() 一致）；不是 v7 的舊 id 回 None
+    try:
+        u = value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    except ValueError:
+        return None
+    if u.version != 7:
+        return None
+    return datetime.utcfromtimestamp((u.int >> 80) / 1000)
+
+_EPOCH = datetime(1970, 1, 1)
+
+def micros(dt: datetime) -> int:
+    # naive UTC -> 微秒整數（< 2^53，ZSET 的 double 分數可以精確表示），拿來當時間序的 cursor 不會截斷同一毫秒的資料
+    return (dt.replace(tzinfo=None) - _EPOCH) // timedelta(microseconds=1)
+
+def from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=int(value))
+
+def canonical_id(raw: str) -> str:
+    # 單一 id 同 parse_id_list 的格式；不是 UUID 丟 ValueError
+    return str(uuid.UUID((raw or "").strip()))
+
+def parse_id_list(raw: str, limit: int) -> List[str]:
+    # "?ids=a,b,c"：去掉空白與重複、保留順序；格式不對或超過上限丟 ValueError
+    # 一律轉成標準的小寫帶 - 格式（{...}、urn:uuid:、32 碼 hex 都接受），與 DB 回傳的 id 與單篇的 cache key 一致
+    ids = list(dict.fromkeys(str(uuid.UUID(x.strip())) for x in (raw or "").split(",") if x.strip()))
+    if not ids or len(ids) > limit:
+        raise ValueError(f"ids must contain 1 to {limit} ids")
+    return ids
@@ -0,0 +1,58 @@
+import secrets
+from redis.asyncio import Redis
+
+from utils.cache import k
+
+# 只有持有者（value 相同）才能續約 / 釋放，避免誤刪別人的 lease
+RENEW_LUA = r"""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LUA = r"""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class RedisLease:
+    """
+    以 Redis key 做 leader election：SET NX PX 取得，持有者定期 PEXPIRE 續約。
+    process 掛掉沒續約時 lease 會自然過期，由其他 worker 接手。
+    """
+    def __init__(self, redis: Redis, name: str, ttl_sec: float):
+        self.redis = redis
+        self.key = k("lease", name)
+        self.ttl_ms = int(ttl_sec * 1000)
+        self.token = secrets.token_hex(8)
+        self.held = False
+
+    async def acquire_or_renew(self) -> bool:
+        if self.held and await self.renew():
+            return True
+        try:
+            self.held = bool(await self.redis.set(self.key, self.token, nx=True, px=self.ttl_ms))
+        except Exception:
+            # Redis 連不上時保守地當作沒有 lease，避免多個 worker 同時執行
+            self.held = False
+        return self.held
+
+    async def renew(self) -> bool:
+        # 只續約、不重新取得：中間斷過就回 False，其他 worker 可能已經接手做過同樣的事
+        if not self.held:
+            return False
+        try:
+            self.held = bool(await self.redis.eval(RENEW_LUA, 1, self.key, self.token, self.ttl_ms))
+        except Exception:
+            self.held = False
+        return self.held
+
+    async def release(self) -> None:
+        if self.held:
+            try:
+                await self.redis.eval(RELEASE_LUA, 1, self.key, self.token)
+            finally:
+                self.held = False
@@ -0,0 +1,96 @@
+import logging
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from typing import Any, Dict, Iterable, List, Set
+
+from utils.cache import get_redis, k
+
+log = logging.getLogger(__name__)
+TZ_TAIPEI = ZoneInfo("Asia/Taipei")
+
+# 當日即時計數；每天 03:00 的日統計會把前一天的資料寫進 Mongo 後刪掉
+LIVE_METRICS = ("user_count", "post_count", "like_count", "comment_count", "follow_count")
+LIVE_TTL_SEC = 3 * 24 * 3600
+
+# 本 worker 今天已經 PFADD 過的 user，避免每個 request 都打一次 Redis
+_seen_day: date | None = None
+_seen: Set[str] = set()
+
+def _counter_key(d: date, metric: str) -> str:
+    # Hash：field 為台北時間的小時 "00".."23"
+    return k("live", d.isoformat(), metric)
+
+def _active_key(d: date) -> str:
+    # HyperLogLog：當天活躍的 user_id
+    return k("live", d.isoformat(), "active")
+
+async def bump(metric: str, n: int = 1) -> None:
+    now = datetime.now(tz=TZ_TAIPEI)
+    key = _counter_key(now.date(), metric)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(key, f"{now.hour:02d}", n)
+        pipe.expire(key, LIVE_TTL_SEC)
+        await pipe.execute()
+    except Exception:
+        # 即時數字只是輔助，Redis 出問題不影響主流程
+        log.warning("live metric bump failed: %s", metric, exc_info=True)
+
+async def mark_active(user_id: str) -> None:
+    global _seen_day, _seen
+    today = datetime.now(tz=TZ_TAIPEI).date()
+    if _seen_day != today:
+        _seen_day, _seen = today, set()
+    if user_id in _seen:
+        return
+    key = _active_key(today)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.pfadd(key, user_id)
+        pipe.expire(key, LIVE_TTL_SEC)
+        await pipe.execute()
+        _seen.add(user_id)
+    except Exception:
+        log.warning("live active-user mark failed", exc_info=True)
+
+async def read_days(days: Iterable[date]) -> Dict[date, Dict[str, Any]]:
+    """
+    每天回傳 {metric: 當日總數, "active_user_count": HLL 估計值, "hourly": {metric: [24 個小時]}, "has_data": bool}；
+    幾天都放在同一個 pipeline，一次往返
+    """
+    days = list(days)
+    if not days:
+        return {}
+    pipe = get_redis().pipeline(transaction=False)
+    for d in days:
+        for metric in LIVE_METRICS:
+            pipe.hgetall(_counter_key(d, metric))
+        pipe.exists(_active_key(d))
+        pipe.pfcount(_active_key(d))
+    res = await pipe.execute()
+
+    per_day = len(LIVE_METRICS) + 2
+    return {d: _shape_day(res[i * per_day:(i + 1) * per_day]) for i, d in enumerate(days)}
+
+def _shape_day(res: List[Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"hourly": {}}
+    has_data = bool(res[-2])
+    for metric, hours in zip(LIVE_METRICS, res[:len(LIVE_METRICS)]):
+        per_hour = [0] * 24
+        for h, v in (hours or {}).items():
+            per_hour[int(h)] = int(v)
+        out["hourly"][metric] = per_hour
+        out[metric] = sum(per_hour)
+        has_data = has_data or bool(hours)
+    out["active_user_count"] = int(res[-1])
+    out["has_data"] = has_data
+    return out
+
+async def drop_days(days: Iterable[date]) -> None:
+    # 已寫進 Mongo 的日子，把 Redis 上的小時計數與 HLL 清掉
+    keys = []
+    for d in days:
+        keys.extend(_counter_key(d, metric) for metric in LIVE_METRICS)
+        keys.append(_active_key(d))
+    if keys:
+        await get_redis().delete(*keys)
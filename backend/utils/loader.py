@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Set, Tuple
+
+from utils import metrics
+
+BatchFn = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+class Loader:
+    """
+    一個 request 內依 key 批次 + 記憶的讀取（DataLoader 模式）：
+    - 同一個 key 只查一次，之後直接回傳同一個結果（查不到的 None 也記住）
+    - 同一輪 event loop 內發出的 load 會合併成一次 batch_fn(keys)，也就是一個 IN (...) 查詢
+    每次查詢計入 db.loader.queries，被記憶或合併省下來的計入 db.loader.saved。
+    """
+    def __init__(self, name: str, batch_fn: BatchFn, lock: asyncio.Lock):
+        self.name = name
+        self._batch_fn = batch_fn
+        # 同一個 session 不能同時跑兩個查詢，所有 loader 共用一把鎖
+        self._lock = lock
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Tuple[Hashable, asyncio.Future]] = []
+        # event loop 只對 task 留弱參照，沒人持有的 task 可能跑到一半被回收
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, key: Hashable) -> Any:
+        fut = self._cache.get(key)
+        if fut is not None:
+            metrics.incr("db.loader.saved")
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self._cache[key] = fut
+            self._queue.append((key, fut))
+            if len(self._queue) == 1:
+                # 等目前排隊中的 task 都跑到各自的 load 之後再一起查
+                asyncio.get_running_loop().call_soon(self._spawn)
+        # 多個 caller 共用同一個 future，其中一個被取消不能連帶取消其他人
+        return await asyncio.shield(fut)
+
+    async def load_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        keys = list(dict.fromkeys(keys))
+        values = await asyncio.gather(*(self.load(k) for k in keys))
+        return {k: v for k, v in zip(keys, values) if v is not None}
+
+    def prime(self, key: Hashable, value: Any) -> None:
+        # 剛寫入 / 已經在手上的資料直接放進來，之後的 load 不必再查
+        fut = asyncio.get_running_loop().create_future()
+        fut.set_result(value)
+        self._cache[key] = fut
+
+    def clear(self, key: Hashable) -> None:
+        self._cache.pop(key, None)
+
+    def _spawn(self) -> None:
+        task = asyncio.ensure_future(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self) -> None:
+        futs, self._queue = self._queue, []
+        keys = [k for k, _ in futs]
+        try:
+            async with self._lock:
+                found = await self._batch_fn(keys)
+        except Exception as e:
+            for k, fut in futs:
+                # 失敗的不記住，下次 load 會重查
+                if self._cache.get(k) is fut:
+                    del self._cache[k]
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        metrics.incr("db.loader.queries")
+        metrics.incr("db.loader.saved", len(keys) - 1)
+        for k, fut in futs:
+            if not fut.done():
+                fut.set_result(found.get(k))
@@ -0,0 +1,48 @@
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+# 行程內的簡易計數器；每個 uvicorn worker 各自一份，由 /api/metrics 讀出
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, float] = {}
+# 讀取時才計算的 gauge（例如連線池目前借出數）
+_gauge_fns: Dict[str, Callable[[], float]] = {}
+# endpoint -> {"requests": n, "<counter>": total}
+_endpoints: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+# 單一 request 範圍內的計數（middleware 進來時建立，出去時彙總到 endpoint）
+_request_stats: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stats", default=None)
+
+def incr(name: str, n: float = 1) -> None:
+    _counters[name] += n
+    stats = _request_stats.get()
+    if stats is not None:
+        stats[name] = stats.get(name, 0) + n
+
+def set_gauge(name: str, value: float) -> None:
+    _gauges[name] = value
+
+def register_gauge(name: str, fn: Callable[[], float]) -> None:
+    _gauge_fns[name] = fn
+
+def begin_request() -> Dict[str, float]:
+    stats: Dict[str, float] = {}
+    _request_stats.set(stats)
+    return stats
+
+def request_stat(name: str) -> float:
+    stats = _request_stats.get()
+    return (stats or {}).get(name, 0)
+
+def end_request(endpoint: str, stats: Dict[str, float]) -> None:
+    ep = _endpoints[endpoint]
+    ep["requests"] += 1
+    for name, v in stats.items():
+        ep[name] += v
+
+def snapshot() -> Dict[str, Dict]:
+    return {
+        "counters": dict(_counters),
+        "gauges": {**_gauges, **{name: fn() for name, fn in _gauge_fns.items()}},
+        "endpoints": {ep: dict(v) for ep, v in _endpoints.items()},
+    }
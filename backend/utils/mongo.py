@@ -18,3 +18,18 @@ def get_mongo_collection():
     db_name = os.getenv("MONGODB_DB", "social_analytics")
     coll_name = os.getenv("MONGODB_COLL", "daily_stats")
     return client[db_name][coll_name]
+
+def get_job_state_collection():
+    # 背景工作的進度 / 執行紀錄（例如 backfill 做到哪一天），與日統計分開存放
+    client = get_mongo_client()
+    db_name = os.getenv("MONGODB_DB", "social_analytics")
+    coll_name = os.getenv("MONGODB_JOB_STATE_COLL", "job_state")
+    return client[db_name][coll_name]
+
+def get_rollup_collection(kind: str):
+    # kind: "week" / "month"，由日統計彙總而來的週、月 rollup
+    client = get_mongo_client()
+    db_name = os.getenv("MONGODB_DB", "social_analytics")
+    default = {"week": "weekly_stats", "month": "monthly_stats"}[kind]
+    coll_name = os.getenv(f"MONGODB_{kind.upper()}LY_COLL", default)
+    return client[db_name][coll_name]
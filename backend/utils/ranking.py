@@ -0,0 +1,53 @@
+import os
+from typing import Callable, Dict, List
+
+import numpy as np
+
+# 排序用的特徵，每個都是與候選貼文等長的 float64 陣列（順序同候選，新到舊）
+FEATURES = ("affinity", "likes", "comments", "age_hours", "images")
+
+Scorer = Callable[[Dict[str, np.ndarray]], np.ndarray]
+_SCORERS: Dict[str, Scorer] = {}
+
+def register_scorer(name: str):
+    # 要換排序方式就註冊新的 scorer，再用 FEED_SCORER 選
+    def deco(fn: Scorer) -> Scorer:
+        _SCORERS[name] = fn
+        return fn
+    return deco
+
+def get_scorer(name: str) -> Scorer:
+    try:
+        return _SCORERS[name]
+    except KeyError:
+        raise ValueError(f"unknown feed scorer: {name}")
+
+WEIGHTS = {
+    "affinity": float(os.getenv("FEED_W_AFFINITY", "1.5")),
+    "engagement": float(os.getenv("FEED_W_ENGAGEMENT", "1.0")),
+    "recency": float(os.getenv("FEED_W_RECENCY", "2.0")),
+    "images": float(os.getenv("FEED_W_IMAGES", "0.2")),
+}
+RECENCY_HALF_LIFE_H = float(os.getenv("FEED_RECENCY_HALF_LIFE_H", "12"))
+
+@register_scorer("linear")
+def linear(f: Dict[str, np.ndarray]) -> np.ndarray:
+    # 計數類取 log1p，避免單一爆紅貼文蓋掉其他訊號；新鮮度以半衰期指數衰減；圖片數最多算到 4 張
+    engagement = np.log1p(f["likes"] + 2.0 * f["comments"])
+    recency = np.exp2(-f["age_hours"] / RECENCY_HALF_LIFE_H)
+    return (
+        WEIGHTS["affinity"] * np.log1p(f["affinity"])
+        + WEIGHTS["engagement"] * engagement
+        + WEIGHTS["recency"] * recency
+        + WEIGHTS["images"] * np.minimum(f["images"], 4.0)
+    )
+
+@register_scorer("recent")
+def recent(f: Dict[str, np.ndarray]) -> np.ndarray:
+    # 等同原本的時間排序，方便比較或暫時關掉排序
+    return -f["age_hours"]
+
+def rank(features: Dict[str, np.ndarray], scorer: Scorer) -> List[int]:
+    """回傳候選的 index，分數高的在前；同分時 stable sort 保留候選原本的新到舊順序"""
+    scores = scorer(features)
+    return np.argsort(-scores, kind="stable").tolist()
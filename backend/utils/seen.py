@@ -0,0 +1,99 @@
+import os
+import math
+import hashlib
+import logging
+from typing import Iterable, List, Set
+
+from utils.cache import get_redis, k
+
+log = logging.getLogger(__name__)
+
+# 每位 user 一個 Bloom filter（Redis bitmap，SETBIT / GETBIT，不需要 RedisBloom module）記錄看過的貼文。
+# 設定的是誤判率與每代記憶體，容量與 hash 數由這兩個推出來：
+#   m = bytes * 8，k = round(-log2 p)，n = m * (ln2)^2 / -ln p
+# 寫滿 n 筆之後換代（目前這代改名成上一代），查詢時兩代都看，所以最多佔 2 * bytes，誤判率不會隨著使用越滑越高。
+SEEN_FP_RATE = float(os.getenv("SEEN_FP_RATE", "0.01"))
+SEEN_BYTES = int(os.getenv("SEEN_BYTES", "4096"))
+SEEN_TTL_SEC = int(os.getenv("SEEN_TTL_SEC", str(7 * 24 * 3600)))
+
+M_BITS = SEEN_BYTES * 8
+K_HASHES = max(1, round(-math.log2(SEEN_FP_RATE)))
+CAPACITY = max(1, int(M_BITS * math.log(2) ** 2 / -math.log(SEEN_FP_RATE)))
+
+def _keys(user_id: str) -> List[str]:
+    base = k("seen", str(user_id))
+    return [base, f"{base}:prev", f"{base}:n"]
+
+def positions(item: str) -> List[int]:
+    # double hashing（Kirsch–Mitzenmacher）：一次 blake2b 拆成兩個 64-bit，g_i = h1 + i * h2
+    d = hashlib.blake2b(item.encode(), digest_size=16).digest()
+    h1, h2 = int.from_bytes(d[:8], "little"), int.from_bytes(d[8:], "little") | 1
+    return [(h1 + i * h2) % M_BITS for i in range(K_HASHES)]
+
+# KEYS: cur, prev, count；ARGV: k, capacity, ttl, 之後每 k 個 bit 位置為一筆
+# 全部 bit 原本都是 1 的不算新的一筆；計數到容量就換代
+_ADD_LUA = r"""
+local k, cap, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local added = 0
+for i = 4, #ARGV, k do
+    local new = 0
+    for j = i, i + k - 1 do
+        if redis.call('SETBIT', KEYS[1], ARGV[j], 1) == 0 then new = 1 end
+    end
+    added = added + new
+end
+local n = redis.call('INCRBY', KEYS[3], added)
+if n >= cap then
+    redis.call('RENAME', KEYS[1], KEYS[2])
+    redis.call('DEL', KEYS[3])
+    redis.call('EXPIRE', KEYS[2], ttl)
+else
+    redis.call('EXPIRE', KEYS[1], ttl)
+    redis.call('EXPIRE', KEYS[3], ttl)
+end
+return added
+"""
+
+# KEYS: cur, prev；回傳每筆是否（可能）看過
+_CHECK_LUA = r"""
+local k = tonumber(ARGV[1])
+local out = {}
+for i = 2, #ARGV, k do
+    local seen = 0
+    for _, key in ipairs(KEYS) do
+        local all = 1
+        for j = i, i + k - 1 do
+            if redis.call('GETBIT', key, ARGV[j]) == 0 then all = 0; break end
+        end
+        if all == 1 then seen = 1; break end
+    end
+    out[#out + 1] = seen
+end
+return out
+"""
+
+async def mark(user_id: str, post_ids: Iterable[str]) -> None:
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    cur, prev, count = _keys(user_id)
+    pos = [p for pid in post_ids for p in positions(str(pid))]
+    try:
+        await get_redis().eval(_ADD_LUA, 3, cur, prev, count, K_HASHES, CAPACITY, SEEN_TTL_SEC, *pos)
+    except Exception:
+        # 只影響「略過看過的」效果，不影響回應
+        log.warning("seen mark failed", exc_info=True)
+
+async def seen_of(user_id: str, post_ids: Iterable[str]) -> Set[str]:
+    """回傳看過的 post_id（Bloom filter：可能誤判成看過，但看過的一定會回報）"""
+    post_ids = [str(p) for p in post_ids]
+    if not post_ids:
+        return set()
+    cur, prev, _ = _keys(user_id)
+    pos = [p for pid in post_ids for p in positions(pid)]
+    try:
+        flags = await get_redis().eval(_CHECK_LUA, 2, cur, prev, K_HASHES, *pos)
+    except Exception:
+        log.warning("seen check failed", exc_info=True)
+        return set()
+    return {pid for pid, f in zip(post_ids, flags) if f}
@@ -0,0 +1,35 @@
+import re
+import unicodedata
+from typing import List, Set, Tuple
+
+MAX_TAGS_PER_POST = 30
+MAX_MENTIONS_PER_POST = 20
+
+# 前面不能接文字，避免把 email（a@b.com）、網址錨點（page#top）、HTML 實體（&#39;）當成標記
+_TAG_RE = re.compile(r"(?<![\w#&])#(\w{1,64})")
+_MENTION_RE = re.compile(r"(?<![\w@])@([A-Za-z0-9_.]{1,30})")
+
+def normalize_tag(tag: str) -> str:
+    # 全形 / 相容字元轉成一般形式再 casefold：#Python、#ＰＹＴＨＯＮ 是同一個 tag
+    return unicodedata.normalize("NFKC", tag).casefold()
+
+def _unique(items, limit: int) -> List[str]:
+    # 保留第一次出現的順序，超過上限的忽略
+    out: List[str] = []
+    for x in items:
+        if x not in out:
+            out.append(x)
+            if len(out) >= limit:
+                break
+    return out
+
+def extract(content: str) -> Tuple[List[str], List[str]]:
+    """回傳 (tags, mentions)；tags 已正規化，mentions 為小寫 username（註冊時 username 也是存小寫）"""
+    content = content or ""
+    tags = _unique((normalize_tag(m) for m in _TAG_RE.findall(content)), MAX_TAGS_PER_POST)
+    mentions = _unique((m.rstrip(".").lower() for m in _MENTION_RE.findall(content)), MAX_MENTIONS_PER_POST)
+    return tags, [m for m in mentions if m]
+
+def diff(old: List[str], new: List[str]) -> Tuple[Set[str], Set[str]]:
+    # (新增的, 移除的)
+    return set(new) - set(old), set(old) - set(new)
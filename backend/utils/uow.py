@@ -0,0 +1,48 @@
+from typing import Any, Awaitable, Callable, List
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils import metrics
+
+# repository 不知道外層的 UnitOfWork，透過 session.info 登記 commit 後的副作用
+_SESSION_HOOKS = "after_commit_hooks"
+
+def after_commit(db: AsyncSession, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> None:
+    db.info.setdefault(_SESSION_HOOKS, []).append(lambda: fn(*args, **kwargs))
+
+def pin_primary(db: AsyncSession) -> None:
+    # 要寫回快取的讀取改走 primary（見 db.RoutingSession）：replica 可能還沒追上剛 commit 的寫入，
+    # 讀到的舊資料寫進快取後會一直留到 TTL
+    db.info["pinned_primary"] = True
+
+class UnitOfWork:
+    """
+    一次 service 呼叫只 commit 一次：
+    - repository 只做 flush（INSERT 用 RETURNING 拿回預設值，不再 refresh）
+    - 離開 with 區塊時才 commit，例外則 rollback
+    - cache 失效等副作用用 after_commit 登記，commit 成功後才執行
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._hooks: List[Callable[[], Awaitable[Any]]] = []
+
+    def after_commit(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> None:
+        self._hooks.append(lambda: fn(*args, **kwargs))
+
+    async def __aenter__(self) -> "UnitOfWork":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is not None:
+            await self.db.rollback()
+            self._hooks.clear()
+            self.db.info.pop(_SESSION_HOOKS, None)
+            return False
+        await self.commit()
+        return False
+
+    async def commit(self) -> None:
+        await self.db.commit()
+        metrics.incr("db.commits")
+        hooks, self._hooks = self._hooks + self.db.info.pop(_SESSION_HOOKS, []), []
+        for hook in hooks:
+            await hook()
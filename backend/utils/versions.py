@@ -0,0 +1,48 @@
+import time
+import logging
+from typing import Iterable, List, Tuple
+
+from utils.cache import get_redis, k
+
+log = logging.getLogger(__name__)
+
+# 每個實體一個版本號（Redis 字串），內容有變就在 commit 之後 bump；ETag 由相關版本號 + viewer + 查詢參數算出。
+# 版本號在第一次 bump 時以微秒時間建立、之後只會變大，key 過期重建也不會回到舊值，舊的 ETag 不會誤中。
+# 讀取不會建立 key（id 由 client 提供，否則任意 id 都會留下一個 key）：不存在時回傳目前的 TTL 週期 "e<n>"，
+# 不會跟數字版本撞到；key 從 bump 到過期至少一個 TTL，期間週期一定會前進，過期後也不會回到 bump 前的 ETag。
+# 要在 cache 失效之後才 bump（after_commit 依登記順序執行），否則可能拿新的 ETag 配到舊的快取內容。
+VERSION_TTL_SEC = 30 * 24 * 3600
+
+def _key(kind: str, entity_id: str) -> str:
+    return k("ver", kind, str(entity_id))
+
+# 新版本 = max(舊版本 + 1, 現在微秒)
+_BUMP_LUA = r"""
+local now = tonumber(ARGV[1])
+for _, key in ipairs(KEYS) do
+    local v = tonumber(redis.call('GET', key) or '0')
+    redis.call('SET', key, string.format('%d', math.max(v + 1, now)), 'EX', ARGV[2])
+end
+return #KEYS
+"""
+
+def _now_us() -> int:
+    return time.time_ns() // 1000
+
+async def bump(*entities: Tuple[str, str]) -> None:
+    """(kind, id) 的版本號 +1；多個一次往返"""
+    if not entities:
+        return
+    keys = [_key(kind, eid) for kind, eid in entities]
+    try:
+        await get_redis().eval(_BUMP_LUA, len(keys), *keys, _now_us(), VERSION_TTL_SEC)
+    except Exception:
+        # bump 失敗會讓 client 繼續拿到 304，所以要留紀錄
+        log.warning("version bump failed: %s", keys, exc_info=True)
+
+async def read(entities: Iterable[Tuple[str, str]]) -> List[str]:
+    """回傳順序同 entities；只讀不寫"""
+    keys = [_key(kind, eid) for kind, eid in entities]
+    vals = await get_redis().mget(keys)
+    missing = f"e{int(time.time()) // VERSION_TTL_SEC}"
+    return [missing if v is None else v.decode() if isinstance(v, bytes) else str(v) for v in vals]